@@ -1,34 +1,202 @@
-from flask import Flask, jsonify, send_from_directory
+import click
+from flask import Flask, Response, abort, jsonify, request, send_file, send_from_directory
 from flask_cors import CORS
-from database import init_db
-from routes import tasks_bp
+import database
+import mimetypes
 import os
+import time
 
 # Obtener la ruta absoluta de la carpeta frontend
 FRONTEND_PATH = os.path.join(os.path.dirname(__file__), '..', 'frontend')
 FRONTEND_PATH = os.path.abspath(FRONTEND_PATH)
 
-app = Flask(__name__, static_folder=FRONTEND_PATH, static_url_path='/')
 
-CORS(app)
+def create_app(config=None):
+    """Crea la aplicación Flask.
 
-# Inicializar base de datos
-init_db()
+    No toca la base de datos. config['DATABASE'] se guarda en app.config y se
+    resuelve en cada conexión, así que varias aplicaciones del mismo proceso
+    pueden usar bases de datos distintas. Las migraciones se aplican al arrancar
+    (`python app.py`) o con `flask migrate`; las peticiones solo comprueban la
+    versión del esquema (una vez por base de datos y proceso).
+    """
+    # Importaciones diferidas: solo se pagan al crear la aplicación
+    from database import (
+        init_db, init_app, pool_stats, rebuild_search_index, run_migrations, schema_version, check_stats,
+        check_schema,
+    )
+    from cache import task_cache, init_app as init_cache
+    from events import broker, init_app as init_events
+    import writer
+    import metrics
+    import compression
+    import reminders
+    from assets import manifest, ASSET_MAX_AGE
+    from routes import tasks_bp, calendar_bp, attachments_bp, stats_bp
 
-# Registrar blueprints
-app.register_blueprint(tasks_bp)
+    app = Flask(__name__, static_folder=FRONTEND_PATH, static_url_path='/')
 
-@app.route('/')
-def index():
-    return send_from_directory(FRONTEND_PATH, 'index.html')
+    # X-Sendfile para servidores que lo soportan (Apache/lighttpd)
+    app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE', '').lower() in ('1', 'true', 'yes')
+    if config:
+        app.config.update(config)
 
-@app.route('/<path:filename>')
-def serve_static(filename):
-    return send_from_directory(FRONTEND_PATH, filename)
+    CORS(app)
+
+    # Pool de conexiones ligado al contexto de la aplicación
+    init_app(app)
+    init_cache(app)
+    init_events(app)
+    writer.init_app(app)
+    # Antes que el resto de hooks para medir también la inicialización perezosa
+    metrics.init_app(app)
+    compression.init_app(app)
+    reminders.init_app(app)
+
+    # Solo se comprueba la versión: migrar dentro de una petición haría competir a los workers
+    @app.before_request
+    def ensure_schema():
+        if not check_schema():
+            return jsonify({'error': 'Database schema is out of date; run flask migrate'}), 503
+
+    # Registrar blueprints
+    app.register_blueprint(tasks_bp)
+    app.register_blueprint(calendar_bp)
+    app.register_blueprint(attachments_bp)
+    app.register_blueprint(stats_bp)
+
+    @app.route('/')
+    def index():
+        if app.debug:
+            # En desarrollo los ficheros cambian sin reiniciar
+            manifest.reset()
+        built = manifest.built
+        if request.if_none_match.contains_weak(built['index_etag']):
+            response = Response(status=304)
+        elif compression.accepts_gzip():
+            response = Response(built['index_gz'], mimetype='text/html')
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            response = Response(built['index'], mimetype='text/html')
+        response.set_etag(built['index_etag'])
+        response.vary.add('Accept-Encoding')
+        # index.html apunta a los recursos con huella: se revalida en cada carga
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    @app.route('/dist/<path:filename>')
+    def serve_asset(filename):
+        gzipped = compression.accepts_gzip()
+        path = manifest.path_for(filename, gzipped)
+        if path is None:
+            abort(404)
+        response = send_file(path, mimetype=mimetypes.guess_type(filename)[0], conditional=True,
+                             download_name=os.path.basename(filename),
+                             etag=filename + ('.gz' if gzipped else ''), max_age=ASSET_MAX_AGE)
+        if gzipped:
+            response.headers['Content-Encoding'] = 'gzip'
+        response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = f'public, max-age={ASSET_MAX_AGE}, immutable'
+        return response
+
+    @app.route('/<path:filename>')
+    def serve_static(filename):
+        return send_from_directory(FRONTEND_PATH, filename)
+
+    @app.cli.command('build-assets')
+    @click.option('--clean', is_flag=True, help='Borra las versiones anteriores')
+    def build_assets_command(clean):
+        """Genera los recursos estáticos con huella y su versión gzip"""
+        for asset, fingerprinted in manifest.built['mapping'].items():
+            print(f'{asset} -> {fingerprinted}')
+        if clean:
+            manifest.clean()
+
+    @app.cli.command('rebuild-search')
+    def rebuild_search_command():
+        """Reconstruye el índice de búsqueda de texto completo"""
+        init_db()
+        rebuild_search_index()
+        print('Índice de búsqueda reconstruido')
+
+    @app.cli.command('check-stats')
+    @click.option('--repair', is_flag=True, help='Reconstruye task_stats si hay diferencias')
+    def check_stats_command(repair):
+        """Compara los contadores de /api/stats con un recuento completo de tasks"""
+        init_db()
+        differences = check_stats(repair=repair)
+        for dimension, value, stored, actual in differences:
+            print(f'{dimension}={value!r}: guardado {stored}, real {actual}')
+        if not differences:
+            print('Estadísticas correctas')
+        elif repair:
+            print('Estadísticas reconstruidas')
+        else:
+            raise SystemExit(1)
+
+    @app.cli.command('prune-tombstones')
+    @click.option('--days', type=int, default=None, help='Antigüedad mínima de las lápidas a borrar')
+    def prune_tombstones_command(days):
+        """Borra las lápidas antiguas de GET /api/tasks/changes"""
+        from models import Task, TOMBSTONE_MAX_AGE_DAYS
+        init_db()
+        count = Task.prune_tombstones(TOMBSTONE_MAX_AGE_DAYS if days is None else days)
+        print(f'{count} lápidas borradas')
+
+    @app.cli.command('reminders')
+    @click.option('--sinks', default=None, help='Destinos separados por comas: log, sse, webhook')
+    def reminders_command(sinks):
+        """Ejecuta el planificador de recordatorios en primer plano (uno por despliegue)"""
+        init_db()
+        scheduler = reminders.scheduler
+        scheduler.sinks = reminders.build_sinks(
+            sinks or app.config.get('REMINDER_SINKS', reminders.REMINDER_SINKS),
+            app.config.get('REMINDER_WEBHOOK_URL', reminders.REMINDER_WEBHOOK_URL),
+        )
+        scheduler.start(app)
+        print('Planificador de recordatorios en marcha (Ctrl+C para salir)')
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            scheduler.stop()
+
+    @app.cli.command('migrate')
+    @click.option('--target', type=int, default=None, help='Versión de destino')
+    def migrate_command(target):
+        """Aplica las migraciones pendientes mostrando la duración de cada paso"""
+        print(f'Versión del esquema: {schema_version()}')
+
+        def report(step):
+            print(f'  [{step.version}] {step.description:<45} {step.seconds:8.3f}s  {step.rows} filas')
+
+        run_migrations(target, report)
+        print(f'Versión del esquema: {schema_version()}')
+
+    @app.route('/api/health')
+    def health():
+        return jsonify({
+            'status': 'ok',
+            'db_pool': pool_stats(),
+            'task_cache': task_cache.stats(),
+            'events': broker.stats(),
+            'group_commit': writer.stats(),
+            'reminders': reminders.scheduler.stats(),
+        }), 200
+
+    @app.route('/api/metrics')
+    def metrics_endpoint():
+        return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+    return app
 
-@app.route('/api/health')
-def health():
-    return jsonify({'status': 'ok'}), 200
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    # DEBUG antes de create_app: el proceso padre del reloader no arranca los recordatorios
+    app = create_app({'DEBUG': True})
+    # Arranque: las migraciones pendientes se aplican antes de atender peticiones
+    with app.app_context():
+        database.init_db()
+    app.run(debug=True, host='0.0.0.0', port=5000)
+else:
+    app = create_app()
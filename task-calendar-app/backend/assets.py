@@ -0,0 +1,105 @@
+"""
+Recursos estáticos con huella de contenido y precomprimidos.
+
+build() copia cada recurso de ASSETS a ASSETS_BUILD_DIR con el hash de su
+contenido en el nombre (js/app.3f2a9c1b04de.js) junto a su versión .gz. Como
+el nombre cambia con el contenido, se sirven con Cache-Control: immutable;
+index.html se reescribe para apuntar a esos nombres y se revalida siempre.
+"""
+import gzip
+import hashlib
+import os
+import re
+import threading
+
+FRONTEND_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'frontend'))
+ASSETS = ('js/app.js', 'js/api.js', 'js/storage.js', 'css/styles.css')
+ASSETS_BUILD_DIR = os.environ.get('ASSETS_BUILD_DIR', os.path.join(FRONTEND_PATH, 'dist'))
+# URL bajo la que se sirven los recursos con huella
+ASSETS_URL = '/dist/'
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+_HASH_LENGTH = 12
+
+
+class AssetManifest:
+    """Nombres con huella de los recursos y el index.html reescrito"""
+
+    def __init__(self, source=FRONTEND_PATH, build_dir=ASSETS_BUILD_DIR, assets=ASSETS):
+        self.source = source
+        self.build_dir = build_dir
+        self.assets = assets
+        self._lock = threading.Lock()
+        self._built = None
+
+    def build(self):
+        """Genera (si faltan) las copias con huella y sus .gz y devuelve el manifiesto"""
+        mapping = {}
+        for asset in self.assets:
+            try:
+                with open(os.path.join(self.source, asset), 'rb') as f:
+                    data = f.read()
+            except FileNotFoundError:
+                # Recurso ausente: index.html conserva su URL original y / sigue respondiendo
+                continue
+            digest = hashlib.sha256(data).hexdigest()[:_HASH_LENGTH]
+            stem, ext = os.path.splitext(asset)
+            fingerprinted = f'{stem}.{digest}{ext}'
+            target = os.path.join(self.build_dir, fingerprinted)
+            # El nombre depende del contenido: si ya existe, es idéntico
+            if not os.path.exists(target + '.gz'):
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                _write_atomic(target, data)
+                _write_atomic(target + '.gz', gzip.compress(data, 9, mtime=0))
+            mapping[asset] = fingerprinted
+
+        with open(os.path.join(self.source, 'index.html'), 'rb') as f:
+            html = f.read().decode('utf-8')
+        for asset, fingerprinted in mapping.items():
+            html = re.sub(rf'(["\'])/?{re.escape(asset)}\1', rf'\g<1>{ASSETS_URL}{fingerprinted}\g<1>', html)
+        index = html.encode('utf-8')
+        return {
+            'mapping': mapping,
+            'files': set(mapping.values()),
+            'index': index,
+            'index_gz': gzip.compress(index, 9, mtime=0),
+            'index_etag': hashlib.sha256(index).hexdigest()[:_HASH_LENGTH],
+        }
+
+    @property
+    def built(self):
+        # Perezoso: create_app no toca el disco; se construye en la primera petición
+        if self._built is None:
+            with self._lock:
+                if self._built is None:
+                    self._built = self.build()
+        return self._built
+
+    def reset(self):
+        with self._lock:
+            self._built = None
+
+    def path_for(self, fingerprinted, gzipped=False):
+        """Ruta en disco de un recurso con huella, o None si no es uno de los generados"""
+        if fingerprinted not in self.built['files']:
+            return None
+        return os.path.join(self.build_dir, fingerprinted + ('.gz' if gzipped else ''))
+
+    def clean(self):
+        """Borra las versiones antiguas del directorio de build"""
+        keep = {name for built in self.built['files'] for name in (built, built + '.gz')}
+        for root, _, files in os.walk(self.build_dir):
+            for name in files:
+                relative = os.path.relpath(os.path.join(root, name), self.build_dir).replace(os.sep, '/')
+                if relative not in keep:
+                    os.unlink(os.path.join(root, name))
+
+
+def _write_atomic(path, data):
+    temp = f'{path}.{os.getpid()}.tmp'
+    with open(temp, 'wb') as f:
+        f.write(data)
+    os.replace(temp, path)
+
+
+manifest = AssetManifest()
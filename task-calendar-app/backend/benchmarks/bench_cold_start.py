@@ -0,0 +1,70 @@
+"""
+Benchmark de arranque en frío: importación, create_app y primera respuesta.
+
+Cada medida se hace en un proceso nuevo, con la base de datos vacía (fría)
+o ya inicializada por un arranque anterior (caliente).
+
+Uso:
+    python benchmarks/bench_cold_start.py [--runs 5]
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Se ejecuta en el proceso hijo; imprime los tiempos en milisegundos
+PROBE = '''
+import json, time
+t0 = time.perf_counter()
+import app as app_module
+t1 = time.perf_counter()
+app = app_module.create_app()
+t2 = time.perf_counter()
+response = app.test_client().get('/api/tasks')
+t3 = time.perf_counter()
+assert response.status_code == 200, response.status_code
+print(json.dumps({
+    'import': (t1 - t0) * 1000,
+    'create_app': (t2 - t1) * 1000,
+    'first_response': (t3 - t2) * 1000,
+    'total': (t3 - t0) * 1000,
+}))
+'''
+
+
+def probe(workdir):
+    # DATABASE es relativo: la base de datos vive en el directorio temporal
+    env = dict(os.environ, PYTHONPATH=BACKEND)
+    output = subprocess.run([sys.executable, '-c', PROBE], cwd=workdir, env=env,
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    results = {'fría': [], 'caliente': []}
+    for _ in range(args.runs):
+        workdir = tempfile.mkdtemp()
+        try:
+            results['fría'].append(probe(workdir))
+            results['caliente'].append(probe(workdir))
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    keys = ['import', 'create_app', 'first_response', 'total']
+    print(f'{"bd":<10}' + ''.join(f'{key:>16}' for key in keys) + '   (mediana, ms)')
+    for label, runs in results.items():
+        print(f'{label:<10}' + ''.join(f'{statistics.median(r[key] for r in runs):>16.1f}' for key in keys))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Benchmark de group commit: rendimiento y latencia p99 de Task.create concurrente.
+
+Compara un commit por escritura con el hilo escritor agrupando cada
+--delays milisegundos (o al llegar a --max-batch operaciones).
+
+Uso:
+    python benchmarks/bench_group_commit.py [--ops 4000] [--threads 16] [--profile durable]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import database
+import slowlog
+import writer
+from models import Task
+
+
+def run_workload(ops, threads):
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(n):
+        local = []
+        for i in range(n):
+            start = time.perf_counter()
+            Task.create(f'Task {i}', 'Benchmark', 'bench', 3, '2025-12-31')
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    per_thread = ops // threads
+    pool = [threading.Thread(target=worker, args=(per_thread,)) for _ in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return time.perf_counter() - start, latencies
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--ops', type=int, default=4000)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--profile', default='durable', choices=list(database.PROFILES))
+    parser.add_argument('--max-batch', type=int, default=writer.GROUP_COMMIT_MAX_BATCH)
+    parser.add_argument('--delays', type=float, nargs='*', default=[0, 2, 5],
+                        help='esperas de agrupación a comparar (ms)')
+    args = parser.parse_args()
+
+    # Las esperas por el bloqueo de escritura no deben llenar la salida de consultas lentas
+    slowlog.configure(-1)
+    modes = [('directo', None)] + [(f'grupo {delay:g} ms', delay) for delay in args.delays]
+    original = database.DATABASE
+    print(f'perfil {args.profile}, {args.threads} hilos')
+    print(f'{"modo":<14} {"ops":>7} {"ops/s":>9} {"p50 ms":>9} {"p99 ms":>9} {"lote medio":>11}')
+    for label, delay in modes:
+        workdir = tempfile.mkdtemp()
+        database.DATABASE = os.path.join(workdir, 'bench.db')
+        try:
+            database.configure(args.profile)
+            database.init_db()
+            writer.configure(enabled=delay is not None, max_batch=args.max_batch, delay_ms=delay or 0)
+            elapsed, latencies = run_workload(args.ops, args.threads)
+            stats = writer.stats().get(database.DATABASE, {})
+            print(f'{label:<14} {len(latencies):>7} {len(latencies) / elapsed:>9.0f} '
+                  f'{statistics.median(latencies) * 1000:>9.2f} {percentile(latencies, 0.99) * 1000:>9.2f} '
+                  f'{stats.get("avg_batch", 1):>11}')
+        finally:
+            writer.configure(enabled=False)
+            database.close_all_pools()
+            shutil.rmtree(workdir, ignore_errors=True)
+    database.DATABASE = original
+
+
+if __name__ == '__main__':
+    main()
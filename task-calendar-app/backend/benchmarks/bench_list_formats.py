@@ -0,0 +1,76 @@
+"""
+Benchmark de los formatos de listado: tiempo de GET /api/tasks y tamaño del cuerpo
+con la lista completa, con ?fields= y con ?format=columnar.
+
+Uso:
+    python benchmarks/bench_list_formats.py [--tasks 5000] [--runs 20]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import database
+import slowlog
+from app import create_app
+from models import Task
+
+LIST_FIELDS = 'id,title,priority,status,due_date'
+
+VARIANTS = (
+    ('dicts, SELECT *', '/api/tasks'),
+    ('dicts, fields', f'/api/tasks?fields={LIST_FIELDS}'),
+    ('columnar, SELECT *', '/api/tasks?format=columnar'),
+    ('columnar, fields', f'/api/tasks?format=columnar&fields={LIST_FIELDS}'),
+)
+
+
+def seed(count):
+    Task.apply_batch(
+        (i, 'create', None, (
+            f'Task {i}', 'Descripción de la tarea ' * 4, ('work', 'personal', 'home')[i % 3],
+            i % 5 + 1, f'2026-{i % 12 + 1:02d}-{i % 28 + 1:02d}'
+        ))
+        for i in range(count)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tasks', type=int, default=5000)
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    database.DATABASE = os.path.join(directory, 'bench.db')
+    slowlog.configure(-1)
+    try:
+        database.init_db()
+        seed(args.tasks)
+        client = create_app({'TESTING': True}).test_client()
+
+        print(f'{"variant":<22}{"ms (median)":>14}{"bytes":>12}')
+        baseline = None
+        for name, url in VARIANTS:
+            times = []
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                response = client.get(url)
+                times.append(time.perf_counter() - start)
+            size = len(response.data)
+            median = statistics.median(times) * 1000
+            baseline = baseline or (median, size)
+            print(f'{name:<22}{median:>14.2f}{size:>12}'
+                  f'   ({median / baseline[0]:.0%} time, {size / baseline[1]:.0%} size)')
+    finally:
+        database.close_all_pools()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Benchmark de los perfiles de SQLite sobre la carga create/update de Task.
+
+Uso:
+    python benchmarks/bench_sqlite_profiles.py [--ops 2000] [--threads 4]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import database
+from models import Task
+
+
+def run_workload(ops, threads):
+    def worker(n):
+        for i in range(n):
+            task_id = Task.create(f'Task {i}', 'Benchmark', 'bench', 3, '2025-12-31')
+            Task.update(task_id, f'Task {i}', 'Updated', 'bench', 4, '2025-12-31', 'in_progress')
+
+    per_thread = ops // threads
+    pool = [threading.Thread(target=worker, args=(per_thread,)) for _ in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return time.perf_counter() - start, per_thread * threads * 2
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--ops', type=int, default=2000, help='tareas creadas (cada una se actualiza una vez)')
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--profiles', nargs='*', default=list(database.PROFILES))
+    args = parser.parse_args()
+
+    original = database.DATABASE
+    print(f'{"perfil":<12} {"escrituras":>10} {"segundos":>10} {"ops/s":>10}')
+    for profile in args.profiles:
+        workdir = tempfile.mkdtemp()
+        database.DATABASE = os.path.join(workdir, 'bench.db')
+        try:
+            database.configure(profile)
+            database.init_db()
+            elapsed, writes = run_workload(args.ops, args.threads)
+            print(f'{profile:<12} {writes:>10} {elapsed:>10.2f} {writes / elapsed:>10.0f}')
+        finally:
+            database.close_all_pools()
+            shutil.rmtree(workdir, ignore_errors=True)
+    database.DATABASE = original
+
+
+if __name__ == '__main__':
+    main()
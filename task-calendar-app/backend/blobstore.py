@@ -0,0 +1,101 @@
+import hashlib
+import os
+import tempfile
+
+# Directorio de los adjuntos (ATTACHMENTS_DIR o app.config['ATTACHMENTS_DIR'])
+ATTACHMENTS_DIR = os.environ.get(
+    'ATTACHMENTS_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'attachments')
+)
+# Prefijo interno de nginx para X-Accel-Redirect (vacío = el backend envía el fichero)
+ACCEL_PREFIX = os.environ.get('ATTACHMENTS_ACCEL_PREFIX', '')
+# Tamaño de los bloques copiados del cuerpo de la petición al disco
+CHUNK_SIZE = 64 * 1024
+
+
+def attachments_root():
+    """Directorio de adjuntos de la aplicación actual (o el del entorno fuera de una petición)"""
+    from flask import current_app, has_app_context
+    if has_app_context():
+        return current_app.config.get('ATTACHMENTS_DIR', ATTACHMENTS_DIR)
+    return ATTACHMENTS_DIR
+
+
+def blob_path(content_hash):
+    """Ruta relativa de un blob: ab/cd/abcdef... (evita directorios enormes)"""
+    return os.path.join(content_hash[:2], content_hash[2:4], content_hash)
+
+
+class BlobWriter:
+    """Fichero temporal que calcula el SHA-256 mientras se escribe.
+
+    Sirve como stream_factory del parser multipart de Werkzeug: recibe el
+    fichero por bloques y nunca lo mantiene entero en memoria. commit() lo
+    mueve a su ruta definitiva por contenido (o lo descarta si ya existía).
+    """
+
+    def __init__(self, root):
+        self.root = root
+        tmp_dir = os.path.join(root, 'tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+        fd, self.temp_path = tempfile.mkstemp(dir=tmp_dir)
+        self._file = os.fdopen(fd, 'w+b')
+        self._hash = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self._hash.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+
+    def seek(self, *args):
+        return self._file.seek(*args)
+
+    def tell(self):
+        return self._file.tell()
+
+    def read(self, *args):
+        return self._file.read(*args)
+
+    def flush(self):
+        return self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    @property
+    def content_hash(self):
+        return self._hash.hexdigest()
+
+    def copy_from(self, stream, chunk_size=CHUNK_SIZE):
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            self.write(chunk)
+
+    def commit(self):
+        """Devuelve (hash, tamaño, ruta relativa) del blob ya almacenado"""
+        self._file.close()
+        content_hash = self.content_hash
+        relative = blob_path(content_hash)
+        target = os.path.join(self.root, relative)
+        if os.path.exists(target):
+            # Contenido idéntico ya almacenado: se guarda una sola vez
+            os.unlink(self.temp_path)
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(self.temp_path, target)
+        return content_hash, self.size, relative
+
+    def discard(self):
+        self._file.close()
+        if os.path.exists(self.temp_path):
+            os.unlink(self.temp_path)
+
+
+def remove_blob(root, relative):
+    try:
+        os.unlink(os.path.join(root, relative))
+    except FileNotFoundError:
+        pass
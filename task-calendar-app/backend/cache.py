@@ -0,0 +1,138 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Tamaño máximo (0 = caché desactivada) y TTL en segundos de la caché de lecturas
+CACHE_SIZE = int(os.environ.get('TASK_CACHE_SIZE', 0))
+CACHE_TTL = float(os.environ.get('TASK_CACHE_TTL', 60))
+
+MISS = object()
+
+
+class TaskCache:
+    """Caché LRU/TTL en proceso para las lecturas de Task.
+
+    Las escrituras locales invalidan solo las claves afectadas. Las escrituras
+    de otros procesos se detectan con PRAGMA data_version (barato, no lee
+    tablas) y, si ha cambiado, comparando la versión global de datos.
+    """
+
+    def __init__(self, maxsize=CACHE_SIZE, ttl=CACHE_TTL):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.configure(maxsize, ttl)
+
+    def configure(self, maxsize, ttl=CACHE_TTL):
+        with self._lock:
+            self.maxsize = int(maxsize)
+            self.ttl = float(ttl)
+            self._entries.clear()
+            # Versión de datos a la que corresponde el contenido de la caché
+            self.version = None
+            # Cambia con cada invalidación; evita guardar lecturas ya obsoletas
+            self.generation = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+            self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.maxsize > 0
+
+    def sync(self, db):
+        """Descarta la caché si otro proceso ha escrito; devuelve la generación actual"""
+        if not self.enabled:
+            return None
+        data_version = db.execute('PRAGMA data_version').fetchone()[0]
+        if getattr(db, 'seen_data_version', None) != data_version:
+            row = db.execute('SELECT version FROM data_version WHERE id = 1').fetchone()
+            db.seen_data_version = data_version
+            with self._lock:
+                if row is None or row[0] != self.version:
+                    self._clear()
+                    self.version = row[0] if row else None
+        return self.generation
+
+    def get(self, key):
+        if not self.enabled:
+            return MISS
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISS
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return MISS
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, generation):
+        if not self.enabled:
+            return
+        with self._lock:
+            # Si hubo una escritura durante la lectura, el valor puede estar obsoleto
+            if generation != self.generation:
+                return
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, task_ids, version):
+        """Invalida tras una escritura local que ha dejado los datos en `version`"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self.version is None or version != self.version + 1:
+                # Hubo escrituras que no conocemos: no se puede invalidar con precisión
+                self._clear()
+            else:
+                self.generation += 1
+                for task_id in task_ids:
+                    if self._entries.pop(('task', task_id), None) is not None:
+                        self.invalidations += 1
+                # Cualquier escritura puede cambiar cualquier listado
+                for key in [key for key in self._entries if key[0] != 'task']:
+                    del self._entries[key]
+                    self.invalidations += 1
+            self.version = version
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+    def _clear(self):
+        self.generation += 1
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+task_cache = TaskCache()
+
+
+def init_app(app):
+    if 'TASK_CACHE_SIZE' in app.config or 'TASK_CACHE_TTL' in app.config:
+        task_cache.configure(
+            app.config.get('TASK_CACHE_SIZE', CACHE_SIZE),
+            app.config.get('TASK_CACHE_TTL', CACHE_TTL)
+        )
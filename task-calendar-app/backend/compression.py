@@ -0,0 +1,49 @@
+"""
+Compresión gzip al vuelo de las respuestas JSON de la API.
+
+Solo se comprimen respuestas con cuerpo en memoria (no streaming, no
+send_file) de al menos COMPRESS_MIN_SIZE bytes y si el cliente acepta gzip.
+"""
+import gzip
+import os
+
+from flask import request
+
+COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+# 1 = más rápido, 9 = más pequeño; 6 es el equilibrio habitual
+COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))
+COMPRESS_MIMETYPES = ('application/json',)
+
+
+def accepts_gzip():
+    return request.accept_encodings['gzip'] > 0
+
+
+def compress_response(response, min_size=COMPRESS_MIN_SIZE, level=COMPRESS_LEVEL):
+    response.vary.add('Accept-Encoding')
+    if (response.direct_passthrough or response.is_streamed
+            or response.mimetype not in COMPRESS_MIMETYPES
+            or 'Content-Encoding' in response.headers
+            or response.status_code < 200 or response.status_code in (204, 304)
+            or not accepts_gzip()):
+        return response
+    data = response.get_data()
+    if len(data) < min_size:
+        return response
+    response.set_data(gzip.compress(data, level, mtime=0))
+    response.headers['Content-Encoding'] = 'gzip'
+    # La representación cambia: el ETag pasa a ser débil (If-None-Match compara en débil)
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_app(app):
+    @app.after_request
+    def compress(response):
+        return compress_response(
+            response,
+            app.config.get('COMPRESS_MIN_SIZE', COMPRESS_MIN_SIZE),
+            app.config.get('COMPRESS_LEVEL', COMPRESS_LEVEL),
+        )
@@ -1,37 +1,842 @@
 import sqlite3
 import os
+import threading
+import time
 from datetime import datetime
 
+from flask import current_app, g, has_app_context
+
+import slowlog
+from migrations import (
+    Migration, Sql, Call, AddColumn, CreateIndex, Backfill, current_version, migrate,
+)
+
 DATABASE = 'tasks.db'
 
+# Tamaño máximo del pool por base de datos y espera máxima para obtener conexión
+POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 8))
+POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+# Sentencias preparadas que sqlite3 mantiene en caché por conexión
+STATEMENT_CACHE_SIZE = int(os.environ.get('DB_STATEMENT_CACHE_SIZE', 256))
+
+
+# Perfiles de PRAGMAs aplicados al abrir cada conexión.
+#
+# - default:    valores por defecto de SQLite, con espera ante bloqueos.
+# - durable:    WAL con synchronous=FULL; lectores y escritor concurrentes sin
+#               renunciar a un fsync por commit.
+# - throughput: WAL con synchronous=NORMAL (un commit solo se pierde ante un
+#               corte de luz, nunca se corrompe la base), 64 MB de caché de
+#               páginas, 256 MB de mmap y temporales en memoria. Recomendado
+#               para producción con varios workers.
+PROFILES = {
+    'default': {
+        'busy_timeout': 5000,
+    },
+    'durable': {
+        'journal_mode': 'WAL',
+        'synchronous': 'FULL',
+        'busy_timeout': 5000,
+    },
+    'throughput': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -65536,
+        'mmap_size': 268435456,
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,
+    },
+}
+
+# Valores admitidos para los PRAGMAs que no son numéricos
+PRAGMA_CHOICES = {
+    'journal_mode': ('DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'),
+    'synchronous': ('OFF', 'NORMAL', 'FULL', 'EXTRA'),
+    'temp_store': ('DEFAULT', 'FILE', 'MEMORY'),
+}
+PRAGMA_NAMES = ('journal_mode', 'synchronous', 'cache_size', 'mmap_size', 'temp_store', 'busy_timeout')
+
+_profile = None
+_pragmas = None
+_pragmas_lock = threading.Lock()
+
+
+class PoolTimeout(sqlite3.OperationalError):
+    pass
+
+
+def _validate_pragma(name, value):
+    if name in PRAGMA_CHOICES:
+        value = str(value).upper()
+        if value not in PRAGMA_CHOICES[name]:
+            raise ValueError(f'Invalid value for {name}: {value}')
+        return value
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'Invalid value for {name}: {value}')
+
+
+def parse_pragmas(text):
+    """Convierte 'synchronous=FULL,cache_size=-2000' en un diccionario de PRAGMAs"""
+    pragmas = {}
+    for item in filter(None, (item.strip() for item in (text or '').split(','))):
+        name, sep, value = item.partition('=')
+        if not sep:
+            raise ValueError(f'Invalid pragma: {item}')
+        pragmas[name.strip().lower()] = value.strip()
+    return pragmas
+
+
+def _resolve_pragmas(profile=None, overrides=None):
+    """Prioridad: perfil (DB_PROFILE) < variables DB_<PRAGMA> < DB_PRAGMAS < overrides"""
+    profile = profile or os.environ.get('DB_PROFILE', 'default')
+    if profile not in PROFILES:
+        raise ValueError(f'Unknown database profile: {profile}')
+
+    pragmas = dict(PROFILES[profile])
+    for name in PRAGMA_NAMES:
+        value = os.environ.get(f'DB_{name.upper()}')
+        if value is not None:
+            pragmas[name] = value
+    pragmas.update(parse_pragmas(os.environ.get('DB_PRAGMAS')))
+    pragmas.update(overrides or {})
+
+    unknown = set(pragmas) - set(PRAGMA_NAMES)
+    if unknown:
+        raise ValueError(f'Unknown pragma: {", ".join(sorted(unknown))}')
+    return profile, {name: _validate_pragma(name, value) for name, value in pragmas.items()}
+
+
+def configure(profile=None, overrides=None):
+    """Selecciona el perfil de PRAGMAs y cierra los pools para que se apliquen.
+
+    overrides (app.config['DB_PRAGMAS']) es un diccionario o el mismo texto que
+    la variable DB_PRAGMAS.
+    """
+    global _profile, _pragmas
+    if isinstance(overrides, str):
+        overrides = parse_pragmas(overrides)
+    _profile, _pragmas = _resolve_pragmas(profile, overrides)
+
+    # Las conexiones abiertas conservan la configuración anterior
+    close_all_pools()
+    return dict(_pragmas)
+
+
+def current_pragmas():
+    global _profile, _pragmas
+    if _pragmas is None:
+        # Primera conexión: se resuelve la configuración del entorno sin cerrar
+        # los pools, uno de los cuales está abriendo precisamente esta conexión
+        with _pragmas_lock:
+            if _pragmas is None:
+                _profile, _pragmas = _resolve_pragmas()
+    return dict(_pragmas)
+
+
+def apply_pragmas(conn, pragmas=None):
+    pragmas = current_pragmas() if pragmas is None else pragmas
+    # journal_mode primero: el resto de PRAGMAs no depende de él, pero WAL
+    # debe fijarse fuera de cualquier transacción
+    for name in sorted(pragmas, key=lambda n: n != 'journal_mode'):
+        conn.execute(f'PRAGMA {name} = {pragmas[name]}')
+
+
+# Tiempo acumulado en SQLite por hilo (lo lee la instrumentación de peticiones)
+_db_timer = threading.local()
+
+
+def db_time():
+    """Segundos pasados en SQLite por el hilo actual desde reset_db_time()"""
+    return getattr(_db_timer, 'seconds', 0.0)
+
+
+def reset_db_time():
+    _db_timer.seconds = 0.0
+
+
+def _add_db_time(elapsed):
+    _db_timer.seconds = getattr(_db_timer, 'seconds', 0.0) + elapsed
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor que mide cada sentencia (execute, sus fetch y la iteración)
+
+    El tiempo se acumula en db_time() y, si una sentencia supera el umbral de
+    slowlog, se registra con su plan de consulta.
+    """
+
+    _sql = None
+    _parameters = ()
+    _elapsed = 0.0
+
+    def _timed(self, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            _add_db_time(elapsed)
+            self._elapsed += elapsed
+
+    def _begin(self, sql, parameters):
+        self._sql = sql
+        self._parameters = parameters
+        self._elapsed = 0.0
+
+    def _check(self, done):
+        # Se registra al terminar la sentencia o en cuanto pasa del umbral
+        if self._sql is not None and (done or self._elapsed >= slowlog.threshold):
+            sql, self._sql = self._sql, None
+            if self._elapsed >= slowlog.threshold:
+                slowlog.record(self.connection, sql, self._elapsed, self._parameters)
+
+    def execute(self, sql, parameters=()):
+        self._begin(sql, parameters)
+        self._timed(super().execute, sql, parameters)
+        self._check(self.description is None)
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        # Para el plan basta con el primer juego de parámetros
+        first = seq_of_parameters[0] if isinstance(seq_of_parameters, (list, tuple)) and seq_of_parameters else ()
+        self._begin(sql, first)
+        self._timed(super().executemany, sql, seq_of_parameters)
+        self._check(True)
+        return self
+
+    def executescript(self, script):
+        self._timed(super().executescript, script)
+        return self
+
+    # `for row in cursor` no pasa por fetchone(): se mide cada fila
+    def __next__(self):
+        try:
+            row = self._timed(super().__next__)
+        except StopIteration:
+            self._check(True)
+            raise
+        self._check(False)
+        return row
+
+    def fetchone(self):
+        row = self._timed(super().fetchone)
+        self._check(row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        rows = self._timed(super().fetchmany, size)
+        self._check(len(rows) < size)
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(super().fetchall)
+        self._check(True)
+        return rows
+
+
+class PooledConnection(sqlite3.Connection):
+    """Conexión cuyo close() la devuelve al pool en lugar de cerrarla"""
+
+    pool = None
+    pinned = False
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    # Los atajos de Connection crean cursores propios: pasarlos por TimedCursor
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+
+    def executescript(self, *args):
+        return self.cursor().executescript(*args)
+
+    def commit(self):
+        start = time.perf_counter()
+        try:
+            super().commit()
+        finally:
+            _add_db_time(time.perf_counter() - start)
+
+    def close(self):
+        # Las conexiones ligadas al contexto de Flask se liberan en el teardown
+        if self.pinned:
+            return
+        if self.pool is None:
+            super().close()
+        else:
+            self.pool.release(self)
+
+    def dispose(self):
+        super().close()
+
+
+class ConnectionPool:
+    """Pool acotado de conexiones SQLite reutilizables para una base de datos"""
+
+    def __init__(self, path, size=POOL_SIZE, timeout=POOL_TIMEOUT):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        # Pila LIFO: la última conexión liberada es la que tiene la caché más caliente
+        self._idle = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self.opened = 0
+        self.in_use = 0
+        self.acquired = 0
+        self.waits = 0
+        self.wait_time = 0.0
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            factory=PooledConnection,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        conn.row_factory = sqlite3.Row
+        conn.pool = self
+        # Necesario para que ON DELETE CASCADE de attachments tenga efecto
+        conn.execute('PRAGMA foreign_keys = ON')
+        apply_pragmas(conn)
+        slowlog.install_trace(conn)
+        return conn
+
+    def acquire(self):
+        with self._cond:
+            if not self._idle and self.opened >= self.size:
+                self.waits += 1
+                start = time.perf_counter()
+                deadline = start + self.timeout
+                while not self._idle and self.opened >= self.size:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        self.wait_time += time.perf_counter() - start
+                        raise PoolTimeout('Timed out waiting for a database connection')
+                    self._cond.wait(remaining)
+                self.wait_time += time.perf_counter() - start
+
+            conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                self.opened += 1
+            self.in_use += 1
+            self.acquired += 1
+
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self.opened -= 1
+                    self.in_use -= 1
+                    self._cond.notify()
+                raise
+        return conn
+
+    def release(self, conn):
+        discard = False
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.row_factory = sqlite3.Row
+        except sqlite3.Error:
+            discard = True
+
+        with self._cond:
+            self.in_use -= 1
+            if discard or self._closed:
+                self.opened -= 1
+            else:
+                self._idle.append(conn)
+            self._cond.notify()
+        if discard or self._closed:
+            conn.dispose()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self.opened -= len(idle)
+        for conn in idle:
+            conn.dispose()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'size': self.size,
+                'opened': self.opened,
+                'in_use': self.in_use,
+                'idle': len(self._idle),
+                'acquired': self.acquired,
+                'waits': self.waits,
+                'wait_time_ms': round(self.wait_time * 1000, 3),
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def current_path():
+    """Base de datos de la aplicación actual (app.config['DATABASE']) o DATABASE fuera de ella"""
+    if has_app_context():
+        return current_app.config.get('DATABASE') or DATABASE
+    return DATABASE
+
+
+def get_pool(path=None):
+    path = path or current_path()
+    pool = _pools.get(path)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(path)
+            if pool is None:
+                pool = _pools[path] = ConnectionPool(path)
+    return pool
+
+
+def close_pool(path=None):
+    """Cierra las conexiones inactivas del pool (p. ej. antes de borrar el fichero)"""
+    path = path or current_path()
+    with _pools_lock:
+        pool = _pools.pop(path, None)
+    _initialized.discard(path)
+    _search_support.pop(path, None)
+    if pool is not None:
+        pool.close()
+
+
+def close_all_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    _initialized.clear()
+    _search_support.clear()
+    for pool in pools:
+        pool.close()
+
+
+def pool_stats():
+    return {path: pool.stats() for path, pool in list(_pools.items())}
+
+
 def get_db():
-    db = sqlite3.connect(DATABASE)
-    db.row_factory = sqlite3.Row
-    return db
+    # Dentro de un contexto de Flask se reutiliza una única conexión por petición
+    if has_app_context():
+        db = g.get('_database')
+        if db is None:
+            db = get_pool().acquire()
+            db.pinned = True
+            g._database = db
+        return db
+    return get_pool().acquire()
+
+
+def release_db(exception=None):
+    db = g.pop('_database', None)
+    if db is not None:
+        db.pinned = False
+        db.close()
+
+
+def init_app(app):
+    if 'DB_PROFILE' in app.config or 'DB_PRAGMAS' in app.config:
+        configure(app.config.get('DB_PROFILE'), app.config.get('DB_PRAGMAS'))
+    if 'DB_SLOW_QUERY_MS' in app.config:
+        slowlog.configure(app.config['DB_SLOW_QUERY_MS'])
+    app.teardown_appcontext(release_db)
+
+
+# Bases de datos ya comprobadas en este proceso
+_initialized = set()
+_init_lock = threading.Lock()
+
+
+def init_db(force=False, path=None):
+    """Aplica las migraciones pendientes; una vez por base de datos y proceso.
+
+    Se llama al arrancar (app.py, `flask migrate` y los comandos de la CLI), no
+    al atender peticiones: varios workers migrando a la vez competirían por el
+    bloqueo de escritura.
+    """
+    path = path or current_path()
+    if path in _initialized and not force:
+        return
+    with _init_lock:
+        if path in _initialized and not force:
+            return
+        db = get_pool(path).acquire()
+        try:
+            if force:
+                db.execute('PRAGMA user_version = 0')
+            # Esquema ya al día (otro proceso o un arranque anterior): solo una lectura
+            if current_version(db) < SCHEMA_VERSION:
+                migrate(db, MIGRATIONS)
+        finally:
+            db.close()
+        _initialized.add(path)
+
+
+def check_schema(path=None):
+    """True si el esquema está al día; una lectura de user_version por base de datos y proceso"""
+    path = path or current_path()
+    if path in _initialized:
+        return True
+    db = get_pool(path).acquire()
+    try:
+        version = current_version(db)
+    finally:
+        db.close()
+    if version < SCHEMA_VERSION:
+        return False
+    _initialized.add(path)
+    return True
+
+
+def run_migrations(target=None, report=None):
+    """Aplica las migraciones pendientes de la base de datos actual informando de cada paso"""
+    db = get_pool().acquire()
+    try:
+        return migrate(db, MIGRATIONS, target, report)
+    finally:
+        db.close()
+
+
+def schema_version():
+    db = get_pool().acquire()
+    try:
+        return current_version(db)
+    finally:
+        db.close()
+
+
+# Índice de texto completo (FTS5) sobre title/description, sincronizado por triggers
+SEARCH_SCHEMA = '''
+    CREATE VIRTUAL TABLE tasks_fts USING fts5(
+        title, description,
+        content='tasks', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    );
+
+    CREATE TRIGGER IF NOT EXISTS tasks_fts_insert AFTER INSERT ON tasks BEGIN
+        INSERT INTO tasks_fts (rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS tasks_fts_delete AFTER DELETE ON tasks BEGIN
+        INSERT INTO tasks_fts (tasks_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS tasks_fts_update AFTER UPDATE OF title, description ON tasks BEGIN
+        INSERT INTO tasks_fts (tasks_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO tasks_fts (rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END;
+'''
+
+
+def search_available(db):
+    return db.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'tasks_fts'"
+    ).fetchone() is not None
+
+
+# search_available por base de datos: tasks_fts solo falta si SQLite no tiene FTS5
+_search_support = {}
+
+
+def search_supported(db):
+    """search_available comprobado una sola vez por base de datos y proceso"""
+    path = getattr(getattr(db, 'pool', None), 'path', None) or current_path()
+    supported = _search_support.get(path)
+    if supported is None:
+        supported = _search_support[path] = search_available(db)
+    return supported
+
 
-def init_db():
-    db = get_db()
+def _init_search(db):
+    if search_available(db):
+        return
+    try:
+        db.executescript(SEARCH_SCHEMA)
+    except sqlite3.OperationalError:
+        # SQLite compilado sin FTS5: la búsqueda queda desactivada
+        return
+    # Base de datos existente: indexar las tareas que ya hay
+    rebuild_search_index(db)
+
+
+def rebuild_search_index(db=None):
+    """Reconstruye tasks_fts a partir de tasks"""
+    own = db is None
+    db = db or get_db()
+    try:
+        db.execute("INSERT INTO tasks_fts (tasks_fts) VALUES ('rebuild')")
+        db.commit()
+    finally:
+        if own:
+            db.close()
+
+
+# Tareas que cuentan en open_due; {row} es 'new.', 'old.' o '' (consulta sobre tasks)
+OPEN_DUE_V5 = "COALESCE({row}status, '') != 'completed' AND {row}due_date > ''"
+# Desde la migración 6 las series recurrentes no cuentan: su due_date es solo el inicio
+OPEN_DUE = OPEN_DUE_V5 + ' AND {row}recurrence IS NULL'
+# Columnas cuyo cambio mueve una tarea entre contadores
+STATS_COLUMNS_V5 = ('status', 'category', 'priority', 'due_date')
+STATS_COLUMNS = STATS_COLUMNS_V5 + ('recurrence',)
+
+
+def _stats_rows(row, open_due):
+    """Filas (dimension, value) de task_stats a las que cuenta una tarea (`new` u `old`)"""
+    return f'''
+        SELECT 'total' AS dimension, '' AS value
+        UNION ALL SELECT 'status', COALESCE({row}.status, '')
+        UNION ALL SELECT 'category', COALESCE({row}.category, '')
+        UNION ALL SELECT 'priority', COALESCE({row}.priority, 0)
+        UNION ALL SELECT 'open_due', {row}.due_date WHERE {open_due.format(row=row + '.')}
+    '''
+
+
+def _stats_add(row, open_due):
+    return f'''
+        INSERT INTO task_stats (dimension, value, count)
+        SELECT dimension, value, 1 FROM ({_stats_rows(row, open_due)}) WHERE true
+        ON CONFLICT (dimension, value) DO UPDATE SET count = count + 1;
+    '''
+
+
+def _stats_remove(row, open_due):
+    # Las filas que llegan a 0 se borran: open_due no acumula fechas pasadas
+    return f'''
+        UPDATE task_stats SET count = count - 1 WHERE (dimension, value) IN ({_stats_rows(row, open_due)});
+        DELETE FROM task_stats WHERE count <= 0 AND (dimension, value) IN ({_stats_rows(row, open_due)});
+    '''
+
+
+def _stats_schema(open_due, columns):
+    """Tabla task_stats y los triggers que la mantienen"""
+    changed = ' OR '.join(f'old.{column} IS NOT new.{column}' for column in columns)
+    return f'''
+        CREATE TABLE IF NOT EXISTS task_stats (
+            dimension TEXT NOT NULL,
+            value NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (dimension, value)
+        ) WITHOUT ROWID;
+
+        CREATE TRIGGER IF NOT EXISTS task_stats_insert AFTER INSERT ON tasks BEGIN
+            {_stats_add('new', open_due)}
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS task_stats_delete AFTER DELETE ON tasks BEGIN
+            {_stats_remove('old', open_due)}
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS task_stats_update AFTER UPDATE OF {', '.join(columns)} ON tasks
+        WHEN {changed}
+        BEGIN
+            {_stats_remove('old', open_due)}
+            {_stats_add('new', open_due)}
+        END;
+    '''
+
+
+def _stats_query(open_due):
+    """Contadores calculados desde cero con GROUP BY (reconstrucción y comprobación)"""
+    return f'''
+        SELECT 'total', '', COUNT(*) FROM tasks GROUP BY 1
+        UNION ALL SELECT 'status', COALESCE(status, ''), COUNT(*) FROM tasks GROUP BY 2
+        UNION ALL SELECT 'category', COALESCE(category, ''), COUNT(*) FROM tasks GROUP BY 2
+        UNION ALL SELECT 'priority', COALESCE(priority, 0), COUNT(*) FROM tasks GROUP BY 2
+        UNION ALL SELECT 'open_due', due_date, COUNT(*) FROM tasks WHERE {open_due.format(row='')} GROUP BY 2
+    '''
+
+
+# Contadores de tareas por estado, categoría y prioridad, más las pendientes
+# por fecha de vencimiento (open_due), mantenidos por triggers en la misma
+# transacción que cada escritura: leerlos no depende del tamaño de tasks
+STATS_SCHEMA = _stats_schema(OPEN_DUE, STATS_COLUMNS)
+STATS_QUERY = _stats_query(OPEN_DUE)
+
+
+def _init_stats(db):
+    # Definición de la migración 5, anterior a tasks.recurrence
+    db.executescript(_stats_schema(OPEN_DUE_V5, STATS_COLUMNS_V5))
+    # Base de datos existente: contar las tareas que ya hay
+    rebuild_stats(db, _stats_query(OPEN_DUE_V5))
+
+
+def _upgrade_stats(db):
     db.executescript('''
-        CREATE TABLE IF NOT EXISTS tasks (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT NOT NULL,
-            description TEXT,
-            category TEXT,
-            priority INTEGER CHECK(priority >= 1 AND priority <= 5),
-            due_date TEXT,
-            status TEXT DEFAULT 'pending',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-        
-        CREATE TABLE IF NOT EXISTS attachments (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            task_id INTEGER NOT NULL,
-            filename TEXT NOT NULL,
-            file_path TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (task_id) REFERENCES tasks(id) ON DELETE CASCADE
-        );
-    ''')
-    db.commit()
-    db.close()
\ No newline at end of file
+        DROP TRIGGER IF EXISTS task_stats_insert;
+        DROP TRIGGER IF EXISTS task_stats_delete;
+        DROP TRIGGER IF EXISTS task_stats_update;
+    ''' + STATS_SCHEMA)
+    rebuild_stats(db)
+
+
+def rebuild_stats(db=None, query=None):
+    """Recalcula task_stats a partir de tasks; devuelve el número de filas"""
+    own = db is None
+    db = db or get_db()
+    try:
+        # IMMEDIATE: ninguna escritura puede colarse entre el borrado y el recuento
+        db.execute('BEGIN IMMEDIATE')
+        db.execute('DELETE FROM task_stats')
+        rows = db.execute(f'INSERT INTO task_stats (dimension, value, count) {query or STATS_QUERY}').rowcount
+        db.commit()
+        return rows
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        if own:
+            db.close()
+
+
+def check_stats(db=None, repair=False):
+    """Compara task_stats con un recuento completo de tasks.
+
+    Devuelve las diferencias [(dimension, value, guardado, real)]; con
+    repair=True, si las hay, reconstruye la tabla.
+    """
+    own = db is None
+    db = db or get_db()
+    try:
+        # Una sola transacción de lectura: resumen y recuento del mismo instante
+        if not db.in_transaction:
+            db.execute('BEGIN')
+        try:
+            stored = {(row[0], row[1]): row[2] for row in db.execute(
+                'SELECT dimension, value, count FROM task_stats')}
+            actual = {(row[0], row[1]): row[2] for row in db.execute(STATS_QUERY)}
+        finally:
+            db.rollback()
+        differences = sorted(
+            (dimension, value, stored.get((dimension, value), 0), actual.get((dimension, value), 0))
+            for dimension, value in set(stored) | set(actual)
+            if stored.get((dimension, value), 0) != actual.get((dimension, value), 0)
+        )
+        if differences and repair:
+            rebuild_stats(db)
+        return differences
+    finally:
+        if own:
+            db.close()
+
+
+# Cambios de ocurrencias concretas de una tarea recurrente. Solo se guardan las
+# ocurrencias modificadas y solo las columnas cambiadas (NULL: valor de la serie)
+OCCURRENCES_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS task_occurrences (
+        task_id INTEGER NOT NULL,
+        occurrence_date TEXT NOT NULL,
+        title TEXT,
+        description TEXT,
+        priority INTEGER CHECK(priority >= 1 AND priority <= 5),
+        due_date TEXT,
+        status TEXT,
+        cancelled INTEGER NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (task_id, occurrence_date),
+        FOREIGN KEY (task_id) REFERENCES tasks(id) ON DELETE CASCADE
+    ) WITHOUT ROWID;
+'''
+
+
+# Historial del esquema: añadir siempre al final con la siguiente versión.
+# Los pasos son idempotentes, así que las bases creadas antes de existir las
+# migraciones (user_version = 0) se ponen al día sin recrear nada.
+MIGRATIONS = [
+    Migration(1, 'base schema', [
+        Sql('''
+            CREATE TABLE IF NOT EXISTS tasks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                title TEXT NOT NULL,
+                description TEXT,
+                category TEXT,
+                priority INTEGER CHECK(priority >= 1 AND priority <= 5),
+                due_date TEXT,
+                status TEXT DEFAULT 'pending',
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+
+            CREATE TABLE IF NOT EXISTS attachments (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                task_id INTEGER NOT NULL,
+                filename TEXT NOT NULL,
+                file_path TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (task_id) REFERENCES tasks(id) ON DELETE CASCADE
+            );
+
+            -- Versión global de los datos: Task la incrementa en cada escritura
+            CREATE TABLE IF NOT EXISTS data_version (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                version INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 0);
+        ''', 'create tables'),
+        # Soporta la paginación por cursor sobre (created_at, id)
+        CreateIndex('idx_tasks_created_at_id', 'tasks', 'created_at DESC, id DESC'),
+        # Índices compuestos para los filtros y ordenaciones de GET /api/tasks
+        CreateIndex('idx_tasks_due_date', 'tasks', 'due_date'),
+        CreateIndex('idx_tasks_status_due_date', 'tasks', 'status, due_date'),
+        CreateIndex('idx_tasks_status_created_at', 'tasks', 'status, created_at'),
+        CreateIndex('idx_tasks_category_due_date', 'tasks', 'category, due_date'),
+        CreateIndex('idx_tasks_priority_due_date', 'tasks', 'priority, due_date'),
+    ]),
+    Migration(2, 'attachment content', [
+        AddColumn('attachments', 'content_hash', 'TEXT'),
+        AddColumn('attachments', 'size', 'INTEGER'),
+        AddColumn('attachments', 'content_type', 'TEXT'),
+        CreateIndex('idx_attachments_task_id', 'attachments', 'task_id'),
+        CreateIndex('idx_attachments_content_hash', 'attachments', 'content_hash'),
+    ]),
+    Migration(3, 'full-text search', [
+        Call(_init_search, 'create tasks_fts'),
+    ]),
+    Migration(4, 'change tracking', [
+        # Versión de datos de la última escritura de cada tarea (0: anterior a la migración)
+        AddColumn('tasks', 'version', 'INTEGER NOT NULL DEFAULT 0'),
+        CreateIndex('idx_tasks_version', 'tasks', 'version'),
+        Sql('''
+            CREATE TABLE IF NOT EXISTS task_tombstones (
+                id INTEGER PRIMARY KEY,
+                version INTEGER NOT NULL,
+                deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+            CREATE INDEX IF NOT EXISTS idx_task_tombstones_version
+                ON task_tombstones (version);
+        ''', 'create task_tombstones'),
+        # Lápidas podadas hasta esta versión: versiones anteriores ya no sirven para sincronizar
+        AddColumn('data_version', 'pruned_version', 'INTEGER NOT NULL DEFAULT 0'),
+    ]),
+    Migration(5, 'task statistics', [
+        Call(_init_stats, 'create task_stats'),
+    ]),
+    Migration(6, 'recurring tasks', [
+        # Regla RRULE de las tareas recurrentes (NULL: tarea normal); due_date es la primera ocurrencia
+        AddColumn('tasks', 'recurrence', 'TEXT'),
+        CreateIndex('idx_tasks_recurring', 'tasks', 'due_date', where='recurrence IS NOT NULL'),
+        Sql(OCCURRENCES_SCHEMA, 'create task_occurrences'),
+        Call(_upgrade_stats, 'exclude recurring tasks from task_stats.open_due'),
+    ]),
+    Migration(7, 'attachment content types', [
+        # Adjuntos anteriores a la migración 2: sin tipo, X-Accel-Redirect los serviría como text/html
+        Backfill('attachments', 'content_type', "'application/octet-stream'"),
+    ]),
+]
+
+# Versión del esquema guardada en PRAGMA user_version
+SCHEMA_VERSION = MIGRATIONS[-1].version
@@ -0,0 +1,236 @@
+import json
+import os
+import socket
+import threading
+import time
+
+# Cambios pendientes por cliente antes de desconectarlo y tiempo de agrupación
+EVENTS_QUEUE_SIZE = int(os.environ.get('EVENTS_QUEUE_SIZE', 256))
+EVENTS_COALESCE = float(os.environ.get('EVENTS_COALESCE', 0.05))
+# Clientes SSE simultáneos por proceso y segundos entre comentarios keep-alive
+EVENTS_MAX_SUBSCRIBERS = int(os.environ.get('EVENTS_MAX_SUBSCRIBERS', 100))
+EVENTS_HEARTBEAT = float(os.environ.get('EVENTS_HEARTBEAT', 15))
+# Directorio de sockets Unix compartido por los workers (vacío = un solo proceso)
+EVENTS_IPC_DIR = os.environ.get('EVENTS_IPC_DIR', '')
+
+# Tamaño máximo de un datagrama entre workers
+_DATAGRAM_SIZE = 65536
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+class Subscription:
+    """Cola acotada de un cliente con los cambios agrupados por tarea.
+
+    Varias escrituras sobre la misma tarea ocupan una sola entrada: solo
+    importa la última operación. Si la cola se llena el cliente se marca como
+    descartado en lugar de bloquear a quien publica.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._cond = threading.Condition()
+        self._pending = {}
+        self.version = 0
+        self.dropped = False
+
+    def push(self, version, changes):
+        with self._cond:
+            if self.dropped:
+                return False
+            for op, task_id in changes:
+                if task_id not in self._pending and len(self._pending) >= self.maxsize:
+                    self.dropped = True
+                    self._pending.clear()
+                    break
+                # Creada y luego modificada sigue siendo nueva para el cliente; un
+                # recordatorio no se pierde por un cambio posterior (este se sincroniza por versión)
+                if not (op == 'updated' and self._pending.get(task_id) == 'created') \
+                        and self._pending.get(task_id) != 'reminder':
+                    self._pending[task_id] = op
+            self.version = max(self.version, version)
+            self._cond.notify()
+            return not self.dropped
+
+    def get(self, timeout, coalesce=0):
+        """Espera cambios; devuelve {'version', 'changes'} o None si vence el timeout"""
+        with self._cond:
+            if not self._pending and not self.dropped:
+                self._cond.wait(timeout)
+            if not self._pending:
+                return None
+        if coalesce:
+            # Deja que llegue el resto de una ráfaga antes de enviar
+            time.sleep(coalesce)
+        with self._cond:
+            pending, self._pending = self._pending, {}
+            return {
+                'version': self.version,
+                'changes': [{'op': op, 'id': task_id} for task_id, op in pending.items()],
+            }
+
+
+class EventBroker:
+    """Reparte los cambios de Task entre los clientes SSE del proceso.
+
+    publish() nunca bloquea: entrega en memoria a cada suscriptor y, si hay
+    canal IPC, envía un datagrama no bloqueante a los demás workers.
+    """
+
+    def __init__(self, queue_size=EVENTS_QUEUE_SIZE, max_subscribers=EVENTS_MAX_SUBSCRIBERS):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._listeners = []
+        self.configure(queue_size, max_subscribers)
+        self._ipc_dir = None
+        self._ipc_socket = None
+        self._ipc_path = None
+        self._ipc_thread = None
+        self.published = 0
+        self.dropped = 0
+
+    def configure(self, queue_size=EVENTS_QUEUE_SIZE, max_subscribers=EVENTS_MAX_SUBSCRIBERS):
+        self.queue_size = int(queue_size)
+        self.max_subscribers = int(max_subscribers)
+
+    def subscribe(self):
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                raise TooManySubscribers('Too many subscribers')
+            subscription = Subscription(self.queue_size)
+            self._subscribers.add(subscription)
+            return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def add_listener(self, callback):
+        """callback(version, changes) recibe, además de los clientes, cada publicación.
+
+        Se llama en el hilo que publica (el escritor o el receptor IPC): debe ser barato.
+        """
+        with self._lock:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        with self._lock:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    def publish(self, version, changes, forward=True):
+        """Entrega `changes` [(op, task_id), ...] confirmados en `version`"""
+        changes = list(changes)
+        if not changes:
+            return
+        with self._lock:
+            subscribers = list(self._subscribers)
+            listeners = list(self._listeners)
+            self.published += 1
+        for listener in listeners:
+            listener(version, changes)
+        for subscription in subscribers:
+            if not subscription.push(version, changes):
+                # Cliente lento: se desconecta y al reconectar sincroniza con /changes
+                with self._lock:
+                    if subscription in self._subscribers:
+                        self._subscribers.discard(subscription)
+                        self.dropped += 1
+        if forward and self._ipc_socket is not None:
+            self._forward(version, changes)
+
+    # Canal IPC entre workers: un socket Unix de datagramas por proceso
+
+    def start_ipc(self, directory):
+        """Escucha en `directory` los cambios publicados por otros workers"""
+        if self._ipc_socket is not None:
+            return
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{os.getpid()}-{id(self):x}.sock')
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.bind(path)
+        self._ipc_dir, self._ipc_path, self._ipc_socket = directory, path, sock
+        self._ipc_thread = threading.Thread(target=self._receive, args=(sock,), daemon=True)
+        self._ipc_thread.start()
+
+    def stop_ipc(self):
+        sock, self._ipc_socket = self._ipc_socket, None
+        if sock is None:
+            return
+        try:
+            os.unlink(self._ipc_path)
+        except OSError:
+            pass
+        # Despierta al hilo receptor para que termine
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        sock.close()
+
+    def _receive(self, sock):
+        while True:
+            try:
+                data = sock.recv(_DATAGRAM_SIZE)
+            except OSError:
+                return
+            if not data:
+                return
+            try:
+                message = json.loads(data)
+                changes = [(op, task_id) for op, task_id in message['changes']]
+                version = int(message['version'])
+            except (ValueError, KeyError, TypeError):
+                continue
+            self.publish(version, changes, forward=False)
+
+    def _forward(self, version, changes):
+        data = json.dumps({'version': version, 'changes': changes}).encode('utf-8')
+        if len(data) > _DATAGRAM_SIZE:
+            # Lote enorme: basta con avisar de la versión; los clientes piden /changes
+            data = json.dumps({'version': version, 'changes': changes[:1]}).encode('utf-8')
+        sock = self._ipc_socket
+        try:
+            names = os.listdir(self._ipc_dir)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self._ipc_dir, name)
+            if path == self._ipc_path or not name.endswith('.sock'):
+                continue
+            try:
+                sock.sendto(data, socket.MSG_DONTWAIT, path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Worker terminado sin limpiar su socket
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            except OSError:
+                # Buffer del receptor lleno: el evento se pierde, no se bloquea al escritor
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                'subscribers': len(self._subscribers),
+                'published': self.published,
+                'dropped': self.dropped,
+                'ipc': self._ipc_socket is not None,
+            }
+
+
+broker = EventBroker()
+
+
+def init_app(app):
+    if 'EVENTS_QUEUE_SIZE' in app.config or 'EVENTS_MAX_SUBSCRIBERS' in app.config:
+        broker.configure(
+            app.config.get('EVENTS_QUEUE_SIZE', EVENTS_QUEUE_SIZE),
+            app.config.get('EVENTS_MAX_SUBSCRIBERS', EVENTS_MAX_SUBSCRIBERS)
+        )
+    ipc_dir = app.config.get('EVENTS_IPC_DIR', EVENTS_IPC_DIR)
+    if ipc_dir:
+        broker.start_ipc(ipc_dir)
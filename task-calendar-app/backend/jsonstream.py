@@ -0,0 +1,103 @@
+import codecs
+import json
+
+# Tamaño de los bloques leídos del cuerpo de la petición
+CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = ' \t\r\n'
+
+
+class JSONStreamError(ValueError):
+    pass
+
+
+def iter_json_array(stream, chunk_size=CHUNK_SIZE):
+    """Itera los elementos de un array JSON leyendo el stream por bloques.
+
+    Nunca mantiene en memoria más que el bloque actual y el elemento en curso.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    buf = ''
+    pos = 0
+    eof = False
+
+    def fill():
+        nonlocal buf, pos, eof
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            eof = True
+        try:
+            text = text_decoder.decode(chunk or b'', final=not chunk)
+        except UnicodeDecodeError:
+            raise JSONStreamError('Invalid UTF-8 in request body')
+        buf = buf[pos:] + text
+        pos = 0
+
+    def peek():
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in _WHITESPACE:
+                pos += 1
+            if pos < len(buf):
+                return buf[pos]
+            if eof:
+                return ''
+            fill()
+
+    if peek() != '[':
+        raise JSONStreamError('Expected a JSON array')
+    pos += 1
+
+    if peek() == ']':
+        pos += 1
+    else:
+        while True:
+            peek()
+            while True:
+                try:
+                    item, end = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise JSONStreamError('Invalid JSON in request body')
+                    fill()
+                    continue
+                # Un escalar al final del bloque podría estar cortado ("12" de "123")
+                if end == len(buf) and not eof:
+                    fill()
+                    continue
+                break
+            pos = end
+            yield item
+
+            separator = peek()
+            if separator == ',':
+                pos += 1
+            elif separator == ']':
+                pos += 1
+                break
+            else:
+                raise JSONStreamError('Invalid JSON in request body')
+
+    if peek() != '':
+        raise JSONStreamError('Unexpected data after JSON array')
+
+
+def iter_json_array_chunks(batches):
+    """Serializa lotes de elementos como un único array JSON, un fragmento por lote"""
+    yield '['
+    first = True
+    for batch in batches:
+        if not batch:
+            continue
+        chunk = ','.join(json.dumps(item, separators=(',', ':')) for item in batch)
+        yield chunk if first else ',' + chunk
+        first = False
+    yield ']'
+
+
+def iter_ndjson_chunks(batches):
+    """Serializa lotes de elementos como NDJSON (un documento por línea)"""
+    for batch in batches:
+        if batch:
+            yield ''.join(json.dumps(item, separators=(',', ':')) + '\n' for item in batch)
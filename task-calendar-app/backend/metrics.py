@@ -0,0 +1,215 @@
+"""
+Métricas de peticiones HTTP en formato de texto de Prometheus.
+
+Cada hilo escribe en su propio fragmento (threading.local), así que registrar
+una observación no toma ningún lock: solo un bisect y dos sumas. El lock se
+usa al dar de alta el fragmento de un hilo nuevo, al exportar, que suma los
+fragmentos de todos los hilos, y cuando un hilo termina: su fragmento se suma
+a un acumulado común, de modo que los servidores que abren un hilo por
+petición no acumulan fragmentos.
+"""
+import threading
+import time
+import weakref
+from bisect import bisect_left
+
+from flask import g, request
+
+# Límites superiores de los buckets (segundos), como los de los clientes de Prometheus
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class _Sharded:
+    """Base de las métricas: un diccionario {etiquetas: serie} por hilo"""
+
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._local = threading.local()
+        self._shards = []
+        # Fragmentos de los hilos ya terminados, sumados
+        self._retired = {}
+        self._lock = threading.Lock()
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append(shard)
+            weakref.finalize(threading.current_thread(), self._retire, shard)
+            return shard
+
+    def _retire(self, shard):
+        """Suma el fragmento de un hilo terminado al acumulado y deja de recorrerlo"""
+        with self._lock:
+            self._shards = [other for other in self._shards if other is not shard]
+            for key, value in list(shard.items()):
+                current = self._retired.get(key)
+                self._retired[key] = value if current is None else self._merge(current, value)
+
+    def _snapshot(self):
+        with self._lock:
+            shards = list(self._shards)
+            items = list(self._retired.items())
+        return items + [(key, value) for shard in shards for key, value in list(shard.items())]
+
+    def clear(self):
+        with self._lock:
+            self._retired.clear()
+            for shard in self._shards:
+                shard.clear()
+
+    def _label_text(self, key, extra=None):
+        pairs = list(zip(self.labels, key))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(self._samples())
+        return lines
+
+
+class Gauge(_Sharded):
+    kind = 'gauge'
+
+    def inc(self, key=(), amount=1):
+        shard = self._shard()
+        shard[key] = shard.get(key, 0) + amount
+
+    def dec(self, key=(), amount=1):
+        self.inc(key, -amount)
+
+    @staticmethod
+    def _merge(current, value):
+        return current + value
+
+    def value(self, key=()):
+        return sum(value for k, value in self._snapshot() if k == key)
+
+    def _samples(self):
+        totals = {}
+        for key, value in self._snapshot():
+            totals[key] = totals.get(key, 0) + value
+        if not totals and not self.labels:
+            totals[()] = 0
+        return [f'{self.name}{self._label_text(key)} {_number(value)}'
+                for key, value in sorted(totals.items())]
+
+
+class Histogram(_Sharded):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, key, value):
+        shard = self._shard()
+        series = shard.get(key)
+        if series is None:
+            # Cuentas por bucket (no acumuladas), el de +Inf y la suma
+            series = shard[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    @staticmethod
+    def _merge(current, series):
+        # Lista nueva: _snapshot puede estar leyendo la anterior
+        return [a + b for a, b in zip(current, series)]
+
+    def totals(self):
+        merged = {}
+        for key, series in self._snapshot():
+            series = list(series)
+            current = merged.get(key)
+            merged[key] = series if current is None else [a + b for a, b in zip(current, series)]
+        return merged
+
+    def _samples(self):
+        lines = []
+        for key, series in sorted(self.totals().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{self._label_text(key, ("le", _number(bound)))} {cumulative}')
+            lines.append(f'{self.name}_sum{self._label_text(key)} {_number(series[-1])}')
+            lines.append(f'{self.name}_count{self._label_text(key)} {cumulative}')
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    return value if isinstance(value, str) else repr(value)
+
+
+REQUEST_LABELS = ('endpoint', 'method', 'status')
+
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', 'Tiempo hasta devolver la respuesta', REQUEST_LABELS)
+REQUEST_DB_TIME = Histogram(
+    'http_request_db_seconds', 'Tiempo en SQLite por petición', REQUEST_LABELS)
+RESPONSE_SIZE = Histogram(
+    'http_response_size_bytes', 'Tamaño del cuerpo de las respuestas con longitud conocida',
+    REQUEST_LABELS, SIZE_BUCKETS)
+IN_FLIGHT = Gauge('http_requests_in_flight', 'Peticiones en curso')
+
+REGISTRY = [REQUEST_DURATION, REQUEST_DB_TIME, RESPONSE_SIZE, IN_FLIGHT]
+
+
+def render():
+    """Todas las métricas en formato de texto de Prometheus"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def clear():
+    for metric in REGISTRY:
+        metric.clear()
+
+
+def init_app(app):
+    """Instrumenta todas las peticiones de la aplicación (blueprints y estáticos)"""
+    from database import db_time, reset_db_time
+
+    @app.before_request
+    def start_timer():
+        IN_FLIGHT.inc()
+        reset_db_time()
+        g._metrics_start = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        start = g.pop('_metrics_start', None)
+        if start is None:
+            return response
+        IN_FLIGHT.dec()
+        # La regla y no la URL: /api/tasks/1 y /api/tasks/2 son la misma serie
+        key = (request.endpoint or 'unmatched', request.method, str(response.status_code))
+        REQUEST_DURATION.observe(key, time.perf_counter() - start)
+        REQUEST_DB_TIME.observe(key, db_time())
+        if response.content_length is not None:
+            RESPONSE_SIZE.observe(key, response.content_length)
+        return response
+
+    @app.teardown_request
+    def finish_request(exc):
+        # after_request no se ejecuta si la vista lanza una excepción
+        if g.pop('_metrics_start', None) is not None:
+            IN_FLIGHT.dec()
@@ -0,0 +1,188 @@
+"""
+Migraciones de esquema versionadas con PRAGMA user_version.
+
+Cada migración es una lista de pasos pequeños. Cada paso se confirma por
+separado, así que los escritores solo esperan lo que dura un paso y no la
+migración completa:
+
+- Sql: sentencias DDL rápidas (tablas nuevas, triggers...).
+- AddColumn: ALTER TABLE ADD COLUMN, que en SQLite solo toca el esquema.
+- CreateIndex: un índice por transacción. SQLite no construye índices de
+  forma concurrente; para no bloquear la aplicación, ejecutar
+  `flask --app app migrate` desde otro proceso con la aplicación en marcha.
+- Backfill: UPDATE por lotes de `chunk_size` filas en orden de rowid, con un
+  commit por lote. Es reanudable si se interrumpe.
+
+user_version se actualiza al terminar cada migración, y todos los pasos son
+idempotentes: repetir una migración a medias es seguro.
+"""
+import time
+from abc import ABC, abstractmethod
+from collections import namedtuple
+
+BACKFILL_CHUNK_SIZE = 1000
+
+# Resultado de un paso: versión, descripción, segundos y filas afectadas
+StepResult = namedtuple('StepResult', 'version description seconds rows')
+
+
+class MigrationError(RuntimeError):
+    pass
+
+
+class Step(ABC):
+    """Paso de una migración; run() devuelve el número de filas afectadas"""
+
+    description = ''
+
+    @abstractmethod
+    def run(self, db):
+        pass
+
+
+class Sql(Step):
+    def __init__(self, script, description=None):
+        self.script = script
+        self.description = description or 'sql'
+
+    def run(self, db):
+        db.executescript(self.script)
+        return 0
+
+
+class Call(Step):
+    """Paso arbitrario: fn(db) hace su propio commit"""
+
+    def __init__(self, fn, description=None):
+        self.fn = fn
+        self.description = description or fn.__name__
+
+    def run(self, db):
+        return self.fn(db) or 0
+
+
+class AddColumn(Step):
+    def __init__(self, table, name, definition):
+        self.table = table
+        self.name = name
+        self.definition = definition
+        self.description = f'add column {table}.{name}'
+
+    def run(self, db):
+        existing = {row[1] for row in db.execute(f'PRAGMA table_info({self.table})')}
+        if self.name not in existing:
+            db.execute(f'ALTER TABLE {self.table} ADD COLUMN {self.name} {self.definition}')
+            db.commit()
+        return 0
+
+
+class CreateIndex(Step):
+    def __init__(self, name, table, columns, where=None):
+        self.name = name
+        self.table = table
+        self.columns = columns
+        # Índice parcial: solo las filas que cumplen `where`
+        self.where = where
+        self.description = f'create index {name}'
+
+    def run(self, db):
+        where = f' WHERE {self.where}' if self.where else ''
+        db.execute(f'CREATE INDEX IF NOT EXISTS {self.name} ON {self.table} ({self.columns}){where}')
+        db.commit()
+        return 0
+
+
+class Backfill(Step):
+    """Rellena `column` con `expression` en las filas donde `where` se cumple
+
+    `where` debe dejar de cumplirse una vez rellenada la fila (p. ej.
+    `column IS NULL`); así un backfill interrumpido continúa donde se quedó.
+    """
+
+    def __init__(self, table, column, expression, where=None, chunk_size=None, pause=0):
+        self.table = table
+        self.column = column
+        self.expression = expression
+        self.where = where or f'{column} IS NULL'
+        self.chunk_size = chunk_size or BACKFILL_CHUNK_SIZE
+        self.pause = pause
+        self.description = f'backfill {table}.{column}'
+
+    def run(self, db):
+        statement = (
+            f'UPDATE {self.table} SET {self.column} = {self.expression} '
+            f'WHERE rowid IN (SELECT rowid FROM {self.table} '
+            f'WHERE rowid > ? AND ({self.where}) ORDER BY rowid LIMIT ?)'
+        )
+        last = db.execute(f'SELECT MIN(rowid) - 1 FROM {self.table}').fetchone()[0]
+        total = 0
+        while last is not None:
+            # Último rowid del lote, para que el siguiente empiece detrás
+            end = db.execute(
+                f'SELECT MAX(rowid) FROM (SELECT rowid FROM {self.table} '
+                f'WHERE rowid > ? AND ({self.where}) ORDER BY rowid LIMIT ?)',
+                (last, self.chunk_size),
+            ).fetchone()[0]
+            if end is None:
+                break
+            total += db.execute(statement, (last, self.chunk_size)).rowcount
+            db.commit()
+            last = end
+            if self.pause:
+                # Deja pasar a los escritores entre lotes
+                time.sleep(self.pause)
+        return total
+
+
+class Migration:
+    def __init__(self, version, description, steps):
+        self.version = version
+        self.description = description
+        self.steps = steps
+
+
+def current_version(db):
+    return db.execute('PRAGMA user_version').fetchone()[0]
+
+
+def pending(db, migrations, target=None):
+    """Migraciones sin aplicar hasta `target` (por defecto, la última)"""
+    version = current_version(db)
+    target = migrations[-1].version if target is None else target
+    return [m for m in migrations if version < m.version <= target]
+
+
+def migrate(db, migrations, target=None, report=None):
+    """Aplica las migraciones pendientes y devuelve un StepResult por paso
+
+    `report`, si se indica, recibe cada StepResult en cuanto termina el paso.
+    """
+    _check_order(migrations)
+    if db.in_transaction:
+        db.commit()
+    results = []
+    for migration in pending(db, migrations, target):
+        for step in migration.steps:
+            start = time.perf_counter()
+            try:
+                rows = step.run(db)
+            except Exception as exc:
+                if db.in_transaction:
+                    db.rollback()
+                raise MigrationError(
+                    f'Migration {migration.version} failed at "{step.description}": {exc}'
+                ) from exc
+            result = StepResult(migration.version, step.description,
+                                time.perf_counter() - start, rows)
+            results.append(result)
+            if report:
+                report(result)
+        db.execute(f'PRAGMA user_version = {migration.version}')
+        db.commit()
+    return results
+
+
+def _check_order(migrations):
+    versions = [m.version for m in migrations]
+    if versions != list(range(1, len(versions) + 1)):
+        raise MigrationError('Migration versions must be consecutive starting at 1')
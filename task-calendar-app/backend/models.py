@@ -1,5 +1,405 @@
-from datetime import datetime
-from database import get_db
+import base64
+import functools
+import html
+import itertools
+import json
+import logging
+import re
+import sqlite3
+from datetime import date, datetime, timedelta
+from database import get_db, get_pool, search_supported
+from blobstore import attachments_root, remove_blob
+from cache import task_cache, MISS
+from events import broker
+from writer import get_writer
+from recurrence import parse_rule, iter_occurrences, is_occurrence, InvalidRecurrence
+
+logger = logging.getLogger('models')
+
+# Límites de la paginación por cursor
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Ocurrencias de series recurrentes que puede devolver una petición
+MAX_OCCURRENCES = 10000
+
+# Filas por fetchmany en los listados en streaming
+STREAM_BATCH_SIZE = 500
+
+# Claves de ordenación admitidas: nombre -> (columna, dirección)
+SORT_KEYS = {
+    'created_at': ('created_at', 'ASC'),
+    '-created_at': ('created_at', 'DESC'),
+    'updated_at': ('updated_at', 'ASC'),
+    '-updated_at': ('updated_at', 'DESC'),
+    'due_date': ('due_date', 'ASC'),
+    '-due_date': ('due_date', 'DESC'),
+    'priority': ('priority', 'ASC'),
+    '-priority': ('priority', 'DESC'),
+    'title': ('title', 'ASC'),
+    '-title': ('title', 'DESC'),
+}
+DEFAULT_SORT = '-created_at'
+
+# Operaciones en lote: máximo por petición y filas por executemany
+BATCH_MAX_SIZE = 1000
+BATCH_CHUNK_SIZE = 500
+# Evento publicado para cada operación del lote
+BATCH_EVENTS = {'create': 'created', 'update': 'updated', 'delete': 'deleted'}
+
+# Cada escritura guarda en tasks.version (o en la lápida) la versión de datos
+# que la confirma; GET /api/tasks/changes devuelve lo posterior a una versión
+INSERT_SQL = '''
+    INSERT INTO tasks (title, description, category, priority, due_date, status, version, recurrence)
+    VALUES (?, ?, ?, ?, ?, 'pending', ?, ?)
+'''
+UPDATE_SQL = '''
+    UPDATE tasks 
+    SET title = ?, description = ?, category = ?, priority = ?, due_date = ?, status = ?, updated_at = CURRENT_TIMESTAMP,
+        version = ?
+    WHERE id = ?
+'''
+DELETE_SQL = 'DELETE FROM tasks WHERE id = ?'
+ATTACHMENT_PATHS_SQL = 'SELECT file_path FROM attachments WHERE task_id = ?'
+# Columnas modificables con PATCH, en el orden en que aparecen en la sentencia
+PATCH_FIELDS = ('title', 'description', 'category', 'priority', 'due_date', 'status', 'recurrence')
+# Columnas de task_occurrences que cambian una sola ocurrencia de una serie
+OCCURRENCE_FIELDS = ('title', 'description', 'priority', 'due_date', 'status', 'cancelled')
+TOMBSTONE_SQL = 'INSERT OR REPLACE INTO task_tombstones (id, version) VALUES (?, ?)'
+BUMP_VERSION_SQL = 'UPDATE data_version SET version = version + 1 WHERE id = 1'
+
+# Días que se conservan las lápidas de tareas borradas (flask prune-tombstones)
+TOMBSTONE_MAX_AGE_DAYS = 30
+
+# Dimensiones de task_stats y su clave en la respuesta de GET /api/stats
+STATS_GROUPS = {'status': 'by_status', 'category': 'by_category', 'priority': 'by_priority'}
+
+# Búsqueda de texto completo
+SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+HIGHLIGHT_OPEN = '<mark>'
+HIGHLIGHT_CLOSE = '</mark>'
+# Marcas que devuelve SQLite; se cambian por <mark> después de escapar el texto del usuario
+_HIGHLIGHT_START = '\ue000'
+_HIGHLIGHT_END = '\ue001'
+_SEARCH_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+# Filtros admitidos en las consultas de listado
+FILTER_KEYS = ('status', 'category', 'priority_min', 'priority_max', 'due_from', 'due_to')
+
+# Columnas que se pueden pedir con ?fields= (proyección del SELECT)
+TASK_FIELDS = (
+    'id', 'title', 'description', 'category', 'priority', 'due_date', 'status',
+    'created_at', 'updated_at', 'version', 'recurrence'
+)
+
+
+# Task.update: sin cambiar la regla de recurrencia
+KEEP = object()
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class InvalidFilter(ValueError):
+    pass
+
+
+class SearchUnavailable(Exception):
+    pass
+
+
+class ChangesExpired(Exception):
+    """La versión pedida es anterior a las lápidas conservadas o posterior a la actual"""
+
+
+def encode_cursor(sort_value, task_id):
+    raw = json.dumps([sort_value, task_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_value, task_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError, UnicodeError):
+        raise InvalidCursor('Invalid cursor')
+    # None: la última fila tenía la clave de orden a NULL
+    if not isinstance(sort_value, (str, int, type(None))) or not isinstance(task_id, int) \
+            or isinstance(sort_value, bool) or isinstance(task_id, bool):
+        raise InvalidCursor('Invalid cursor')
+    return sort_value, task_id
+
+
+def _keyset_segments(column, direction, sort_value, task_id):
+    """Condiciones, en orden, de las filas posteriores a (sort_value, task_id) en ORDER BY column, id.
+
+    SQLite ordena NULL antes que cualquier valor en ASC (y después en DESC), y
+    la comparación por filas (column, id) > (?, ?) nunca es cierta con NULL.
+    En lugar de añadir un OR que impide usar el índice, el tramo de NULL se
+    consulta aparte y solo cuando el de valores no llena la página.
+    """
+    if direction == 'ASC':
+        if sort_value is None:
+            return [(f'{column} IS NULL AND id > ?', [task_id]), (f'{column} IS NOT NULL', [])]
+        return [(f'({column}, id) > (?, ?)', [sort_value, task_id])]
+    if sort_value is None:
+        return [(f'{column} IS NULL AND id < ?', [task_id])]
+    return [(f'({column}, id) < (?, ?)', [sort_value, task_id]), (f'{column} IS NULL', [])]
+
+
+def _keyset_rows(db, select, clauses, params, column, direction, after, limit):
+    """Hasta `limit` filas de tasks posteriores a `after` ((sort_value, task_id) o None)"""
+    segments = [(None, [])] if after is None else _keyset_segments(column, direction, *after)
+    rows = []
+    for clause, clause_params in segments:
+        where_clauses = clauses + [clause] if clause else clauses
+        where = f"WHERE {' AND '.join(where_clauses)} " if where_clauses else ''
+        rows.extend(db.execute(
+            f'SELECT {_select_list(select)} FROM tasks {where}ORDER BY {column} {direction}, id {direction} LIMIT ?',
+            params + clause_params + [limit - len(rows)]
+        ).fetchall())
+        if len(rows) >= limit:
+            break
+    return rows
+
+
+def _parse_int(filters, key):
+    value = filters.get(key)
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise InvalidFilter(f'Invalid {key}')
+
+
+def build_where(filters):
+    """Traduce los filtros de listado a (cláusulas WHERE, parámetros)"""
+    filters = filters or {}
+    clauses = []
+    params = []
+
+    for column in ('status', 'category'):
+        value = filters.get(column)
+        if value:
+            # Se admiten varios valores separados por comas: ?status=pending,in_progress
+            values = [v for v in str(value).split(',') if v]
+            if len(values) == 1:
+                clauses.append(f'{column} = ?')
+            else:
+                clauses.append(f'{column} IN ({", ".join("?" * len(values))})')
+            params.extend(values)
+
+    priority_min = _parse_int(filters, 'priority_min')
+    if priority_min is not None:
+        clauses.append('priority >= ?')
+        params.append(priority_min)
+    priority_max = _parse_int(filters, 'priority_max')
+    if priority_max is not None:
+        clauses.append('priority <= ?')
+        params.append(priority_max)
+
+    due_from = filters.get('due_from')
+    due_to = filters.get('due_to')
+    if due_from:
+        clauses.append('due_date >= ?')
+        params.append(due_from)
+    elif due_to:
+        # Las tareas sin fecha se guardan como '' y quedan fuera de cualquier rango
+        clauses.append("due_date > ''")
+    if due_to:
+        clauses.append('due_date <= ?')
+        params.append(due_to)
+
+    return clauses, params
+
+
+def matches_filters(task, filters):
+    """build_where evaluado en Python, para filas que no salen de SQL (ocurrencias)"""
+    filters = filters or {}
+    for column in ('status', 'category'):
+        value = filters.get(column)
+        if value and task[column] not in [v for v in str(value).split(',') if v]:
+            return False
+
+    priority = task['priority']
+    priority_min = _parse_int(filters, 'priority_min')
+    if priority_min is not None and (priority is None or priority < priority_min):
+        return False
+    priority_max = _parse_int(filters, 'priority_max')
+    if priority_max is not None and (priority is None or priority > priority_max):
+        return False
+
+    due_date = task['due_date']
+    due_from = filters.get('due_from')
+    due_to = filters.get('due_to')
+    if (due_from or due_to) and not due_date:
+        return False
+    if due_from and due_date < due_from:
+        return False
+    if due_to and due_date > due_to:
+        return False
+    return True
+
+
+def _due_window(filters):
+    """(primer día, último día) si los filtros acotan due_date por los dos lados"""
+    filters = filters or {}
+    if not (filters.get('due_from') and filters.get('due_to')):
+        return None
+    window = []
+    for key in ('due_from', 'due_to'):
+        try:
+            window.append(date.fromisoformat(filters[key][:10]))
+        except ValueError:
+            raise InvalidFilter(f'Invalid {key}')
+    return _clamp_window(*window)
+
+
+def _clamp_window(first, last):
+    # El día siguiente a `last` se usa como límite exclusivo: 9999-12-31 desbordaría
+    return first, min(last, date.max - timedelta(days=1))
+
+
+def _series(task):
+    """(regla, primera fecha) de una tarea recurrente"""
+    if not task['recurrence']:
+        raise InvalidFilter('Task is not recurring')
+    try:
+        return parse_rule(task['recurrence']), date.fromisoformat(task['due_date'][:10])
+    except (InvalidRecurrence, TypeError, ValueError):
+        raise InvalidFilter('Task has an invalid recurrence')
+
+
+def _check_series(recurrence, due_date):
+    """Una serie necesita due_date (su primera ocurrencia); si no, no tendría ocurrencias"""
+    if recurrence is None:
+        return
+    try:
+        date.fromisoformat(str(due_date or '')[:10])
+    except ValueError:
+        raise InvalidRecurrence('Recurring tasks need a due_date')
+
+
+def _occurrence(task, day, override):
+    """Ocurrencia `day` (YYYY-MM-DD) de la serie `task`; None si se ha cancelado"""
+    if override is not None and override['cancelled']:
+        return None
+    occurrence = dict(task)
+    # La hora de la serie, si due_date la lleva, se mantiene en cada ocurrencia
+    occurrence['due_date'] = day + task['due_date'][10:]
+    occurrence['occurrence_date'] = day
+    if override is not None:
+        for column in OCCURRENCE_FIELDS:
+            if column != 'cancelled' and override[column] is not None:
+                occurrence[column] = override[column]
+    return occurrence
+
+
+def _sort_key(column):
+    # Mismo orden que SQLite: NULL antes que cualquier valor; a igualdad, id y fecha de la ocurrencia
+    def key(task):
+        value = task[column]
+        return value is not None, value if value is not None else 0, task['id'], task.get('occurrence_date', '')
+    return key
+
+
+def parse_fields(value):
+    """Convierte ?fields=id,title en una tupla de columnas (None = todas)"""
+    if value is None:
+        return None
+    # Sin duplicados y en el orden pedido, que es el de las columnas del formato columnar
+    fields = tuple(dict.fromkeys(field.strip() for field in value.split(',') if field.strip()))
+    if not fields or any(field not in TASK_FIELDS for field in fields):
+        raise InvalidFilter('Invalid fields')
+    return fields
+
+
+def _select_list(fields):
+    # Las columnas vienen de parse_fields: solo nombres de TASK_FIELDS
+    return ', '.join(fields) if fields else '*'
+
+
+def _highlight_html(text):
+    if text is None:
+        return None
+    # Solo las marcas se convierten en etiquetas; todo lo demás se escapa
+    return html.escape(text, quote=False).replace(_HIGHLIGHT_START, HIGHLIGHT_OPEN).replace(
+        _HIGHLIGHT_END, HIGHLIGHT_CLOSE)
+
+
+def build_match_query(text):
+    """Convierte texto libre en una consulta FTS5 segura con búsqueda por prefijo"""
+    tokens = _SEARCH_TOKEN.findall(text or '')
+    if not tokens:
+        raise InvalidFilter('Missing search query')
+    # Cada término entre comillas (sin operadores FTS5) y con prefijo: "cal"* "reu"*
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def resolve_sort(sort):
+    if not sort:
+        sort = DEFAULT_SORT
+    if sort not in SORT_KEYS:
+        raise InvalidFilter('Invalid sort')
+    return SORT_KEYS[sort]
+
+
+@functools.lru_cache(maxsize=None)
+def _occurrence_sql(columns):
+    """UPSERT de las columnas `columns` de una ocurrencia; las demás se conservan"""
+    assignments = ''.join(f'{column} = excluded.{column}, ' for column in columns)
+    return (
+        f'INSERT INTO task_occurrences (task_id, occurrence_date, {", ".join(columns)}) '
+        f'VALUES (?, ?{", ?" * len(columns)}) '
+        f'ON CONFLICT (task_id, occurrence_date) DO UPDATE SET {assignments}updated_at = CURRENT_TIMESTAMP'
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _patch_sql(columns):
+    """UPDATE con solo `columns`; el mismo texto para el mismo conjunto de campos
+    permite reutilizar la sentencia preparada de la caché de sqlite3"""
+    assignments = ''.join(f'{column} = ?, ' for column in columns)
+    return f'UPDATE tasks SET {assignments}updated_at = CURRENT_TIMESTAMP, version = ? WHERE id = ?'
+
+
+def _remove_unreferenced_blobs(db, root, paths):
+    """Borra los blobs de `paths` que ya no usa ningún adjunto.
+
+    Se llama después de confirmar la escritura que quitó los registros (si se
+    deshace, los ficheros siguen en su sitio) y en su propia transacción
+    BEGIN IMMEDIATE: una subida del mismo contenido no puede reutilizar el
+    fichero entre la comprobación y el borrado.
+    """
+    paths = set(paths)
+    if not paths:
+        return
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        for path in paths:
+            if db.execute('SELECT 1 FROM attachments WHERE file_path = ? LIMIT 1', (path,)).fetchone() is None:
+                remove_blob(root, path)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+
+def _remove_orphans(root, paths):
+    """_remove_unreferenced_blobs tras un borrado ya confirmado: un fallo solo deja ficheros huérfanos"""
+    if not paths:
+        return
+    db = get_db()
+    try:
+        _remove_unreferenced_blobs(db, root, paths)
+    except (sqlite3.Error, OSError):
+        logger.exception('Could not remove unreferenced attachment files')
+    finally:
+        db.close()
+
 
 class Task:
     def __init__(self, title, description, category, priority, due_date, status='pending', id=None):
@@ -13,46 +413,694 @@ class Task:
         self.created_at = datetime.now().isoformat()
 
     @staticmethod
-    def create(title, description, category, priority, due_date):
+    def create(title, description, category, priority, due_date, recurrence=None):
+        def insert(db):
+            version = Task._bump_version(db)
+            cursor = db.cursor()
+            cursor.execute(INSERT_SQL, (title, description, category, priority, due_date, version, recurrence))
+            return cursor.lastrowid, version, True
+
+        return Task._write(insert, 'created')[0]
+
+    @staticmethod
+    def _write(operation, event):
+        """Ejecuta operation(db) -> (task_id, version, changed) y la confirma.
+
+        Con group commit activado la operación la ejecuta el hilo escritor,
+        compartiendo transacción con otras escrituras concurrentes.
+        """
+        writer = get_writer()
+        if writer is not None:
+            return writer.submit(operation, lambda result: Task._after_write(event, result))
         db = get_db()
+        try:
+            result = operation(db)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        Task._after_write(event, result)
+        return result
+
+    @staticmethod
+    def _after_write(event, result):
+        task_id, version, changed = result
+        task_cache.invalidate([task_id], version)
+        if changed:
+            broker.publish(version, [(event, task_id)])
+
+    @staticmethod
+    def _list_query(filters, sort, fields=None, expand=False):
+        column, direction = resolve_sort(sort)
+        clauses, params = build_where(filters)
+        if expand:
+            # Las series se sustituyen por sus ocurrencias (Task._window_occurrences)
+            clauses.append('recurrence IS NULL')
+        where = f"WHERE {' AND '.join(clauses)} " if clauses else ''
+        query = f'SELECT {_select_list(fields)} FROM tasks {where}ORDER BY {column} {direction}, id {direction}'
+        return query, params, column, direction
+
+    @staticmethod
+    def get_all(filters=None, sort=DEFAULT_SORT, fields=None):
+        """Tareas que cumplen `filters` ordenadas por `sort`.
+
+        Si due_from y due_to acotan la fecha, cada tarea recurrente se sustituye
+        por sus ocurrencias dentro de ese intervalo (con `occurrence_date`).
+        """
+        window = _due_window(filters)
+        column, direction = resolve_sort(sort)
+        select = fields
+        if window and fields:
+            # Para mezclar ocurrencias hacen falta la clave de orden y el id
+            select = fields + tuple(key for key in (column, 'id') if key not in fields)
+        query, params, column, direction = Task._list_query(filters, sort, select, expand=window is not None)
+        key = ('all', tuple(sorted((filters or {}).items())), column, direction, fields)
+        db = get_db()
+        generation = task_cache.sync(db)
+        cached = task_cache.get(key)
+        if cached is not MISS:
+            db.close()
+            return [dict(task) for task in cached]
+
+        tasks = db.execute(query, params).fetchall()
+        tasks = [dict(task) for task in tasks]
+        if window:
+            occurrences = Task._window_occurrences(db, filters, window)
+            if occurrences:
+                tasks = sorted(tasks + occurrences, key=_sort_key(column), reverse=direction == 'DESC')
+            if fields:
+                tasks = [
+                    {key: task[key] for key in fields + (('occurrence_date',) if 'occurrence_date' in task else ())}
+                    for task in tasks
+                ]
+        db.close()
+        task_cache.set(key, tasks, generation)
+        # Se devuelven copias para que el llamador no altere la caché
+        return [dict(task) for task in tasks] if task_cache.enabled else tasks
+
+    @staticmethod
+    def _window_occurrences(db, filters, window):
+        """Ocurrencias de las series que cumplen `filters` dentro de window (fechas)"""
+        first, last = window
+        # La categoría es de la serie; estado y prioridad pueden cambiar en cada ocurrencia
+        clauses, params = build_where({'category': filters.get('category')})
+        clauses.append("recurrence IS NOT NULL AND due_date > '' AND due_date < ?")
+        params.append((last + timedelta(days=1)).isoformat())
+        series = db.execute(f"SELECT * FROM tasks WHERE {' AND '.join(clauses)}", params).fetchall()
+        return [
+            occurrence for occurrence in Task._expand(db, series, first, last)
+            if matches_filters(occurrence, filters)
+        ]
+
+    @staticmethod
+    def _expand(db, series, first, last):
+        """Ocurrencias de `series` con fecha entre first y last, con sus cambios aplicados.
+
+        Las fechas salen de iter_occurrences, que solo recorre los periodos de
+        la ventana; de task_occurrences se leen solo los cambios que caen en ella.
+        """
+        first_day, last_day = first.isoformat(), last.isoformat()
+        next_day = (last + timedelta(days=1)).isoformat()
+        overrides = {}
+        ids = [task['id'] for task in series]
+        for offset in range(0, len(ids), BATCH_CHUNK_SIZE):
+            chunk = ids[offset:offset + BATCH_CHUNK_SIZE]
+            rows = db.execute(f'''
+                SELECT * FROM task_occurrences
+                WHERE task_id IN ({", ".join("?" * len(chunk))})
+                  AND (occurrence_date BETWEEN ? AND ? OR (due_date >= ? AND due_date < ?))
+            ''', chunk + [first_day, last_day, first_day, next_day]).fetchall()
+            for row in rows:
+                overrides.setdefault(row['task_id'], {})[row['occurrence_date']] = row
+
+        occurrences = []
+        for task in series:
+            try:
+                rule, start = _series(task)
+            except InvalidFilter:
+                # Regla o fecha inicial inválidas: la serie no tiene ocurrencias
+                continue
+            changed = overrides.get(task['id'], {})
+            # Ventanas enormes (p. ej. hasta 9999) con series sin fin: se corta antes de generarlas
+            budget = MAX_OCCURRENCES - len(occurrences)
+            days = itertools.islice(iter_occurrences(rule, start, first, last), budget + 1)
+            days = [day.isoformat() for day in days]
+            if len(days) > budget:
+                raise InvalidFilter('Too many occurrences; narrow the date window')
+            # Ocurrencias de fuera de la ventana que se han movido a ella
+            days.extend(
+                day for day in changed
+                if not first_day <= day <= last_day and is_occurrence(rule, start, date.fromisoformat(day))
+            )
+            for day in days:
+                occurrence = _occurrence(task, day, changed.get(day))
+                if occurrence is not None and first_day <= occurrence['due_date'][:10] <= last_day:
+                    occurrences.append(occurrence)
+        return occurrences
+
+    @staticmethod
+    def get_occurrences(task_id, first, last):
+        """Ocurrencias de una tarea recurrente entre las fechas first y last.
+
+        Devuelve None si la tarea no existe.
+        """
+        db = get_db()
+        try:
+            task = db.execute('SELECT * FROM tasks WHERE id = ?', (task_id,)).fetchone()
+            if task is None:
+                return None
+            _series(task)
+            occurrences = Task._expand(db, [task], *_clamp_window(first, last))
+        finally:
+            db.close()
+        return sorted(occurrences, key=lambda occurrence: occurrence['due_date'])
+
+    @staticmethod
+    def set_occurrence(task_id, day, fields):
+        """Cambia solo las columnas `fields` (de OCCURRENCE_FIELDS) de la ocurrencia `day`.
+
+        None vuelve al valor de la serie. Devuelve False si la tarea no existe.
+        """
+        columns = tuple(column for column in OCCURRENCE_FIELDS if column in fields)
+        if not columns or len(columns) != len(fields):
+            raise ValueError('Unknown field')
+        def write(db):
+            version = Task._bump_version(db)
+            task = db.execute('SELECT recurrence, due_date FROM tasks WHERE id = ?', (task_id,)).fetchone()
+            if task is None:
+                return task_id, version, False
+            if not is_occurrence(*_series(task), day):
+                raise InvalidFilter('Not an occurrence of this task')
+            db.execute(_occurrence_sql(columns), [task_id, day.isoformat()] + [fields[c] for c in columns])
+            # La serie aparece en GET /api/tasks/changes
+            db.execute('UPDATE tasks SET version = ? WHERE id = ?', (version, task_id))
+            return task_id, version, True
+
+        return Task._write(write, 'updated')[2]
+
+    @staticmethod
+    def clear_occurrence(task_id, day):
+        """Deshace los cambios de una ocurrencia; devuelve False si no tenía"""
+        def write(db):
+            version = Task._bump_version(db)
+            deleted = db.execute(
+                'DELETE FROM task_occurrences WHERE task_id = ? AND occurrence_date = ?',
+                (task_id, day.isoformat())
+            ).rowcount
+            if deleted:
+                db.execute('UPDATE tasks SET version = ? WHERE id = ?', (version, task_id))
+            return task_id, version, bool(deleted)
+
+        return Task._write(write, 'updated')[2]
+
+    @staticmethod
+    def get_columns(filters=None, sort=DEFAULT_SORT, fields=None):
+        """Como get_all, pero en formato columnar: {'columns': [...], 'rows': [[...], ...]}.
+
+        Las filas son las tuplas del cursor, sin crear un diccionario por tarea
+        ni repetir los nombres de las columnas en cada una. Con due_from y due_to
+        las series se expanden como en get_all y se añade la columna occurrence_date.
+        """
+        if _due_window(filters):
+            columns = list(fields or TASK_FIELDS) + ['occurrence_date']
+            tasks = Task.get_all(filters, sort, fields)
+            return {'columns': columns, 'rows': [tuple(task.get(column) for column in columns) for task in tasks]}
+        query, params, column, direction = Task._list_query(filters, sort, fields)
+        key = ('columns', tuple(sorted((filters or {}).items())), column, direction, fields)
+        db = get_db()
+        generation = task_cache.sync(db)
+        cached = task_cache.get(key)
+        if cached is not MISS:
+            db.close()
+            return {'columns': list(cached['columns']), 'rows': list(cached['rows'])}
+
         cursor = db.cursor()
-        cursor.execute('''
-            INSERT INTO tasks (title, description, category, priority, due_date, status)
-            VALUES (?, ?, ?, ?, ?, 'pending')
-        ''', (title, description, category, priority, due_date))
-        db.commit()
-        task_id = cursor.lastrowid
+        cursor.row_factory = None
+        cursor.execute(query, params)
+        columns = [description[0] for description in cursor.description]
+        rows = cursor.fetchall()
+        db.close()
+        task_cache.set(key, {'columns': columns, 'rows': rows}, generation)
+        # Las tuplas son inmutables: basta con copiar las listas
+        if task_cache.enabled:
+            return {'columns': list(columns), 'rows': list(rows)}
+        return {'columns': columns, 'rows': rows}
+
+    @staticmethod
+    def iter_all(filters=None, sort=DEFAULT_SORT, batch_size=STREAM_BATCH_SIZE, fields=None):
+        """Como get_all, pero devuelve un generador de lotes de tareas.
+
+        Cada lote es una consulta por keyset (como get_page) y la conexión vuelve
+        al pool entre lotes: un cliente lento no mantiene abierta una transacción
+        de lectura, que sin WAL bloquearía a los escritores. Los lotes no son una
+        instantánea única: una tarea cambiada durante la descarga puede aparecer
+        con sus datos nuevos o en otra posición.
+
+        Con due_from y due_to las series se expanden como en get_all; esa lista
+        ya está acotada (MAX_OCCURRENCES) y se lee entera al llamar.
+
+        Los filtros se validan al llamar; la consulta se lanza al iterar.
+        """
+        if _due_window(filters):
+            tasks = Task.get_all(filters, sort, fields)
+            return (tasks[offset:offset + batch_size] for offset in range(0, len(tasks), batch_size))
+        column, direction = resolve_sort(sort)
+        select = fields
+        if fields:
+            # El keyset necesita la clave de orden y el id aunque no se hayan pedido
+            select = fields + tuple(key for key in (column, 'id') if key not in fields)
+        clauses, params = build_where(filters)
+        # El pool se resuelve ahora: al iterar ya no hay contexto de la aplicación
+        # y current_path() devolvería la base de datos por defecto
+        return Task._iter_batches(get_pool(), clauses, params, column, direction, select, fields, batch_size)
+
+    @staticmethod
+    def _iter_batches(pool, clauses, params, column, direction, select, fields, batch_size):
+        after = None
+        while True:
+            # Conexión propia del pool: el generador puede sobrevivir al contexto de la petición
+            db = pool.acquire()
+            try:
+                rows = _keyset_rows(db, select, clauses, params, column, direction, after, batch_size)
+            finally:
+                db.close()
+            if not rows:
+                return
+            after = (rows[-1][column], rows[-1]['id'])
+            if select is not fields:
+                yield [{key: task[key] for key in fields} for task in rows]
+            else:
+                yield [dict(task) for task in rows]
+            if len(rows) < batch_size:
+                return
+
+    @staticmethod
+    def get_page(limit=DEFAULT_PAGE_SIZE, after=None, filters=None, sort=DEFAULT_SORT, fields=None,
+                 columnar=False):
+        """Devuelve (tareas, next_cursor) usando paginación por cursor sobre (clave de orden, id).
+
+        Con columnar=True las tareas se devuelven como {'columns': [...], 'rows': [[...], ...]}.
+        Las ocurrencias no tienen una clave de cursor propia: con due_from y due_to
+        (que expanden las series) no se pagina.
+        """
+        if _due_window(filters):
+            raise InvalidFilter('limit and after cannot be combined with due_from and due_to')
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        column, direction = resolve_sort(sort)
+        select = fields
+        if fields:
+            # El cursor necesita la clave de orden y el id aunque no se hayan pedido
+            select = fields + tuple(key for key in (column, 'id') if key not in fields)
+        clauses, params = build_where(filters)
+        if after is not None:
+            after = decode_cursor(after)
+
+        db = get_db()
+        # Se pide una fila de más para saber si existe una página siguiente
+        rows = _keyset_rows(db, select, clauses, params, column, direction, after, limit + 1)
         db.close()
-        return task_id
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = encode_cursor(last[column], last['id'])
+        if columnar:
+            columns = list(fields or (rows[0].keys() if rows else TASK_FIELDS))
+            return {'columns': columns, 'rows': [tuple(row)[:len(columns)] for row in rows]}, next_cursor
+        if fields and select != fields:
+            return [{key: row[key] for key in fields} for row in rows], next_cursor
+        return [dict(task) for task in rows], next_cursor
 
     @staticmethod
-    def get_all():
+    def search(text, limit=SEARCH_LIMIT):
+        """Busca en título y descripción; resultados ordenados por relevancia (bm25)"""
+        match = build_match_query(text)
+        limit = max(1, min(int(limit), MAX_SEARCH_LIMIT))
         db = get_db()
-        tasks = db.execute('SELECT * FROM tasks ORDER BY created_at DESC').fetchall()
+        if not search_supported(db):
+            db.close()
+            raise SearchUnavailable('Search is not available')
+        rows = db.execute('''
+            SELECT tasks.*,
+                   highlight(tasks_fts, 0, ?, ?) AS title_highlight,
+                   snippet(tasks_fts, 1, ?, ?, '…', 12) AS snippet,
+                   bm25(tasks_fts, 10.0, 1.0) AS rank
+            FROM tasks_fts
+            JOIN tasks ON tasks.id = tasks_fts.rowid
+            WHERE tasks_fts MATCH ?
+            ORDER BY rank
+            LIMIT ?
+        ''', (_HIGHLIGHT_START, _HIGHLIGHT_END, _HIGHLIGHT_START, _HIGHLIGHT_END, match, limit)).fetchall()
         db.close()
-        return [dict(task) for task in tasks]
+        results = [dict(row) for row in rows]
+        for result in results:
+            # title_highlight y snippet son HTML: el texto del usuario va escapado
+            for key in ('title_highlight', 'snippet'):
+                result[key] = _highlight_html(result[key])
+        return results
+
+    @staticmethod
+    def get_version():
+        """Versión global de los datos; cambia con cada escritura en tasks"""
+        db = get_db()
+        row = db.execute('SELECT version FROM data_version WHERE id = 1').fetchone()
+        db.close()
+        return row[0] if row else 0
+
+    @staticmethod
+    def _bump_version(db):
+        db.execute(BUMP_VERSION_SQL)
+        return db.execute('SELECT version FROM data_version WHERE id = 1').fetchone()[0]
+
+    @staticmethod
+    def get_changes(since):
+        """Tareas creadas o modificadas y ids borrados después de la versión `since`.
+
+        since=0 devuelve todas las tareas (carga inicial, sin lápidas). Devuelve
+        {'version', 'tasks', 'deleted'}; 'version' es el since de la siguiente llamada.
+        """
+        db = get_db()
+        try:
+            # Una sola transacción de lectura: filas y versión del mismo instante
+            if not db.in_transaction:
+                db.execute('BEGIN')
+            version, pruned = db.execute(
+                'SELECT version, pruned_version FROM data_version WHERE id = 1'
+            ).fetchone()
+            if since > version or 0 < since < pruned:
+                raise ChangesExpired(f'Version {since} is no longer available')
+            if since == 0:
+                tasks = db.execute('SELECT * FROM tasks ORDER BY version, id').fetchall()
+                deleted = []
+            else:
+                tasks = db.execute(
+                    'SELECT * FROM tasks WHERE version > ? ORDER BY version, id', (since,)
+                ).fetchall()
+                deleted = [row[0] for row in db.execute(
+                    'SELECT id FROM task_tombstones WHERE version > ? ORDER BY version, id', (since,)
+                ).fetchall()]
+        finally:
+            db.commit()
+            db.close()
+        return {'version': version, 'tasks': [dict(task) for task in tasks], 'deleted': deleted}
+
+    @staticmethod
+    def get_stats(today=None):
+        """Número de tareas por estado, categoría y prioridad, vencidas y para hoy.
+
+        Se lee de task_stats, que mantienen los triggers de cada escritura: el
+        coste no depende del número de tareas. Las pendientes (no completadas)
+        se cuentan por fecha, así que `today` puede ser la fecha local del cliente.
+        """
+        today = today or date.today()
+        db = get_db()
+        try:
+            # Una sola transacción de lectura: contadores y versión del mismo instante
+            if not db.in_transaction:
+                db.execute('BEGIN')
+            stats = {
+                'version': db.execute('SELECT version FROM data_version WHERE id = 1').fetchone()[0],
+                'total': 0,
+                'by_status': {},
+                'by_category': {},
+                'by_priority': {},
+            }
+            for dimension, value, count in db.execute(
+                    "SELECT dimension, value, count FROM task_stats WHERE dimension != 'open_due'"):
+                if dimension == 'total':
+                    stats['total'] = count
+                else:
+                    stats[STATS_GROUPS[dimension]][str(value)] = count
+            # Fechas guardadas como YYYY-MM-DD[...]: hoy es [today, mañana)
+            overdue, due_today = db.execute('''
+                SELECT COALESCE(SUM(CASE WHEN value < ? THEN count END), 0),
+                       COALESCE(SUM(CASE WHEN value >= ? THEN count END), 0)
+                FROM task_stats WHERE dimension = 'open_due' AND value < ?
+            ''', (today.isoformat(), today.isoformat(), (today + timedelta(days=1)).isoformat())).fetchone()
+            db.rollback()
+        finally:
+            db.close()
+        stats.update({'today': today.isoformat(), 'overdue': overdue, 'due_today': due_today})
+        return stats
+
+    @staticmethod
+    def prune_tombstones(max_age_days=TOMBSTONE_MAX_AGE_DAYS):
+        """Borra las lápidas más antiguas que `max_age_days`; devuelve cuántas"""
+        db = get_db()
+        try:
+            db.execute('BEGIN IMMEDIATE')
+            pruned = db.execute(
+                "SELECT MAX(version) FROM task_tombstones WHERE deleted_at < datetime('now', ?)",
+                (f'{-int(max_age_days)} days',)
+            ).fetchone()[0]
+            count = 0
+            if pruned is not None:
+                count = db.execute('DELETE FROM task_tombstones WHERE version <= ?', (pruned,)).rowcount
+                # Los clientes con una versión anterior deben recargar la lista completa
+                db.execute(
+                    'UPDATE data_version SET pruned_version = MAX(pruned_version, ?) WHERE id = 1',
+                    (pruned,)
+                )
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        return count
 
     @staticmethod
     def get_by_id(task_id):
         db = get_db()
+        generation = task_cache.sync(db)
+        cached = task_cache.get(('task', task_id))
+        if cached is not MISS:
+            db.close()
+            return dict(cached) if cached else None
+
         task = db.execute('SELECT * FROM tasks WHERE id = ?', (task_id,)).fetchone()
         db.close()
-        return dict(task) if task else None
+        task = dict(task) if task else None
+        task_cache.set(('task', task_id), task, generation)
+        return dict(task) if task and task_cache.enabled else task
+
+    @staticmethod
+    def update(task_id, title, description, category, priority, due_date, status, recurrence=KEEP):
+        def update_row(db):
+            version = Task._bump_version(db)
+            if recurrence is KEEP:
+                stored = db.execute('SELECT recurrence FROM tasks WHERE id = ?', (task_id,)).fetchone()
+                _check_series(stored and stored['recurrence'], due_date)
+            else:
+                _check_series(recurrence, due_date)
+            updated = db.execute(
+                UPDATE_SQL, (title, description, category, priority, due_date, status, version, task_id)
+            ).rowcount
+            if updated and recurrence is not KEEP:
+                db.execute('UPDATE tasks SET recurrence = ? WHERE id = ?', (recurrence, task_id))
+            return task_id, version, bool(updated)
+
+        Task._write(update_row, 'updated')
+
+    @staticmethod
+    def patch(task_id, fields):
+        """Actualiza solo las columnas de `fields` (subconjunto de PATCH_FIELDS).
+
+        Devuelve False si la tarea no existe.
+        """
+        columns = tuple(column for column in PATCH_FIELDS if column in fields)
+        if len(columns) != len(fields):
+            raise ValueError('Unknown field')
+        def patch_row(db):
+            version = Task._bump_version(db)
+            if 'recurrence' in fields or 'due_date' in fields:
+                # Se valida la pareja resultante: la columna que no llega es la guardada
+                stored = db.execute('SELECT recurrence, due_date FROM tasks WHERE id = ?', (task_id,)).fetchone()
+                if stored is None:
+                    return task_id, version, False
+                _check_series(
+                    fields.get('recurrence', stored['recurrence']), fields.get('due_date', stored['due_date'])
+                )
+            updated = db.execute(
+                _patch_sql(columns), [fields[column] for column in columns] + [version, task_id]
+            ).rowcount
+            return task_id, version, bool(updated)
+
+        return Task._write(patch_row, 'updated')[2]
+
+    @staticmethod
+    def delete(task_id):
+        root = attachments_root()
+        paths = []
+
+        def delete_row(db):
+            version = Task._bump_version(db)
+            paths[:] = [row[0] for row in db.execute(ATTACHMENT_PATHS_SQL, (task_id,)).fetchall()]
+            deleted = db.execute(DELETE_SQL, (task_id,)).rowcount
+            if deleted:
+                db.execute(TOMBSTONE_SQL, (task_id, version))
+            return task_id, version, bool(deleted)
+
+        # Los registros se borran en cascada; los ficheros que nadie más usa, una vez confirmado
+        if Task._write(delete_row, 'deleted')[2]:
+            _remove_orphans(root, paths)
+
+    @staticmethod
+    def apply_batch(operations, chunk_size=BATCH_CHUNK_SIZE):
+        """Ejecuta operaciones validadas en una única transacción.
+
+        operations: iterable de (index, op, task_id, params) con op en
+        'create' | 'update' | 'delete'. Las operaciones consecutivas del mismo
+        tipo se agrupan en un executemany. Devuelve un resultado por operación.
+        """
+        results = []
+        # Ficheros de las tareas borradas: se revisan una vez confirmado el lote
+        paths = []
+        db = get_db()
+        try:
+            # IMMEDIATE toma el bloqueo de escritura desde el principio
+            db.execute('BEGIN IMMEDIATE')
+            operations = list(operations)
+            version = Task._bump_version(db) if operations else None
+            run_op, run = None, []
+            for operation in operations:
+                if operation[1] != run_op or len(run) >= chunk_size:
+                    Task._flush_batch(db, run_op, run, results, version, paths)
+                    run_op, run = operation[1], []
+                run.append(operation)
+            Task._flush_batch(db, run_op, run, results, version, paths)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        _remove_orphans(attachments_root(), paths)
+        if version is not None:
+            task_cache.invalidate([result['id'] for result in results], version)
+            broker.publish(version, [
+                (BATCH_EVENTS[result['op']], result['id']) for result in results if result['status'] < 400
+            ])
+        return results
+
+    @staticmethod
+    def _flush_batch(db, op, run, results, version, paths):
+        if not run:
+            return
+
+        if op == 'create':
+            db.executemany(INSERT_SQL, [params + (version, None) for _, _, _, params in run])
+            # Con AUTOINCREMENT y el bloqueo de escritura tomado, los ids del
+            # executemany son consecutivos y terminan en last_insert_rowid()
+            last_id = db.execute('SELECT last_insert_rowid()').fetchone()[0]
+            first_id = last_id - len(run) + 1
+            for offset, (index, _, _, _) in enumerate(run):
+                results.append({'index': index, 'op': op, 'status': 201, 'id': first_id + offset})
+            return
+
+        ids = [task_id for _, _, task_id, _ in run]
+        # id -> recurrence de las tareas que existen
+        existing = dict(db.execute(
+            f'SELECT id, recurrence FROM tasks WHERE id IN ({", ".join("?" * len(ids))})', ids
+        ).fetchall())
+        rejected = {}
+        if op == 'update':
+            # Como en PUT: el lote no cambia la regla, así que una serie no puede quedarse sin due_date
+            for index, _, task_id, params in run:
+                if task_id in existing:
+                    try:
+                        _check_series(existing[task_id], params[4])
+                    except InvalidRecurrence as e:
+                        rejected[index] = str(e)
+            db.executemany(UPDATE_SQL, [
+                params + (version, task_id) for index, _, task_id, params in run
+                if task_id in existing and index not in rejected
+            ])
+        else:
+            deleted = [(task_id,) for task_id in ids if task_id in existing]
+            paths.extend(row[0] for task_id in deleted for row in db.execute(ATTACHMENT_PATHS_SQL, task_id))
+            db.executemany(DELETE_SQL, deleted)
+            db.executemany(TOMBSTONE_SQL, [(task_id, version) for task_id, in deleted])
+
+        for index, _, task_id, _ in run:
+            if index in rejected:
+                results.append({'index': index, 'op': op, 'status': 400, 'id': task_id, 'error': rejected[index]})
+            elif task_id in existing:
+                results.append({'index': index, 'op': op, 'status': 200, 'id': task_id})
+            else:
+                results.append({
+                    'index': index, 'op': op, 'status': 404, 'id': task_id,
+                    'error': 'Task not found'
+                })
+
+
+class Attachment:
+    @staticmethod
+    def get_by_task(task_id):
+        db = get_db()
+        rows = db.execute(
+            'SELECT * FROM attachments WHERE task_id = ? ORDER BY id', (task_id,)
+        ).fetchall()
+        db.close()
+        return [dict(row) for row in rows]
 
     @staticmethod
-    def update(task_id, title, description, category, priority, due_date, status):
+    def get_by_id(attachment_id):
         db = get_db()
-        db.execute('''
-            UPDATE tasks 
-            SET title = ?, description = ?, category = ?, priority = ?, due_date = ?, status = ?, updated_at = CURRENT_TIMESTAMP
-            WHERE id = ?
-        ''', (title, description, category, priority, due_date, status, task_id))
-        db.commit()
+        row = db.execute('SELECT * FROM attachments WHERE id = ?', (attachment_id,)).fetchone()
         db.close()
+        return dict(row) if row else None
 
     @staticmethod
-    def delete(task_id):
+    def create_many(task_id, uploads, root):
+        """Guarda los ficheros y los registros de `uploads` [(filename, content_type, blob)] en una
+        sola transacción: se crean todos o ninguno. Devuelve los ids.
+
+        blob es un BlobWriter; se mueve a su ruta definitiva con el bloqueo de escritura
+        tomado, así que un borrado concurrente no puede quitar el fichero que se reutiliza.
+        """
         db = get_db()
-        db.execute('DELETE FROM tasks WHERE id = ?', (task_id,))
-        db.commit()
-        db.close()
\ No newline at end of file
+        stored = []
+        try:
+            db.execute('BEGIN IMMEDIATE')
+            ids = []
+            for filename, content_type, blob in uploads:
+                content_hash, size, relative = blob.commit()
+                stored.append(relative)
+                ids.append(db.execute(
+                    'INSERT INTO attachments (task_id, filename, file_path, content_hash, size, content_type) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    (task_id, filename, relative, content_hash, size, content_type)
+                ).lastrowid)
+            db.commit()
+            return ids
+        except Exception:
+            db.rollback()
+            # Los blobs nuevos de esta subida se han quedado sin registro
+            _remove_unreferenced_blobs(db, root, stored)
+            raise
+        finally:
+            db.close()
+
+    @staticmethod
+    def delete(attachment_id, root):
+        """Borra el registro y su blob si ningún otro adjunto lo usa; False si no existía"""
+        db = get_db()
+        try:
+            db.execute('BEGIN IMMEDIATE')
+            row = db.execute('SELECT file_path FROM attachments WHERE id = ?', (attachment_id,)).fetchone()
+            if row is None:
+                db.rollback()
+                return False
+            db.execute('DELETE FROM attachments WHERE id = ?', (attachment_id,))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        _remove_orphans(root, [row['file_path']])
+        return True
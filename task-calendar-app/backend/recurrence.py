@@ -0,0 +1,164 @@
+"""
+Reglas de recurrencia y su expansión perezosa.
+
+Una tarea recurrente es una sola fila de tasks: la regla va en tasks.recurrence
+como un subconjunto de RRULE de iCalendar (RFC 5545) y la primera ocurrencia en
+due_date. Las ocurrencias no se guardan; iter_occurrences las genera solo para
+la ventana pedida, periodo a periodo, sin construir nunca la serie completa.
+
+    FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,TH;UNTIL=20261231
+    FREQ=MONTHLY;COUNT=12
+"""
+import calendar
+from collections import namedtuple
+from datetime import date, timedelta
+
+FREQUENCIES = ('DAILY', 'WEEKLY', 'MONTHLY')
+# Códigos de BYDAY en el orden de date.weekday()
+WEEKDAYS = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+
+Rule = namedtuple('Rule', 'freq interval by_day until count')
+
+
+class InvalidRecurrence(ValueError):
+    pass
+
+
+def _parse_until(value):
+    try:
+        if len(value) == 8 and value.isdigit():
+            return date(int(value[:4]), int(value[4:6]), int(value[6:]))
+        return date.fromisoformat(value)
+    except ValueError:
+        raise InvalidRecurrence('Invalid UNTIL')
+
+
+def _parse_positive(value, name):
+    if not value.isdigit() or int(value) < 1:
+        raise InvalidRecurrence(f'Invalid {name}')
+    return int(value)
+
+
+def parse_rule(text):
+    """Convierte 'FREQ=WEEKLY;BYDAY=MO,WE' en una Rule"""
+    if not isinstance(text, str) or not text.strip():
+        raise InvalidRecurrence('Invalid recurrence')
+    parts = {}
+    for part in text.strip().upper().split(';'):
+        name, _, value = part.partition('=')
+        if not value or name in parts:
+            raise InvalidRecurrence('Invalid recurrence')
+        parts[name] = value
+
+    freq = parts.pop('FREQ', None)
+    if freq not in FREQUENCIES:
+        raise InvalidRecurrence('Invalid FREQ')
+    interval = _parse_positive(parts.pop('INTERVAL', '1'), 'INTERVAL')
+    by_day = ()
+    if 'BYDAY' in parts:
+        if freq != 'WEEKLY':
+            raise InvalidRecurrence('BYDAY is only supported with FREQ=WEEKLY')
+        days = parts.pop('BYDAY').split(',')
+        if any(day not in WEEKDAYS for day in days):
+            raise InvalidRecurrence('Invalid BYDAY')
+        by_day = tuple(sorted({WEEKDAYS.index(day) for day in days}))
+    until = _parse_until(parts.pop('UNTIL')) if 'UNTIL' in parts else None
+    count = _parse_positive(parts.pop('COUNT'), 'COUNT') if 'COUNT' in parts else None
+    if until is not None and count is not None:
+        raise InvalidRecurrence('UNTIL and COUNT are mutually exclusive')
+    if parts:
+        raise InvalidRecurrence(f'Unsupported recurrence part: {sorted(parts)[0]}')
+    return Rule(freq, interval, by_day, until, count)
+
+
+def format_rule(rule):
+    """Texto canónico de una Rule, el que se guarda en tasks.recurrence"""
+    parts = [f'FREQ={rule.freq}']
+    if rule.interval != 1:
+        parts.append(f'INTERVAL={rule.interval}')
+    if rule.by_day:
+        parts.append('BYDAY=' + ','.join(WEEKDAYS[day] for day in rule.by_day))
+    if rule.until is not None:
+        parts.append(f'UNTIL={rule.until.strftime("%Y%m%d")}')
+    if rule.count is not None:
+        parts.append(f'COUNT={rule.count}')
+    return ';'.join(parts)
+
+
+def normalize_rule(text):
+    """Valida una regla y devuelve su texto canónico (None se mantiene)"""
+    return None if text is None else format_rule(parse_rule(text))
+
+
+def _add_months(day, months):
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def _period_start(rule, start, period):
+    """Primer día del periodo `period` (0 = el que contiene `start`)"""
+    if rule.freq == 'DAILY':
+        return start + timedelta(days=period * rule.interval)
+    if rule.freq == 'WEEKLY':
+        return start - timedelta(days=start.weekday()) + timedelta(weeks=period * rule.interval)
+    return _add_months(start.replace(day=1), period * rule.interval)
+
+
+def _period_dates(rule, start, period):
+    first = _period_start(rule, start, period)
+    if rule.freq == 'DAILY':
+        return [first]
+    if rule.freq == 'WEEKLY':
+        return [first + timedelta(days=day) for day in rule.by_day or (start.weekday(),)]
+    # Como en RFC 5545, los meses sin ese día (31, 30 o 29 de febrero) se saltan
+    if start.day > calendar.monthrange(first.year, first.month)[1]:
+        return []
+    return [first.replace(day=start.day)]
+
+
+def _period_index(rule, start, day):
+    """Periodo que contiene `day`"""
+    if rule.freq == 'DAILY':
+        return (day - start).days // rule.interval
+    if rule.freq == 'WEEKLY':
+        weeks = ((day - timedelta(days=day.weekday())) - (start - timedelta(days=start.weekday()))).days // 7
+        return weeks // rule.interval
+    return ((day.year - start.year) * 12 + day.month - start.month) // rule.interval
+
+
+def iter_occurrences(rule, start, window_start=None, window_end=None):
+    """Genera en orden las fechas de la serie que empieza en `start` dentro de la ventana.
+
+    Sin window_end, UNTIL ni COUNT la serie no tiene fin: el llamador decide
+    cuántas fechas consume.
+    """
+    ends = [day for day in (window_end, rule.until) if day is not None]
+    end = min(ends) if ends else None
+    period = 0
+    if rule.count is None and window_start is not None and window_start > start:
+        # Sin COUNT no hay que contar desde el principio: se salta al periodo de window_start
+        period = _period_index(rule, start, window_start)
+    emitted = 0
+    while True:
+        try:
+            if end is not None and _period_start(rule, start, period) > end:
+                return
+            days = _period_dates(rule, start, period)
+        except (OverflowError, ValueError):
+            # El periodo cae más allá de date.max (p. ej. un INTERVAL grande): la serie termina
+            return
+        for day in days:
+            if day < start:
+                continue
+            if end is not None and day > end:
+                return
+            emitted += 1
+            if window_start is None or day >= window_start:
+                yield day
+            if rule.count is not None and emitted >= rule.count:
+                return
+        period += 1
+
+
+def is_occurrence(rule, start, day):
+    return next(iter_occurrences(rule, start, day, day), None) == day
@@ -0,0 +1,447 @@
+"""
+Recordatorios de vencimiento sin sondear la base de datos.
+
+Al arrancar se cargan en un min-heap los vencimientos futuros de las tareas no
+completadas (una sola consulta por rango de due_date). Después el planificador
+solo se entera de los cambios por el EventBroker: cada alta, cambio o baja
+relee esa tarea por id y añade su nueva entrada al heap, O(log n). Las entradas
+sustituidas no se buscan en el heap: se marcan como obsoletas y se descartan
+al salir. El hilo duerme hasta el siguiente vencimiento (o indefinidamente si
+no hay ninguno), así que sin recordatorios pendientes no hace nada.
+
+De cada serie recurrente solo está en el heap su próxima ocurrencia; al
+dispararse se calcula la siguiente.
+
+Con varios workers debe haber un solo planificador: REMINDERS=1 en un proceso o
+`flask --app app reminders` junto a EVENTS_IPC_DIR. Con el reloader de Werkzeug
+(modo debug) solo lo arranca el proceso hijo que atiende las peticiones.
+"""
+import heapq
+import itertools
+import json
+import logging
+import os
+import threading
+from contextlib import nullcontext
+import time
+import urllib.request
+from collections import deque
+from datetime import date, datetime, timedelta
+
+from events import broker
+
+logger = logging.getLogger('reminders')
+
+REMINDERS = os.environ.get('REMINDERS', '').lower() in ('1', 'true', 'yes')
+# Destinos de los recordatorios: log, sse, webhook (REMINDER_WEBHOOK_URL)
+REMINDER_SINKS = os.environ.get('REMINDER_SINKS', 'log')
+REMINDER_WEBHOOK_URL = os.environ.get('REMINDER_WEBHOOK_URL', '')
+# Segundos de antelación y hora del aviso de las tareas con fecha sin hora
+REMINDER_LEAD = float(os.environ.get('REMINDER_LEAD', 0))
+REMINDER_DAY_TIME = os.environ.get('REMINDER_DAY_TIME', '09:00')
+# Vencimientos pasados que aún se avisan (p. ej. al arrancar tras una parada corta)
+REMINDER_GRACE = float(os.environ.get('REMINDER_GRACE', 300))
+# Segundos de espera antes de reintentar tras un error de la base de datos
+REMINDER_RETRY = float(os.environ.get('REMINDER_RETRY', 5))
+
+# Días que se buscan hacia delante la próxima ocurrencia de una serie
+SERIES_LOOKAHEAD_DAYS = 366
+WEBHOOK_TIMEOUT = 2
+
+_TASK_COLUMNS = 'id, title, due_date, status, recurrence'
+
+
+def due_datetime(due_date, day_time=REMINDER_DAY_TIME):
+    """Momento de vencimiento de un due_date (YYYY-MM-DD[THH:MM]) o None si no es válido"""
+    if not due_date:
+        return None
+    try:
+        if len(due_date) <= 10:
+            hours, minutes = (int(part) for part in day_time.split(':'))
+            return datetime.combine(date.fromisoformat(due_date), datetime.min.time()).replace(
+                hour=hours, minute=minutes)
+        return datetime.fromisoformat(due_date)
+    except ValueError:
+        return None
+
+
+class LogSink:
+    """Escribe cada recordatorio como JSON en el logger `reminders`"""
+
+    def __call__(self, reminder):
+        logger.info(json.dumps(reminder, ensure_ascii=False))
+
+
+class BroadcastSink:
+    """Envía el recordatorio a los clientes SSE como un cambio con op 'reminder'"""
+
+    def __call__(self, reminder):
+        # Versión 0: el recordatorio no cambia datos y no debe adelantar la del cliente
+        broker.publish(0, [('reminder', reminder['id'])])
+
+
+class WebhookSink:
+    """POST del recordatorio en JSON a una URL (p. ej. un servicio local de notificaciones)"""
+
+    def __init__(self, url, timeout=WEBHOOK_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+
+    def __call__(self, reminder):
+        request = urllib.request.Request(
+            self.url, data=json.dumps(reminder).encode('utf-8'),
+            headers={'Content-Type': 'application/json'}, method='POST'
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+
+class MemorySink:
+    """Guarda los últimos recordatorios en memoria (tests y depuración)"""
+
+    def __init__(self, maxlen=100):
+        self.reminders = deque(maxlen=maxlen)
+
+    def __call__(self, reminder):
+        self.reminders.append(reminder)
+
+
+def build_sinks(names=REMINDER_SINKS, webhook_url=REMINDER_WEBHOOK_URL):
+    sinks = []
+    for name in (name.strip() for name in names.split(',')):
+        if name == 'log':
+            sinks.append(LogSink())
+        elif name == 'sse':
+            sinks.append(BroadcastSink())
+        elif name == 'webhook':
+            if not webhook_url:
+                raise ValueError('REMINDER_WEBHOOK_URL is required for the webhook sink')
+            sinks.append(WebhookSink(webhook_url))
+        elif name:
+            raise ValueError(f'Unknown reminder sink: {name}')
+    return sinks
+
+
+class ReminderScheduler:
+    """Min-heap de (momento de aviso, tarea) con un hilo que duerme hasta el primero"""
+
+    def __init__(self, sinks=(), lead=REMINDER_LEAD, grace=REMINDER_GRACE, day_time=REMINDER_DAY_TIME,
+                 clock=time.time, retry=REMINDER_RETRY):
+        self.sinks = list(sinks)
+        self.lead = lead
+        self.grace = grace
+        self.day_time = day_time
+        self.clock = clock
+        self.retry = retry
+        # Aplicación cuya base de datos se lee (app.config['DATABASE']); None fuera de Flask
+        self.app = None
+        self._cond = threading.Condition()
+        # Entradas [fire_at, seq, task_id, reminder]; la vigente de cada tarea está en _entries
+        self._heap = []
+        self._entries = {}
+        # Último aviso enviado por tarea: una edición posterior no lo repite
+        self._fired = {}
+        self._changed = set()
+        self._seq = itertools.count()
+        self._thread = None
+        self._stopping = False
+        self.loaded = False
+        self.fired = 0
+        self.failures = 0
+        self.errors = 0
+
+    # Cálculo de la próxima entrada de una tarea
+
+    def _fire_at(self, due_date):
+        due = due_datetime(due_date, self.day_time)
+        return None if due is None else due.timestamp() - self.lead
+
+    def _next_reminder(self, task, now):
+        """(fire_at, recordatorio) de la próxima vez que hay que avisar de `task`, o None"""
+        after = max(now - self.grace, self._fired.get(task['id'], float('-inf')))
+        if not task['recurrence']:
+            fire_at = self._fire_at(task['due_date'])
+            if task['status'] == 'completed' or fire_at is None or fire_at <= after:
+                return None
+            return fire_at, {'id': task['id'], 'title': task['title'], 'due_date': task['due_date']}
+
+        from models import Task, InvalidFilter
+        first = datetime.fromtimestamp(after + self.lead).date()
+        # Primero una semana: lo habitual es que la próxima ocurrencia esté cerca
+        for start, end in ((0, 7), (8, SERIES_LOOKAHEAD_DAYS)):
+            try:
+                occurrences = Task.get_occurrences(
+                    task['id'], first + timedelta(days=start), first + timedelta(days=end)) or []
+            except InvalidFilter:
+                return None
+            for occurrence in occurrences:
+                fire_at = self._fire_at(occurrence['due_date'])
+                if occurrence['status'] != 'completed' and fire_at is not None and fire_at > after:
+                    return fire_at, {
+                        'id': task['id'], 'title': occurrence['title'], 'due_date': occurrence['due_date'],
+                        'occurrence_date': occurrence['occurrence_date'],
+                    }
+        # Nada en el horizonte: se vuelve a mirar cuando termine
+        recheck = datetime.combine(first + timedelta(days=SERIES_LOOKAHEAD_DAYS), datetime.min.time())
+        return recheck.timestamp(), {'id': task['id'], 'recheck': True}
+
+    def _push(self, task_id, scheduled):
+        """Sustituye la entrada de `task_id` por `scheduled` (fire_at, recordatorio); con la lock tomada"""
+        self._entries.pop(task_id, None)
+        if scheduled is None:
+            return
+        fire_at, reminder = scheduled
+        entry = [fire_at, next(self._seq), task_id, reminder]
+        self._entries[task_id] = entry
+        heapq.heappush(self._heap, entry)
+
+    def _cancel(self, task_id):
+        self._entries.pop(task_id, None)
+        self._fired.pop(task_id, None)
+
+    # Carga inicial y cambios
+
+    def load(self, db=None):
+        """Carga los vencimientos futuros; devuelve cuántas tareas quedan programadas"""
+        import database
+        own = db is None
+        db = db or database.get_pool().acquire()
+        now = self.clock()
+        since = datetime.fromtimestamp(now - self.grace + self.lead).date().isoformat()
+        try:
+            # Rango sobre idx_tasks_due_date y el índice parcial de las series
+            tasks = db.execute(
+                f"SELECT {_TASK_COLUMNS} FROM tasks WHERE due_date >= ? AND recurrence IS NULL "
+                f"AND COALESCE(status, '') != 'completed'", (since,)
+            ).fetchall()
+            series = db.execute(
+                f"SELECT {_TASK_COLUMNS} FROM tasks WHERE recurrence IS NOT NULL AND due_date > ''"
+            ).fetchall()
+        finally:
+            if own:
+                db.close()
+        with self._cond:
+            self._heap, self._entries = [], {}
+            for task in tasks:
+                fire_at = self._fire_at(task['due_date'])
+                if fire_at is not None and fire_at > now - self.grace:
+                    entry = [fire_at, next(self._seq), task['id'],
+                             {'id': task['id'], 'title': task['title'], 'due_date': task['due_date']}]
+                    self._entries[task['id']] = entry
+                    self._heap.append(entry)
+            # heapify es O(n); push a push sería O(n log n)
+            heapq.heapify(self._heap)
+        # Las series consultan sus ocurrencias: fuera de la lock para no frenar a notify()
+        for task in series:
+            scheduled = self._next_reminder(task, now)
+            with self._cond:
+                self._push(task['id'], scheduled)
+        with self._cond:
+            self._cond.notify()
+            return len(self._entries)
+
+    def notify(self, version, changes):
+        """Listener del EventBroker: solo anota las tareas; el hilo las relee"""
+        ids = [task_id for op, task_id in changes if op != 'reminder']
+        if ids:
+            with self._cond:
+                self._changed.update(ids)
+                self._cond.notify()
+
+    def refresh(self, task_ids, db=None):
+        """Vuelve a programar las tareas `task_ids` a partir de su fila actual"""
+        import database
+        task_ids = list(task_ids)
+        if not task_ids:
+            return
+        own = db is None
+        db = db or database.get_pool().acquire()
+        try:
+            rows = {row['id']: dict(row) for row in db.execute(
+                f"SELECT {_TASK_COLUMNS} FROM tasks WHERE id IN ({', '.join('?' * len(task_ids))})", task_ids
+            )}
+        finally:
+            if own:
+                db.close()
+        now = self.clock()
+        scheduled = {task_id: self._next_reminder(rows[task_id], now) for task_id in task_ids if task_id in rows}
+        with self._cond:
+            for task_id in task_ids:
+                if task_id in rows:
+                    self._push(task_id, scheduled[task_id])
+                else:
+                    self._cancel(task_id)
+            self._compact()
+            self._cond.notify()
+
+    def _compact(self):
+        # Muchas entradas obsoletas (tareas editadas a menudo): se reconstruye el heap, O(n)
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = list(self._entries.values())
+            heapq.heapify(self._heap)
+
+    # Disparo
+
+    def _pop_due(self, now):
+        """Saca del heap las entradas vigentes con fire_at <= now; con la lock tomada"""
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            entry = heapq.heappop(self._heap)
+            if self._entries.get(entry[2]) is entry:
+                del self._entries[entry[2]]
+                due.append(entry)
+        return due
+
+    def run_pending(self):
+        """Dispara los recordatorios vencidos; devuelve cuántos se han enviado"""
+        now = self.clock()
+        with self._cond:
+            due = self._pop_due(now)
+        sent = 0
+        series = []
+        for fire_at, _, task_id, reminder in due:
+            if reminder.get('recheck'):
+                series.append(task_id)
+                continue
+            self._fired[task_id] = fire_at
+            reminder = dict(reminder, fire_at=datetime.fromtimestamp(fire_at).isoformat(timespec='seconds'))
+            self._send(reminder)
+            sent += 1
+            if 'occurrence_date' in reminder:
+                series.append(task_id)
+        # Siguiente ocurrencia de las series disparadas; si falla, el hilo la reintenta
+        try:
+            self.refresh(series)
+        except Exception:
+            with self._cond:
+                self._changed.update(series)
+            raise
+        return sent
+
+    def _send(self, reminder):
+        self.fired += 1
+        for sink in self.sinks:
+            try:
+                sink(reminder)
+            except Exception:
+                # Un destino caído no impide avisar por los demás
+                self.failures += 1
+                logger.exception('Reminder sink %r failed', sink)
+
+    def next_fire_at(self):
+        with self._cond:
+            while self._heap and self._entries.get(self._heap[0][2]) is not self._heap[0]:
+                heapq.heappop(self._heap)
+            return self._heap[0][0] if self._heap else None
+
+    # Hilo
+
+    def start(self, app=None):
+        """Carga los vencimientos y arranca el hilo; se suscribe a los cambios de Task"""
+        if self._thread is not None:
+            return
+        self.app = app
+        self._stopping = False
+        self.loaded = False
+        broker.add_listener(self.notify)
+        self._thread = threading.Thread(target=self._run, name='reminders', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        broker.remove_listener(self.notify)
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        thread.join()
+
+    def _context(self):
+        # Un contexto por iteración: get_db() no deja una conexión fijada en el hilo
+        return self.app.app_context() if self.app is not None else nullcontext()
+
+    def _sleep(self, seconds):
+        """Espera `seconds` o hasta stop(); devuelve False si hay que parar. Con la lock tomada"""
+        deadline = time.monotonic() + seconds
+        while not self._stopping:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return True
+            self._cond.wait(remaining)
+        return False
+
+    def _load(self):
+        """init_db() y carga inicial, reintentando hasta que la base de datos responda"""
+        import database
+        while True:
+            try:
+                with self._context():
+                    database.init_db()
+                    self.load()
+                self.loaded = True
+                return True
+            except Exception:
+                self.errors += 1
+                logger.exception('Could not load reminders; retrying in %ss', self.retry)
+            with self._cond:
+                if not self._sleep(self.retry):
+                    return False
+
+    def _run(self):
+        if not self._load():
+            return
+        while True:
+            with self._cond:
+                if self._stopping:
+                    return
+                if not self._changed:
+                    next_fire_at = self.next_fire_at()
+                    # Sin vencimientos se espera sin límite: ningún coste mientras no haya cambios
+                    timeout = None if next_fire_at is None else max(0.0, next_fire_at - self.clock())
+                    if timeout is None or timeout > 0:
+                        self._cond.wait(timeout)
+                changed, self._changed = self._changed, set()
+                if self._stopping:
+                    return
+            try:
+                with self._context():
+                    self.refresh(changed)
+                    self.run_pending()
+            except Exception:
+                self.errors += 1
+                logger.exception('Reminder scheduler error; retrying in %ss', self.retry)
+                # Las tareas no releídas se conservan para el siguiente intento
+                with self._cond:
+                    self._changed.update(changed)
+                    if not self._sleep(self.retry):
+                        return
+
+    def stats(self):
+        with self._cond:
+            return {
+                'running': self._thread is not None,
+                'loaded': self.loaded,
+                'scheduled': len(self._entries),
+                'heap': len(self._heap),
+                'fired': self.fired,
+                'failures': self.failures,
+                'errors': self.errors,
+            }
+
+
+scheduler = ReminderScheduler()
+
+
+def init_app(app):
+    if not app.config.get('REMINDERS', REMINDERS):
+        return
+    # Proceso padre del reloader: no atiende peticiones y su hijo ya tiene planificador
+    if app.debug and os.environ.get('WERKZEUG_RUN_MAIN') != 'true':
+        return
+    scheduler.sinks = build_sinks(
+        app.config.get('REMINDER_SINKS', REMINDER_SINKS),
+        app.config.get('REMINDER_WEBHOOK_URL', REMINDER_WEBHOOK_URL),
+    )
+    scheduler.lead = app.config.get('REMINDER_LEAD', REMINDER_LEAD)
+    scheduler.start(app)
@@ -3,5 +3,8 @@ from flask import Blueprint
 routes = Blueprint('routes', __name__)
 
 from .tasks import tasks_bp
+from .calendar import calendar_bp
+from .attachments import attachments_bp
+from .stats import stats_bp
 
-__all__ = ['tasks_bp']
\ No newline at end of file
+__all__ = ['tasks_bp', 'calendar_bp', 'attachments_bp', 'stats_bp']
\ No newline at end of file
@@ -0,0 +1,165 @@
+import mimetypes
+import os
+from urllib.parse import quote
+from flask import Blueprint, Response, request, jsonify, current_app, send_file
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.formparser import parse_form_data
+from werkzeug.utils import secure_filename
+from models import Task, Attachment
+from blobstore import ACCEL_PREFIX, BlobWriter, attachments_root
+
+attachments_bp = Blueprint('attachments', __name__, url_prefix='/api')
+
+# Un adjunto nunca cambia de contenido (id -> hash fijo): caché de un año
+ATTACHMENT_MAX_AGE = 365 * 24 * 3600
+
+def accel_prefix():
+    return current_app.config.get('ATTACHMENTS_ACCEL_PREFIX', ACCEL_PREFIX)
+
+def _serialize(attachment):
+    return {
+        'id': attachment['id'],
+        'task_id': attachment['task_id'],
+        'filename': attachment['filename'],
+        'size': attachment['size'],
+        'content_type': attachment['content_type'],
+        'content_hash': attachment['content_hash'],
+        'created_at': attachment['created_at'],
+        'url': f"/api/attachments/{attachment['id']}",
+    }
+
+def _read_uploads(root):
+    """Guarda en disco los ficheros de la petición; devuelve [(filename, content_type, writer)]"""
+    writers = []
+
+    if request.mimetype == 'multipart/form-data':
+        def stream_factory(total_content_length, content_type, filename, content_length=None):
+            writer = BlobWriter(root)
+            writers.append(writer)
+            return writer
+
+        # Werkzeug entrega cada parte por bloques al BlobWriter: nada se guarda entero en memoria
+        try:
+            _, _, files = parse_form_data(
+                request.environ,
+                stream_factory=stream_factory,
+                max_content_length=current_app.config.get('MAX_CONTENT_LENGTH'),
+                silent=False,
+            )
+        except Exception:
+            for writer in writers:
+                writer.discard()
+            raise
+        uploads = [
+            (storage.filename, storage.mimetype, storage.stream)
+            for storage in files.getlist('file') if storage.filename
+        ]
+        # Partes vacías o con otro nombre de campo: no se usan
+        used = {id(writer) for _, _, writer in uploads}
+        for writer in writers:
+            if id(writer) not in used:
+                writer.discard()
+        return uploads
+
+    # Cuerpo binario directo: el nombre llega en X-Filename o ?filename=
+    filename = request.headers.get('X-Filename') or request.args.get('filename')
+    if not filename:
+        return []
+    writer = BlobWriter(root)
+    try:
+        writer.copy_from(request.stream)
+    except Exception:
+        writer.discard()
+        raise
+    return [(filename, request.mimetype, writer)]
+
+@attachments_bp.route('/tasks/<int:task_id>/attachments', methods=['GET'])
+def list_attachments(task_id):
+    if Task.get_by_id(task_id) is None:
+        return jsonify({'error': 'Task not found'}), 404
+    return jsonify([_serialize(a) for a in Attachment.get_by_task(task_id)]), 200
+
+@attachments_bp.route('/tasks/<int:task_id>/attachments', methods=['POST'])
+def upload_attachments(task_id):
+    if Task.get_by_id(task_id) is None:
+        return jsonify({'error': 'Task not found'}), 404
+
+    root = attachments_root()
+    try:
+        uploads = _read_uploads(root)
+    except RequestEntityTooLarge:
+        return jsonify({'error': 'File too large'}), 413
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+    if not uploads:
+        return jsonify({'error': 'No file provided'}), 400
+
+    prepared = []
+    for filename, content_type, writer in uploads:
+        filename = secure_filename(filename or '') or writer.content_hash
+        if not content_type or content_type == 'application/octet-stream':
+            content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        prepared.append((filename, content_type, writer))
+    try:
+        # Todos los ficheros de la petición o ninguno
+        ids = Attachment.create_many(task_id, prepared, root)
+    except Exception as e:
+        for _, _, writer in uploads:
+            writer.discard()
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify([_serialize(Attachment.get_by_id(attachment_id)) for attachment_id in ids]), 201
+
+def _accel_redirect(attachment, as_attachment):
+    """Delega el envío en nginx (X-Accel-Redirect); nginx resuelve también los Range"""
+    prefix = accel_prefix().rstrip('/')
+    response = Response(status=200, mimetype=attachment['content_type'])
+    response.headers['X-Accel-Redirect'] = f"{prefix}/{attachment['file_path'].replace(os.sep, '/')}"
+    disposition = 'attachment' if as_attachment else 'inline'
+    response.headers['Content-Disposition'] = (
+        f"{disposition}; filename*=UTF-8''{quote(attachment['filename'])}"
+    )
+    return response
+
+@attachments_bp.route('/attachments/<int:attachment_id>', methods=['GET'])
+def download_attachment(attachment_id):
+    attachment = Attachment.get_by_id(attachment_id)
+    if attachment is None:
+        return jsonify({'error': 'Attachment not found'}), 404
+
+    as_attachment = request.args.get('download', '').lower() in ('1', 'true', 'yes')
+    etag = attachment['content_hash'] or attachment['file_path']
+
+    if accel_prefix():
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = _accel_redirect(attachment, as_attachment)
+    else:
+        path = os.path.join(attachments_root(), attachment['file_path'])
+        if not os.path.isfile(path):
+            return jsonify({'error': 'Attachment file missing'}), 404
+        # send_file usa wsgi.file_wrapper (sendfile del SO) o X-Sendfile si
+        # USE_X_SENDFILE está activo, y responde a Range / If-Range / If-None-Match
+        response = send_file(
+            path,
+            mimetype=attachment['content_type'],
+            as_attachment=as_attachment,
+            download_name=attachment['filename'],
+            conditional=True,
+            etag=etag,
+            max_age=ATTACHMENT_MAX_AGE,
+        )
+        response.headers['Accept-Ranges'] = 'bytes'
+
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = ATTACHMENT_MAX_AGE
+    response.cache_control.immutable = True
+    return response
+
+@attachments_bp.route('/attachments/<int:attachment_id>', methods=['DELETE'])
+def delete_attachment(attachment_id):
+    if not Attachment.delete(attachment_id, attachments_root()):
+        return jsonify({'error': 'Attachment not found'}), 404
+    return jsonify({'message': 'Attachment deleted'}), 200
@@ -0,0 +1,70 @@
+from datetime import date, timedelta
+from flask import Blueprint, request, jsonify
+from models import Task, InvalidFilter
+from .tasks import collection_etag, not_modified_response, with_etag
+
+calendar_bp = Blueprint('calendar', __name__, url_prefix='/api/calendar')
+
+GRANULARITIES = ('day', 'week', 'month')
+
+def _parse_date(value, name):
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise InvalidFilter(f'Invalid {name} date')
+
+def bucket_key(due_date, granularity):
+    """Clave del bucket para una fecha YYYY-MM-DD[...]"""
+    day = date.fromisoformat(due_date[:10])
+    if granularity == 'month':
+        return day.strftime('%Y-%m')
+    if granularity == 'week':
+        # Las semanas se identifican por su lunes (ISO 8601)
+        return (day - timedelta(days=day.weekday())).isoformat()
+    return day.isoformat()
+
+@calendar_bp.route('', methods=['GET'])
+def get_calendar():
+    etag = collection_etag()
+    not_modified = not_modified_response(etag)
+    if not_modified:
+        return not_modified
+
+    granularity = request.args.get('granularity', 'day')
+    try:
+        start = _parse_date(request.args.get('from'), 'from')
+        end = _parse_date(request.args.get('to'), 'to')
+        if granularity not in GRANULARITIES:
+            raise InvalidFilter('Invalid granularity')
+        if start > end:
+            raise InvalidFilter("'from' must not be after 'to'")
+
+        # Una única búsqueda por rango sobre idx_tasks_due_date (o status/category + due_date);
+        # las tareas sin fecha ('') quedan fuera del rango
+        filters = {'due_from': start.isoformat(), 'due_to': end.isoformat()}
+        for key in ('status', 'category'):
+            if request.args.get(key):
+                filters[key] = request.args[key]
+        tasks = Task.get_all(filters, 'due_date')
+    except InvalidFilter as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Las filas llegan ordenadas por fecha: basta con agrupar en una pasada
+    buckets = []
+    for task in tasks:
+        try:
+            key = bucket_key(task['due_date'], granularity)
+        except ValueError:
+            continue
+        if not buckets or buckets[-1]['key'] != key:
+            buckets.append({'key': key, 'count': 0, 'tasks': []})
+        buckets[-1]['count'] += 1
+        buckets[-1]['tasks'].append(task)
+
+    return with_etag(jsonify({
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'granularity': granularity,
+        'total': sum(bucket['count'] for bucket in buckets),
+        'buckets': buckets,
+    }), etag), 200
@@ -0,0 +1,21 @@
+from datetime import date
+from flask import Blueprint, request, jsonify
+from models import Task
+from .tasks import collection_etag, not_modified_response, with_etag
+
+stats_bp = Blueprint('stats', __name__, url_prefix='/api/stats')
+
+@stats_bp.route('', methods=['GET'])
+def get_stats():
+    # ?today= permite contar las vencidas según la fecha local del cliente
+    try:
+        today = date.fromisoformat(request.args['today']) if request.args.get('today') else date.today()
+    except ValueError:
+        return jsonify({'error': 'Invalid today date'}), 400
+
+    # Las vencidas cambian con el día aunque no haya escrituras
+    etag = f'{collection_etag()}-{today.isoformat()}'
+    not_modified = not_modified_response(etag)
+    if not_modified:
+        return not_modified
+    return with_etag(jsonify(Task.get_stats(today)), etag), 200
@@ -1,19 +1,199 @@
-from flask import Blueprint, request, jsonify
-from models import Task
+import json
+import zlib
+from datetime import date
+from flask import Blueprint, Response, request, jsonify, current_app, make_response
+from models import (
+    Task, InvalidCursor, InvalidFilter, SearchUnavailable, ChangesExpired, DEFAULT_PAGE_SIZE, FILTER_KEYS,
+    BATCH_MAX_SIZE, SEARCH_LIMIT, PATCH_FIELDS, OCCURRENCE_FIELDS, KEEP, parse_fields
+)
+from recurrence import normalize_rule
+from jsonstream import iter_json_array, iter_json_array_chunks, iter_ndjson_chunks, JSONStreamError
+from events import broker, TooManySubscribers, EVENTS_HEARTBEAT, EVENTS_COALESCE
 
 tasks_bp = Blueprint('tasks', __name__, url_prefix='/api/tasks')
 
+NDJSON_MIMETYPE = 'application/x-ndjson'
+# Valores de ?format= en los listados
+LIST_FORMATS = ('json', 'columnar')
+# Campos de texto de una operación del lote (None se admite)
+BATCH_TEXT_FIELDS = ('description', 'category', 'due_date', 'status')
+
+def collection_etag():
+    """ETag de un listado: versión de datos + URL completa (filtros, cursor...)"""
+    return f'{Task.get_version()}-{zlib.crc32(request.full_path.encode("utf-8")):08x}'
+
+def not_modified_response(etag):
+    """Devuelve una respuesta 304 si el cliente ya tiene esta versión"""
+    # Comparación débil: las respuestas comprimidas llevan el ETag como W/"..."
+    if request.if_none_match.contains_weak(etag):
+        response = make_response('', 304)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    return None
+
+def with_etag(response, etag):
+    response.set_etag(etag)
+    # Los navegadores revalidan siempre, enviando If-None-Match automáticamente
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def _streaming_format():
+    """'ndjson', 'json' o None según Accept y el parámetro ?stream="""
+    best = request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE])
+    if best == NDJSON_MIMETYPE:
+        return 'ndjson'
+    if request.args.get('stream', '').lower() in ('1', 'true', 'yes'):
+        return 'json'
+    return None
+
+def _stream_tasks(batches, stream, etag):
+    # Memoria constante: se serializa lote a lote a medida que se leen las filas
+    if stream == 'ndjson':
+        response = Response(iter_ndjson_chunks(batches), mimetype=NDJSON_MIMETYPE)
+    else:
+        response = Response(iter_json_array_chunks(batches), mimetype='application/json')
+    return with_etag(response, etag)
+
 @tasks_bp.route('', methods=['GET'])
 def get_tasks():
-    tasks = Task.get_all()
-    return jsonify(tasks), 200
+    # La versión se lee antes que las filas: si hay una escritura entre medias,
+    # el ETag queda desfasado hacia atrás y el cliente solo vuelve a descargar
+    etag = collection_etag()
+    not_modified = not_modified_response(etag)
+    if not_modified:
+        return not_modified
+
+    filters = {key: request.args[key] for key in FILTER_KEYS if key in request.args}
+    sort = request.args.get('sort')
+    # ?format=columnar: {"columns": [...], "rows": [[...], ...]} sin repetir las claves por tarea
+    list_format = request.args.get('format') or 'json'
+    if list_format not in LIST_FORMATS:
+        return jsonify({'error': 'Invalid format'}), 400
+    columnar = list_format == 'columnar'
+
+    try:
+        fields = parse_fields(request.args.get('fields'))
+        # Sin parámetros de paginación se mantiene la respuesta clásica (lista completa)
+        if 'limit' not in request.args and 'after' not in request.args:
+            if columnar:
+                return with_etag(jsonify(Task.get_columns(filters, sort, fields)), etag), 200
+            stream = _streaming_format()
+            if stream:
+                return _stream_tasks(Task.iter_all(filters, sort, fields=fields), stream, etag)
+            tasks = Task.get_all(filters, sort, fields)
+            return with_etag(jsonify(tasks), etag), 200
+
+        try:
+            limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            return jsonify({'error': 'Invalid limit'}), 400
+        tasks, next_cursor = Task.get_page(limit, request.args.get('after'), filters, sort, fields, columnar)
+    except (InvalidCursor, InvalidFilter) as e:
+        return jsonify({'error': str(e)}), 400
+    if columnar:
+        return with_etag(jsonify(dict(tasks, next_cursor=next_cursor)), etag), 200
+    return with_etag(jsonify({'tasks': tasks, 'next_cursor': next_cursor}), etag), 200
+
+@tasks_bp.route('/search', methods=['GET'])
+def search_tasks():
+    etag = collection_etag()
+    not_modified = not_modified_response(etag)
+    if not_modified:
+        return not_modified
+
+    try:
+        results = Task.search(request.args.get('q', ''), request.args.get('limit', SEARCH_LIMIT, type=int))
+    except InvalidFilter as e:
+        return jsonify({'error': str(e)}), 400
+    except SearchUnavailable as e:
+        return jsonify({'error': str(e)}), 501
+    return with_etag(jsonify(results), etag), 200
+
+@tasks_bp.route('/changes', methods=['GET'])
+def get_changes():
+    since = request.args.get('since', type=int)
+    if since is None or since < 0:
+        return jsonify({'error': 'Invalid since'}), 400
+    try:
+        changes = Task.get_changes(since)
+    except ChangesExpired as e:
+        # El cliente debe volver a empezar con since=0
+        return jsonify({'error': str(e), 'version': Task.get_version()}), 410
+    response = jsonify(changes)
+    response.headers['Cache-Control'] = 'no-store'
+    return response, 200
+
+def _sse(event, data, event_id=None):
+    lines = f'id: {event_id}\n' if event_id is not None else ''
+    return f'{lines}event: {event}\ndata: {json.dumps(data)}\n\n'
+
+@tasks_bp.route('/stream', methods=['GET'])
+def stream_changes():
+    """Server-Sent Events: un evento `changes` por ráfaga de escrituras"""
+    try:
+        subscription = broker.subscribe()
+    except TooManySubscribers as e:
+        return jsonify({'error': str(e)}), 503
+
+    heartbeat = current_app.config.get('EVENTS_HEARTBEAT', EVENTS_HEARTBEAT)
+    coalesce = current_app.config.get('EVENTS_COALESCE', EVENTS_COALESCE)
+    # Al reconectar, EventSource envía el id del último evento recibido
+    last_version = request.headers.get('Last-Event-ID', type=int)
+    version = Task.get_version()
+
+    def generate():
+        yield 'retry: 3000\n\n'
+        if last_version is not None and last_version < version:
+            # Cambios perdidos durante la reconexión: el cliente los pide a /changes
+            yield _sse('changes', {'version': version, 'changes': []}, version)
+        while True:
+            message = subscription.get(heartbeat, coalesce)
+            if message:
+                yield _sse('changes', message, message['version'])
+            elif subscription.dropped:
+                # Cliente demasiado lento: se cierra y al reconectar sincroniza
+                yield _sse('reset', {'version': subscription.version})
+                return
+            else:
+                yield ': keepalive\n\n'
+
+    response = Response(generate(), mimetype='text/event-stream')
+    response.call_on_close(lambda: broker.unsubscribe(subscription))
+    response.headers['Cache-Control'] = 'no-cache'
+    # nginx: no acumular la respuesta en el buffer del proxy
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 @tasks_bp.route('/<int:task_id>', methods=['GET'])
 def get_task(task_id):
+    etag = f'{Task.get_version()}-{task_id}'
+    not_modified = not_modified_response(etag)
+    if not_modified:
+        return not_modified
+
     task = Task.get_by_id(task_id)
     if not task:
         return jsonify({'error': 'Task not found'}), 404
-    return jsonify(task), 200
+    return with_etag(jsonify(task), etag), 200
+
+def _parse_recurrence(rule, due_date):
+    """Regla RRULE normalizada; una serie necesita due_date (su primera ocurrencia)"""
+    rule = normalize_rule(rule)
+    if rule is not None:
+        try:
+            date.fromisoformat(str(due_date)[:10])
+        except ValueError:
+            raise ValueError('Recurring tasks need a due_date')
+    return rule
+
+def _parse_day(value):
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError('Invalid date')
 
 @tasks_bp.route('', methods=['POST'])
 def create_task():
@@ -24,7 +204,8 @@ def create_task():
             data.get('description', ''),
             data.get('category', ''),
             data.get('priority', 3),
-            data.get('due_date', '')
+            data.get('due_date', ''),
+            _parse_recurrence(data.get('recurrence'), data.get('due_date', ''))
         )
         return jsonify({'id': task_id, 'message': 'Task created'}), 201
     except Exception as e:
@@ -41,16 +222,174 @@ def update_task(task_id):
             data.get('category', ''),
             data.get('priority', 3),
             data.get('due_date', ''),
-            data.get('status', 'pending')
+            data.get('status', 'pending'),
+            # Sin la clave se conserva la regla: los clientes que no la conocen no borran la serie
+            _parse_recurrence(data['recurrence'], data.get('due_date', '')) if 'recurrence' in data else KEEP
         )
         return jsonify({'message': 'Task updated'}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
+def _parse_patch(data):
+    """Valida el cuerpo de PATCH y devuelve {columna: valor}"""
+    if not isinstance(data, dict) or not data:
+        raise ValueError('Body must be a non-empty object')
+    unknown = sorted(set(data) - set(PATCH_FIELDS))
+    if unknown:
+        raise ValueError(f'Unknown fields: {", ".join(unknown)}')
+    if 'title' in data and (not isinstance(data['title'], str) or not data['title']):
+        raise ValueError('Missing title')
+    priority = data.get('priority')
+    if priority is not None and (not isinstance(priority, int) or isinstance(priority, bool)
+                                 or not 1 <= priority <= 5):
+        raise ValueError('Invalid priority')
+    if 'recurrence' in data:
+        data = dict(data, recurrence=normalize_rule(data['recurrence']))
+    return data
+
+@tasks_bp.route('/<int:task_id>', methods=['PATCH'])
+def patch_task(task_id):
+    try:
+        fields = _parse_patch(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        if not Task.patch(task_id, fields):
+            return jsonify({'error': 'Task not found'}), 404
+        return jsonify({'message': 'Task updated'}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+@tasks_bp.route('/<int:task_id>/occurrences', methods=['GET'])
+def get_occurrences(task_id):
+    etag = collection_etag()
+    not_modified = not_modified_response(etag)
+    if not_modified:
+        return not_modified
+
+    try:
+        first = _parse_day(request.args.get('from'))
+        last = _parse_day(request.args.get('to'))
+        if first > last:
+            raise ValueError("'from' must not be after 'to'")
+        occurrences = Task.get_occurrences(task_id, first, last)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if occurrences is None:
+        return jsonify({'error': 'Task not found'}), 404
+    return with_etag(jsonify(occurrences), etag), 200
+
+def _parse_occurrence(data):
+    """Valida el cuerpo de PATCH de una ocurrencia; null vuelve al valor de la serie"""
+    if not isinstance(data, dict) or not data:
+        raise ValueError('Body must be a non-empty object')
+    unknown = sorted(set(data) - set(OCCURRENCE_FIELDS))
+    if unknown:
+        raise ValueError(f'Unknown fields: {", ".join(unknown)}')
+    if 'title' in data and data['title'] is not None and (not isinstance(data['title'], str) or not data['title']):
+        raise ValueError('Missing title')
+    priority = data.get('priority')
+    if priority is not None and (not isinstance(priority, int) or isinstance(priority, bool)
+                                 or not 1 <= priority <= 5):
+        raise ValueError('Invalid priority')
+    if 'cancelled' in data:
+        data = dict(data, cancelled=int(bool(data['cancelled'])))
+    return data
+
+@tasks_bp.route('/<int:task_id>/occurrences/<day>', methods=['PATCH'])
+def patch_occurrence(task_id, day):
+    try:
+        day = _parse_day(day)
+        fields = _parse_occurrence(request.get_json(silent=True))
+        if not Task.set_occurrence(task_id, day, fields):
+            return jsonify({'error': 'Task not found'}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'message': 'Occurrence updated'}), 200
+
+@tasks_bp.route('/<int:task_id>/occurrences/<day>', methods=['DELETE'])
+def delete_occurrence(task_id, day):
+    """Deshace los cambios de una ocurrencia, que vuelve a ser igual que la serie"""
+    try:
+        day = _parse_day(day)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not Task.clear_occurrence(task_id, day):
+        return jsonify({'error': 'Occurrence not found'}), 404
+    return jsonify({'message': 'Occurrence reset'}), 200
+
 @tasks_bp.route('/<int:task_id>', methods=['DELETE'])
 def delete_task(task_id):
     try:
         Task.delete(task_id)
         return jsonify({'message': 'Task deleted'}), 200
     except Exception as e:
-        return jsonify({'error': str(e)}), 400
\ No newline at end of file
+        return jsonify({'error': str(e)}), 400
+
+def _parse_batch_item(item):
+    """Valida una operación del lote y la convierte en (op, task_id, params)"""
+    if not isinstance(item, dict):
+        raise ValueError('Operation must be an object')
+    op = item.get('op')
+    if op not in ('create', 'update', 'delete'):
+        raise ValueError('Invalid op')
+
+    task_id = None
+    if op in ('update', 'delete'):
+        task_id = item.get('id')
+        if not isinstance(task_id, int) or isinstance(task_id, bool):
+            raise ValueError('Missing or invalid id')
+    if op == 'delete':
+        return op, task_id, None
+
+    data = item.get('data')
+    if not isinstance(data, dict) or not isinstance(data.get('title'), str) or not data['title']:
+        raise ValueError('Missing title')
+    priority = data.get('priority', 3)
+    if priority is not None and (not isinstance(priority, int) or isinstance(priority, bool)
+                                 or not 1 <= priority <= 5):
+        raise ValueError('Invalid priority')
+    # Un valor no escalar haría fallar el executemany y con él todo el lote
+    for key in BATCH_TEXT_FIELDS:
+        if data.get(key) is not None and not isinstance(data[key], str):
+            raise ValueError(f'Invalid {key}')
+
+    params = (
+        data['title'],
+        data.get('description', ''),
+        data.get('category', ''),
+        priority,
+        data.get('due_date', ''),
+    )
+    if op == 'update':
+        params += (data.get('status', 'pending'),)
+    return op, task_id, params
+
+@tasks_bp.route('/batch', methods=['POST'])
+def batch_tasks():
+    max_size = current_app.config.get('BATCH_MAX_SIZE', BATCH_MAX_SIZE)
+    operations = []
+    results = []
+
+    # El cuerpo se analiza por bloques; la transacción solo empieza cuando se ha
+    # leído entero para no retener el bloqueo de escritura mientras llega la red
+    try:
+        for index, item in enumerate(iter_json_array(request.stream)):
+            if index >= max_size:
+                return jsonify({'error': f'Batch too large (max {max_size} operations)'}), 413
+            try:
+                op, task_id, params = _parse_batch_item(item)
+            except ValueError as e:
+                results.append({'index': index, 'status': 400, 'error': str(e)})
+                continue
+            operations.append((index, op, task_id, params))
+    except JSONStreamError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        results.extend(Task.apply_batch(operations))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+    results.sort(key=lambda result: result['index'])
+    return jsonify({'results': results}), 200
@@ -0,0 +1,107 @@
+"""
+Registro de consultas lentas.
+
+TimedCursor (database.py) mide cada sentencia (execute más sus fetch o la
+iteración sobre el cursor) y llama a
+record() cuando supera el umbral. Cada entrada se escribe como JSON en el logger
+`slow_query`, con el EXPLAIN QUERY PLAN de la sentencia y marcas para los
+recorridos completos de tabla y las ordenaciones con B-tree temporal.
+
+Con DB_TRACE=1 además se registran todas las sentencias (set_trace_callback)
+en el logger `sql` a nivel DEBUG.
+"""
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+from collections import deque
+from datetime import datetime, timezone
+
+from flask import has_request_context, request
+
+logger = logging.getLogger('slow_query')
+trace_logger = logging.getLogger('sql')
+
+# Umbral en milisegundos; 0 registra todas las sentencias, negativo lo desactiva
+SLOW_QUERY_MS = float(os.environ.get('DB_SLOW_QUERY_MS', 100))
+TRACE = os.environ.get('DB_TRACE', '').lower() in ('1', 'true', 'yes')
+
+# Últimas entradas en memoria y planes ya calculados por texto de la sentencia
+RECENT_SIZE = 100
+PLAN_CACHE_SIZE = 256
+
+# Sentencias sin plan de consulta
+_NO_PLAN = re.compile(r'\s*(BEGIN|COMMIT|END|ROLLBACK|SAVEPOINT|RELEASE|PRAGMA|CREATE|DROP|ALTER|VACUUM|ANALYZE)\b',
+                      re.IGNORECASE)
+# "SCAN tasks" es un recorrido completo; "SCAN tasks USING INDEX ..." o una tabla virtual no
+_FULL_SCAN = re.compile(r'^SCAN (?!CONSTANT ROW)\S+(?: AS \S+)?$')
+
+threshold = SLOW_QUERY_MS / 1000 if SLOW_QUERY_MS >= 0 else float('inf')
+_recent = deque(maxlen=RECENT_SIZE)
+_plans = {}
+# Varios hilos registran a la vez: vaciar la caché mientras otro la rellena falla
+_plans_lock = threading.Lock()
+
+
+def configure(slow_query_ms=None):
+    """Cambia el umbral (ms); None vuelve al valor de DB_SLOW_QUERY_MS"""
+    global threshold
+    ms = SLOW_QUERY_MS if slow_query_ms is None else float(slow_query_ms)
+    threshold = ms / 1000 if ms >= 0 else float('inf')
+    return threshold
+
+
+def explain(conn, sql, parameters=()):
+    """Filas de detalle del EXPLAIN QUERY PLAN de `sql`, o None si no aplica"""
+    if _NO_PLAN.match(sql):
+        return None
+    with _plans_lock:
+        plan = _plans.get(sql)
+    if plan is None:
+        try:
+            # Cursor base: el EXPLAIN no se mide ni se registra a sí mismo
+            rows = conn.cursor(sqlite3.Cursor).execute(f'EXPLAIN QUERY PLAN {sql}', parameters).fetchall()
+        except sqlite3.Error:
+            return None
+        plan = [row[3] for row in rows]
+        with _plans_lock:
+            if len(_plans) >= PLAN_CACHE_SIZE:
+                _plans.clear()
+            _plans[sql] = plan
+    return plan
+
+
+def record(conn, sql, elapsed, parameters=()):
+    """Escribe una entrada de consulta lenta y la devuelve"""
+    plan = explain(conn, sql, parameters)
+    entry = {
+        'event': 'slow_query',
+        'at': datetime.now(timezone.utc).isoformat(timespec='milliseconds'),
+        'duration_ms': round(elapsed * 1000, 3),
+        'sql': ' '.join(sql.split()),
+        'plan': plan,
+        'full_scan': any(_FULL_SCAN.match(detail) for detail in plan or ()),
+        'temp_btree': any('USE TEMP B-TREE' in detail for detail in plan or ()),
+        'endpoint': request.endpoint if has_request_context() else None,
+    }
+    _recent.append(entry)
+    logger.warning(json.dumps(entry, ensure_ascii=False))
+    return entry
+
+
+def recent():
+    """Entradas más recientes, de la más antigua a la más nueva"""
+    return list(_recent)
+
+
+def clear():
+    _recent.clear()
+    with _plans_lock:
+        _plans.clear()
+
+
+def install_trace(conn):
+    if TRACE:
+        conn.set_trace_callback(trace_logger.debug)
@@ -21,7 +21,6 @@ def app():
     # Configurar la aplicación para testing
     flask_app.config.update({
         'TESTING': True,
-        'DATABASE': ':memory:',  # Base de datos en memoria para tests
     })
     
     # Inicializar la base de datos
@@ -59,7 +58,8 @@ def db_connection():
     
     yield db_path
     
-    # Limpiar
+    # Limpiar (cerrar el pool antes de borrar el fichero)
+    database.close_pool(db_path)
     os.close(db_fd)
     os.unlink(db_path)
     database.DATABASE = original_db
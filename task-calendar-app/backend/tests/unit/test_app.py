@@ -1,6 +1,7 @@
 """
 Tests para el módulo app.py
 """
+import json
 import pytest
 import sys
 from unittest.mock import patch, MagicMock
@@ -83,9 +84,9 @@ class TestMainExecution:
 class TestAppConfiguration:
     """Tests para configuración de la aplicación"""
     
-    def test_database_initialized(self):
-        """Test que la base de datos se inicializa al importar"""
-        # Si la app se cargó, init_db debe haberse ejecutado
+    def test_database_initialized(self, client):
+        """Test que la base de datos está migrada al atender peticiones"""
+        client.get('/api/health')
         from database import get_db
         db = get_db()
         assert db is not None
@@ -103,3 +104,74 @@ class TestAppConfiguration:
         """Test que la ruta frontend está correctamente configurada"""
         assert app_module.FRONTEND_PATH is not None
         assert 'frontend' in app_module.FRONTEND_PATH.lower()
+
+
+class TestCreateApp:
+    """Tests para la fábrica de aplicaciones"""
+
+    def test_create_app_returns_new_instance(self):
+        """Test que cada llamada crea una aplicación independiente"""
+        other = app_module.create_app({'TESTING': True})
+        assert other is not app_module.app
+        assert other.config['TESTING'] is True
+        assert 'tasks' in other.blueprints
+
+    def test_create_app_does_not_touch_database(self, tmp_path):
+        """Test que crear la aplicación no abre la base de datos ni cambia la global"""
+        import database
+        original_db = database.DATABASE
+        db_path = tmp_path / 'lazy.db'
+        app_module.create_app({'DATABASE': str(db_path)})
+        assert not db_path.exists()
+        assert database.DATABASE == original_db
+
+    def test_apps_use_their_own_database(self, tmp_path):
+        """Test que dos aplicaciones del mismo proceso usan cada una su base de datos"""
+        import database
+        apps = [app_module.create_app({'TESTING': True, 'DATABASE': str(tmp_path / f'{name}.db')})
+                for name in ('a', 'b')]
+        try:
+            for other in apps:
+                with other.app_context():
+                    database.init_db()
+            apps[0].test_client().post('/api/tasks', json={'title': 'Solo en A'})
+            titles = [
+                [task['title'] for task in json.loads(other.test_client().get('/api/tasks').data)]
+                for other in apps
+            ]
+            assert titles == [['Solo en A'], []]
+        finally:
+            for name in ('a', 'b'):
+                database.close_pool(str(tmp_path / f'{name}.db'))
+
+    @pytest.mark.parametrize('headers', [{}, {'Accept': 'application/x-ndjson'}])
+    def test_streaming_uses_the_app_database(self, tmp_path, headers):
+        """Test que ?stream=1 lee la base de datos de la aplicación aunque itere fuera del contexto"""
+        import database
+        path = str(tmp_path / 'stream.db')
+        other = app_module.create_app({'TESTING': True, 'DATABASE': path})
+        try:
+            with other.app_context():
+                database.init_db()
+            client = other.test_client()
+            client.post('/api/tasks', json={'title': 'En streaming'})
+            response = client.get('/api/tasks?stream=1', headers=headers)
+            assert response.status_code == 200
+            assert b'En streaming' in response.data
+        finally:
+            database.close_pool(path)
+
+    def test_requests_do_not_migrate(self, tmp_path):
+        """Test que una petición con el esquema sin migrar responde 503 en lugar de migrar"""
+        import database
+        path = str(tmp_path / 'pending.db')
+        other = app_module.create_app({'TESTING': True, 'DATABASE': path})
+        try:
+            response = other.test_client().get('/api/tasks')
+            assert response.status_code == 503
+            with other.app_context():
+                assert database.schema_version() == 0
+                database.init_db()
+            assert other.test_client().get('/api/tasks').status_code == 200
+        finally:
+            database.close_pool(path)
@@ -0,0 +1,141 @@
+"""
+Tests unitarios para los recursos estáticos y la compresión de respuestas
+"""
+import gzip
+import os
+import re
+import shutil
+
+import pytest
+
+from assets import AssetManifest, manifest, ASSETS, ASSETS_URL
+from models import Task
+
+
+def asset_url(asset):
+    return ASSETS_URL + manifest.built['mapping'][asset]
+
+
+@pytest.fixture
+def build_dir(tmp_path):
+    """Genera los recursos en un directorio temporal"""
+    original = manifest.build_dir
+    manifest.build_dir = str(tmp_path)
+    manifest.reset()
+    yield tmp_path
+    manifest.build_dir = original
+    manifest.reset()
+
+
+class TestAssetManifest:
+    """Tests para la generación de recursos con huella"""
+
+    def test_fingerprinted_and_precompressed(self, build_dir):
+        """Test que cada recurso se copia con el hash en el nombre y en gzip"""
+        mapping = manifest.built['mapping']
+        assert set(mapping) == set(ASSETS)
+        for asset, fingerprinted in mapping.items():
+            assert re.fullmatch(re.escape(os.path.splitext(asset)[0]) + r'\.[0-9a-f]{12}\.(js|css)',
+                                fingerprinted)
+            with open(os.path.join(manifest.source, asset), 'rb') as f:
+                original = f.read()
+            assert (build_dir / fingerprinted).read_bytes() == original
+            assert gzip.decompress((build_dir / (fingerprinted + '.gz')).read_bytes()) == original
+
+    def test_index_points_to_fingerprinted_assets(self, build_dir):
+        """Test que index.html se reescribe con las URL con huella"""
+        html = manifest.built['index'].decode('utf-8')
+        for asset in ASSETS:
+            assert asset_url(asset) in html
+        assert 'src="js/app.js"' not in html
+
+    def test_missing_asset_is_skipped(self, tmp_path):
+        """Test que un recurso ausente no impide generar el manifiesto ni servir index.html"""
+        source = tmp_path / 'frontend'
+        for name in ('index.html', 'js/app.js', 'css/styles.css'):
+            (source / name).parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy(os.path.join(manifest.source, name), source / name)
+        built = AssetManifest(str(source), str(tmp_path / 'dist'), ASSETS).build()
+        assert set(built['mapping']) == {'js/app.js', 'css/styles.css'}
+        html = built['index'].decode('utf-8')
+        assert 'src="js/storage.js"' in html
+        assert 'src="js/app.js"' not in html
+
+    def test_clean_removes_old_versions(self, build_dir):
+        """Test que clean() borra las copias que ya no se usan"""
+        stale = build_dir / 'js' / 'app.000000000000.js'
+        manifest.built
+        stale.write_text('old')
+        manifest.clean()
+        assert not stale.exists()
+        assert (build_dir / manifest.built['mapping']['js/app.js']).exists()
+
+
+class TestStaticRoutes:
+    """Tests para / y /dist/"""
+
+    def test_asset_gzip_and_immutable(self, client, build_dir):
+        """Test que se envía la variante gzip con caché inmutable"""
+        url = asset_url('js/app.js')
+        response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+        assert response.status_code == 200
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'immutable' in response.headers['Cache-Control']
+        assert 'Accept-Encoding' in response.headers['Vary']
+        body = gzip.decompress(response.data)
+        response.close()
+
+        plain = client.get(url)
+        assert 'Content-Encoding' not in plain.headers
+        assert plain.data == body
+        plain.close()
+
+    def test_unknown_asset_404(self, client, build_dir):
+        """Test que una huella desconocida no se sirve"""
+        assert client.get('/dist/js/app.deadbeef0000.js').status_code == 404
+        assert client.get('/dist/../app.py').status_code == 404
+
+    def test_index_revalidated(self, client, build_dir):
+        """Test que index.html se sirve comprimido, sin caché y con 304"""
+        response = client.get('/', headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['Cache-Control'] == 'no-cache'
+        assert asset_url('js/app.js').encode() in gzip.decompress(response.data)
+        again = client.get('/', headers={'If-None-Match': response.headers['ETag']})
+        assert again.status_code == 304
+
+
+class TestApiCompression:
+    """Tests para la compresión de JSON de la API"""
+
+    def test_large_json_compressed(self, client, db_connection):
+        """Test que un listado grande se comprime y sigue admitiendo 304"""
+        for i in range(20):
+            Task.create(f'Task {i}', 'x' * 100, 'work', 3, '')
+        response = client.get('/api/tasks', headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert len(__import__('json').loads(gzip.decompress(response.data))) == 20
+        assert response.headers['ETag'].startswith('W/')
+
+        again = client.get('/api/tasks', headers={
+            'Accept-Encoding': 'gzip', 'If-None-Match': response.headers['ETag']
+        })
+        assert again.status_code == 304
+
+    def test_small_or_unaccepted_not_compressed(self, client, db_connection):
+        """Test que no se comprime por debajo del umbral ni sin Accept-Encoding"""
+        Task.create('Small', '', '', 3, '')
+        assert 'Content-Encoding' not in client.get('/api/tasks', headers={'Accept-Encoding': 'gzip'}).headers
+        for i in range(20):
+            Task.create(f'Task {i}', 'x' * 100, 'work', 3, '')
+        assert 'Content-Encoding' not in client.get('/api/tasks').headers
+
+    def test_threshold_and_level_configurable(self, app, client, db_connection):
+        """Test que COMPRESS_MIN_SIZE y COMPRESS_LEVEL se leen de la configuración"""
+        Task.create('Small', '', '', 3, '')
+        app.config.update({'COMPRESS_MIN_SIZE': 10, 'COMPRESS_LEVEL': 1})
+        try:
+            response = client.get('/api/tasks', headers={'Accept-Encoding': 'gzip'})
+            assert response.headers['Content-Encoding'] == 'gzip'
+        finally:
+            app.config.pop('COMPRESS_MIN_SIZE')
+            app.config.pop('COMPRESS_LEVEL')
@@ -0,0 +1,280 @@
+"""
+Tests para la subida y almacenamiento de adjuntos
+"""
+import hashlib
+import io
+import json
+import os
+import pytest
+from models import Task, Attachment
+
+
+@pytest.fixture
+def attachments_dir(app, tmp_path):
+    """Directorio temporal para los blobs de adjuntos"""
+    app.config['ATTACHMENTS_DIR'] = str(tmp_path)
+    yield tmp_path
+    app.config.pop('ATTACHMENTS_DIR')
+
+
+@pytest.fixture
+def task_id(db_connection):
+    return Task.create('With files', '', '', 3, '')
+
+
+def blob_files(root):
+    return [
+        os.path.join(dirpath, name)
+        for dirpath, _, names in os.walk(root)
+        if os.path.basename(dirpath) != 'tmp'
+        for name in names
+    ]
+
+
+class TestBlobWriter:
+    """Tests para BlobWriter"""
+
+    def test_commit_stores_by_hash(self, tmp_path):
+        """Test que el contenido se guarda en una ruta derivada de su SHA-256"""
+        from blobstore import BlobWriter
+        writer = BlobWriter(str(tmp_path))
+        writer.copy_from(io.BytesIO(b'x' * 200000), chunk_size=4096)
+        content_hash, size, relative = writer.commit()
+
+        assert content_hash == hashlib.sha256(b'x' * 200000).hexdigest()
+        assert size == 200000
+        assert relative == os.path.join(content_hash[:2], content_hash[2:4], content_hash)
+        assert (tmp_path / relative).read_bytes() == b'x' * 200000
+        assert os.listdir(tmp_path / 'tmp') == []
+
+
+class TestAttachmentRoutes:
+    """Tests para /api/tasks/<id>/attachments"""
+
+    def test_multipart_upload(self, client, attachments_dir, task_id):
+        """Test subida multipart de varios ficheros"""
+        response = client.post(
+            f'/api/tasks/{task_id}/attachments',
+            data={'file': [(io.BytesIO(b'hello'), 'hello.txt'), (io.BytesIO(b'\x89PNG'), 'logo.png')]},
+            content_type='multipart/form-data'
+        )
+
+        assert response.status_code == 201
+        created = json.loads(response.data)
+        assert [a['filename'] for a in created] == ['hello.txt', 'logo.png']
+        assert created[0]['size'] == 5
+        assert created[0]['content_hash'] == hashlib.sha256(b'hello').hexdigest()
+        assert created[0]['content_type'] == 'text/plain'
+        assert created[1]['url'] == f"/api/attachments/{created[1]['id']}"
+        assert len(blob_files(attachments_dir)) == 2
+
+    def test_raw_upload(self, client, attachments_dir, task_id):
+        """Test subida con el fichero como cuerpo binario"""
+        response = client.post(
+            f'/api/tasks/{task_id}/attachments',
+            data=b'raw bytes',
+            headers={'X-Filename': 'notes.md'},
+            content_type='application/octet-stream'
+        )
+
+        assert response.status_code == 201
+        assert json.loads(response.data)[0]['filename'] == 'notes.md'
+
+    def test_identical_uploads_are_deduplicated(self, client, attachments_dir, task_id):
+        """Test que el mismo contenido se almacena una sola vez"""
+        for name in ('a.txt', 'b.txt'):
+            client.post(
+                f'/api/tasks/{task_id}/attachments',
+                data={'file': (io.BytesIO(b'same content'), name)},
+                content_type='multipart/form-data'
+            )
+
+        assert len(Attachment.get_by_task(task_id)) == 2
+        assert len(blob_files(attachments_dir)) == 1
+
+    def test_list_attachments(self, client, attachments_dir, task_id):
+        """Test listado de adjuntos de una tarea"""
+        client.post(
+            f'/api/tasks/{task_id}/attachments',
+            data={'file': (io.BytesIO(b'data'), 'data.bin')},
+            content_type='multipart/form-data'
+        )
+
+        response = client.get(f'/api/tasks/{task_id}/attachments')
+        assert response.status_code == 200
+        assert [a['filename'] for a in json.loads(response.data)] == ['data.bin']
+
+    def test_upload_errors(self, client, attachments_dir, task_id):
+        """Test tarea inexistente y petición sin fichero"""
+        response = client.post(
+            '/api/tasks/9999/attachments',
+            data={'file': (io.BytesIO(b'x'), 'x.txt')},
+            content_type='multipart/form-data'
+        )
+        assert response.status_code == 404
+
+        response = client.post(f'/api/tasks/{task_id}/attachments', data={}, content_type='multipart/form-data')
+        assert response.status_code == 400
+
+    def test_delete_keeps_shared_blob(self, client, attachments_dir, task_id):
+        """Test que el blob solo se borra cuando ningún adjunto lo usa"""
+        ids = []
+        for name in ('a.txt', 'b.txt'):
+            response = client.post(
+                f'/api/tasks/{task_id}/attachments',
+                data={'file': (io.BytesIO(b'shared'), name)},
+                content_type='multipart/form-data'
+            )
+            ids.append(json.loads(response.data)[0]['id'])
+
+        assert client.delete(f'/api/attachments/{ids[0]}').status_code == 200
+        assert len(blob_files(attachments_dir)) == 1
+        assert client.delete(f'/api/attachments/{ids[1]}').status_code == 200
+        assert blob_files(attachments_dir) == []
+        assert client.delete(f'/api/attachments/{ids[1]}').status_code == 404
+
+    def test_task_delete_cascades(self, client, attachments_dir, task_id):
+        """Test que borrar la tarea borra sus registros de adjuntos"""
+        client.post(
+            f'/api/tasks/{task_id}/attachments',
+            data={'file': (io.BytesIO(b'data'), 'data.bin')},
+            content_type='multipart/form-data'
+        )
+        Task.delete(task_id)
+        assert Attachment.get_by_task(task_id) == []
+        assert blob_files(attachments_dir) == []
+
+    def test_task_delete_keeps_shared_blob(self, client, attachments_dir, task_id):
+        """Test que borrar una tarea conserva los blobs que usa otra"""
+        other = Task.create('Other', '', '', 3, '')
+        for target in (task_id, other):
+            client.post(
+                f'/api/tasks/{target}/attachments',
+                data={'file': (io.BytesIO(b'shared'), 'shared.txt')},
+                content_type='multipart/form-data'
+            )
+        Task.delete(task_id)
+        assert len(blob_files(attachments_dir)) == 1
+        client.post('/api/tasks/batch', data=json.dumps([{'op': 'delete', 'id': other}]),
+                    content_type='application/json')
+        assert blob_files(attachments_dir) == []
+
+    def test_failed_batch_keeps_files(self, client, attachments_dir, task_id, monkeypatch):
+        """Test que un lote deshecho no borra los ficheros de las tareas que sigue teniendo"""
+        import models
+        response = client.post(
+            f'/api/tasks/{task_id}/attachments',
+            data={'file': (io.BytesIO(b'keep me'), 'keep.txt')},
+            content_type='multipart/form-data'
+        )
+        attachment = json.loads(response.data)[0]
+        # El alta que sigue al borrado falla y deshace el lote entero
+        monkeypatch.setattr(models, 'INSERT_SQL', 'INSERT INTO missing_table VALUES (?)')
+        response = client.post('/api/tasks/batch', data=json.dumps([
+            {'op': 'delete', 'id': task_id},
+            {'op': 'create', 'data': {'title': 'b'}},
+        ]), content_type='application/json')
+        monkeypatch.undo()
+        assert response.status_code == 400
+        assert Task.get_by_id(task_id) is not None
+        download = client.get(attachment['url'])
+        assert download.status_code == 200
+        assert download.data == b'keep me'
+        download.close()
+
+    def test_failed_upload_creates_nothing(self, client, attachments_dir, task_id, monkeypatch):
+        """Test que si falla un fichero de la subida no queda ninguno"""
+        from blobstore import BlobWriter
+        commit = BlobWriter.commit
+        calls = []
+
+        def failing_commit(self):
+            calls.append(self)
+            if len(calls) == 2:
+                raise OSError('disk full')
+            return commit(self)
+
+        monkeypatch.setattr(BlobWriter, 'commit', failing_commit)
+        response = client.post(
+            f'/api/tasks/{task_id}/attachments',
+            data={'file': [(io.BytesIO(b'one'), 'one.txt'), (io.BytesIO(b'two'), 'two.txt')]},
+            content_type='multipart/form-data'
+        )
+        assert response.status_code == 400
+        assert Attachment.get_by_task(task_id) == []
+        assert blob_files(attachments_dir) == []
+
+    def test_upload_too_large(self, client, app, attachments_dir, task_id):
+        """Test que una subida por encima de MAX_CONTENT_LENGTH devuelve 413"""
+        original, app.config['MAX_CONTENT_LENGTH'] = app.config.get('MAX_CONTENT_LENGTH'), 16
+        try:
+            response = client.post(
+                f'/api/tasks/{task_id}/attachments',
+                data={'file': (io.BytesIO(b'x' * 1024), 'big.bin')},
+                content_type='multipart/form-data'
+            )
+        finally:
+            app.config['MAX_CONTENT_LENGTH'] = original
+        assert response.status_code == 413
+        assert Attachment.get_by_task(task_id) == []
+
+
+class TestAttachmentDownload:
+    """Tests para GET /api/attachments/<id>"""
+
+    @pytest.fixture
+    def attachment(self, client, attachments_dir, task_id):
+        response = client.post(
+            f'/api/tasks/{task_id}/attachments',
+            data={'file': (io.BytesIO(b'0123456789' * 100), 'digits.txt')},
+            content_type='multipart/form-data'
+        )
+        return json.loads(response.data)[0]
+
+    def test_download_full(self, client, attachment):
+        """Test descarga completa con validadores de caché"""
+        response = client.get(attachment['url'])
+
+        assert response.status_code == 200
+        assert response.data == b'0123456789' * 100
+        assert response.headers['ETag'] == f'"{attachment["content_hash"]}"'
+        assert 'immutable' in response.headers['Cache-Control']
+        assert 'max-age=31536000' in response.headers['Cache-Control']
+        assert response.headers['Accept-Ranges'] == 'bytes'
+        response.close()
+
+    def test_download_range(self, client, attachment):
+        """Test descarga parcial con Range"""
+        response = client.get(attachment['url'], headers={'Range': 'bytes=10-19'})
+
+        assert response.status_code == 206
+        assert response.data == b'0123456789'
+        assert response.headers['Content-Range'] == 'bytes 10-19/1000'
+        response.close()
+
+    def test_download_not_modified(self, client, attachment):
+        """Test If-None-Match con el hash de contenido"""
+        response = client.get(attachment['url'], headers={'If-None-Match': f'"{attachment["content_hash"]}"'})
+        assert response.status_code == 304
+
+    def test_download_as_attachment(self, client, attachment):
+        """Test ?download=1 fuerza Content-Disposition: attachment"""
+        response = client.get(attachment['url'] + '?download=1')
+        assert response.headers['Content-Disposition'].startswith('attachment')
+        response.close()
+
+    def test_x_accel_redirect(self, client, app, attachment):
+        """Test que con ATTACHMENTS_ACCEL_PREFIX el envío se delega en nginx"""
+        app.config['ATTACHMENTS_ACCEL_PREFIX'] = '/_attachments/'
+        try:
+            response = client.get(attachment['url'])
+        finally:
+            app.config.pop('ATTACHMENTS_ACCEL_PREFIX')
+
+        digest = attachment['content_hash']
+        assert response.headers['X-Accel-Redirect'] == f'/_attachments/{digest[:2]}/{digest[2:4]}/{digest}'
+        assert response.data == b''
+
+    def test_download_not_found(self, client, attachments_dir, db_connection):
+        """Test adjunto inexistente"""
+        assert client.get('/api/attachments/9999').status_code == 404
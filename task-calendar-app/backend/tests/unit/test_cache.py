@@ -0,0 +1,132 @@
+"""
+Tests unitarios para la caché de lecturas de Task
+"""
+import sqlite3
+import pytest
+from cache import TaskCache, task_cache, MISS
+from models import Task
+
+
+class TestTaskCacheUnit:
+    """Tests para la clase TaskCache"""
+
+    def test_disabled_cache_never_hits(self):
+        """Test que con maxsize 0 la caché no guarda nada"""
+        cache = TaskCache(maxsize=0)
+        cache.set(('task', 1), {'id': 1}, cache.generation)
+        assert cache.get(('task', 1)) is MISS
+
+    def test_lru_eviction(self):
+        """Test que se expulsa la entrada menos usada"""
+        cache = TaskCache(maxsize=2)
+        generation = cache.generation
+        cache.set(('task', 1), 'a', generation)
+        cache.set(('task', 2), 'b', generation)
+        cache.get(('task', 1))
+        cache.set(('task', 3), 'c', generation)
+
+        assert cache.get(('task', 2)) is MISS
+        assert cache.get(('task', 1)) == 'a'
+        assert cache.stats()['evictions'] == 1
+
+    def test_ttl_expiry(self, monkeypatch):
+        """Test que las entradas caducan tras el TTL"""
+        import cache as cache_module
+        now = [1000.0]
+        monkeypatch.setattr(cache_module.time, 'monotonic', lambda: now[0])
+        cache = TaskCache(maxsize=10, ttl=5)
+        cache.set(('task', 1), 'a', cache.generation)
+        assert cache.get(('task', 1)) == 'a'
+        now[0] += 6
+        assert cache.get(('task', 1)) is MISS
+
+    def test_stale_generation_is_not_stored(self):
+        """Test que una lectura iniciada antes de una escritura no se guarda"""
+        cache = TaskCache(maxsize=10)
+        cache.version = 1
+        generation = cache.generation
+        cache.invalidate([1], 2)
+        cache.set(('task', 1), 'old', generation)
+        assert cache.get(('task', 1)) is MISS
+
+    def test_precise_invalidation(self):
+        """Test que una escritura local solo invalida su tarea y los listados"""
+        cache = TaskCache(maxsize=10)
+        cache.version = 1
+        generation = cache.generation
+        cache.set(('task', 1), 'a', generation)
+        cache.set(('task', 2), 'b', generation)
+        cache.set(('all', (), 'created_at', 'DESC'), ['a', 'b'], generation)
+
+        cache.invalidate([1], 2)
+
+        assert cache.get(('task', 1)) is MISS
+        assert cache.get(('task', 2)) == 'b'
+        assert cache.get(('all', (), 'created_at', 'DESC')) is MISS
+
+
+class TestTaskCacheIntegration:
+    """Tests de la caché integrada en Task"""
+
+    @pytest.fixture(autouse=True)
+    def enabled_cache(self):
+        task_cache.configure(100, 60)
+        yield
+        task_cache.configure(0)
+
+    def test_get_by_id_hits_cache(self, db_connection):
+        """Test que la segunda lectura sale de la caché"""
+        task_id = Task.create('Cached', '', '', 3, '')
+        Task.get_by_id(task_id)
+        hits = task_cache.stats()['hits']
+
+        task = Task.get_by_id(task_id)
+        assert task['title'] == 'Cached'
+        assert task_cache.stats()['hits'] == hits + 1
+
+    def test_columnar_list_cached_and_invalidated(self, db_connection):
+        """Test que el listado columnar se cachea y una escritura lo invalida"""
+        Task.create('First', '', '', 3, '')
+        assert len(Task.get_columns(fields=('id',))['rows']) == 1
+        hits = task_cache.stats()['hits']
+        Task.get_columns(fields=('id',))['rows'].clear()
+        assert task_cache.stats()['hits'] == hits + 1
+        assert len(Task.get_columns(fields=('id',))['rows']) == 1
+
+        Task.create('Second', '', '', 3, '')
+        assert len(Task.get_columns(fields=('id',))['rows']) == 2
+
+    def test_local_write_invalidates(self, db_connection):
+        """Test que update/delete invalidan la entrada y los listados"""
+        task_id = Task.create('Before', '', '', 3, '')
+        Task.get_by_id(task_id)
+        assert len(Task.get_all()) == 1
+
+        Task.update(task_id, 'After', '', '', 3, '', 'pending')
+        assert Task.get_by_id(task_id)['title'] == 'After'
+
+        Task.create('Second', '', '', 3, '')
+        assert len(Task.get_all()) == 2
+
+        Task.delete(task_id)
+        assert Task.get_by_id(task_id) is None
+
+    def test_returned_values_are_copies(self, db_connection):
+        """Test que modificar el resultado no altera la caché"""
+        task_id = Task.create('Original', '', '', 3, '')
+        Task.get_by_id(task_id)['title'] = 'Mutated'
+        assert Task.get_by_id(task_id)['title'] == 'Original'
+
+    def test_foreign_write_detected(self, db_connection):
+        """Test que una escritura de otro proceso se detecta con data_version"""
+        task_id = Task.create('Local', '', '', 3, '')
+        assert Task.get_by_id(task_id)['title'] == 'Local'
+
+        # Simula otro worker escribiendo con su propia conexión
+        other = sqlite3.connect(db_connection)
+        other.execute("UPDATE tasks SET title = 'Foreign' WHERE id = ?", (task_id,))
+        other.execute('UPDATE data_version SET version = version + 1 WHERE id = 1')
+        other.commit()
+        other.close()
+
+        assert Task.get_by_id(task_id)['title'] == 'Foreign'
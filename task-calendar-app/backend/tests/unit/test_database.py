@@ -3,6 +3,7 @@ Tests unitarios para el módulo de base de datos
 """
 import pytest
 import sqlite3
+from unittest.mock import patch
 from database import get_db, init_db
 
 
@@ -78,3 +79,268 @@ class TestDatabase:
         assert expected_columns.issubset(set(columns.keys()))
         
         db.close()
+
+
+class TestQueryPlans:
+    """Tests que verifican con EXPLAIN QUERY PLAN que los filtros usan índices"""
+
+    def _plan(self, filters, sort=None):
+        from models import build_where, resolve_sort
+        clauses, params = build_where(filters)
+        column, direction = resolve_sort(sort)
+        query = (
+            f"SELECT * FROM tasks WHERE {' AND '.join(clauses)} "
+            f"ORDER BY {column} {direction}, id {direction}"
+        )
+        db = get_db()
+        plan = db.execute('EXPLAIN QUERY PLAN ' + query, params).fetchall()
+        db.close()
+        return ' '.join(row[3] for row in plan)
+
+    def test_status_and_due_range_uses_composite_index(self, db_connection):
+        """Test status + rango de fechas usa idx_tasks_status_due_date"""
+        plan = self._plan(
+            {'status': 'pending', 'due_from': '2025-01-01', 'due_to': '2025-01-31'},
+            'due_date'
+        )
+        assert 'SEARCH tasks USING INDEX idx_tasks_status_due_date' in plan
+        assert 'TEMP B-TREE' not in plan
+
+    def test_status_default_sort_uses_composite_index(self, db_connection):
+        """Test status con el orden por defecto usa idx_tasks_status_created_at"""
+        plan = self._plan({'status': 'completed'})
+        assert 'SEARCH tasks USING INDEX idx_tasks_status_created_at' in plan
+        assert 'TEMP B-TREE' not in plan
+
+    def test_category_uses_composite_index(self, db_connection):
+        """Test category ordenado por fecha usa idx_tasks_category_due_date"""
+        plan = self._plan({'category': 'work'}, 'due_date')
+        assert 'SEARCH tasks USING INDEX idx_tasks_category_due_date' in plan
+        assert 'TEMP B-TREE' not in plan
+
+    def test_due_range_uses_due_date_index(self, db_connection):
+        """Test rango de fechas sin otros filtros usa idx_tasks_due_date"""
+        plan = self._plan({'due_to': '2025-01-31'}, 'due_date')
+        assert 'SEARCH tasks USING INDEX idx_tasks_due_date' in plan
+
+
+class TestConnectionPool:
+    """Tests para el pool de conexiones"""
+
+    def test_connection_is_reused(self, db_connection):
+        """Test que close() devuelve la conexión al pool y se reutiliza"""
+        first = get_db()
+        first.close()
+        second = get_db()
+        assert second is first
+        second.close()
+
+    def test_pool_stats(self, db_connection):
+        """Test que el pool informa de conexiones abiertas y en uso"""
+        from database import get_pool
+        pool = get_pool()
+        db = get_db()
+        stats = pool.stats()
+        assert stats['in_use'] == 1
+        assert stats['opened'] >= 1
+        db.close()
+        assert pool.stats()['in_use'] == 0
+        assert pool.stats()['acquired'] >= 1
+
+    def test_release_rolls_back_open_transaction(self, db_connection):
+        """Test que una transacción sin commit se descarta al devolver la conexión"""
+        db = get_db()
+        db.execute("INSERT INTO tasks (title) VALUES ('uncommitted')")
+        db.close()
+
+        db = get_db()
+        count = db.execute('SELECT COUNT(*) FROM tasks').fetchone()[0]
+        db.close()
+        assert count == 0
+
+    def test_pool_timeout(self, db_connection):
+        """Test que se lanza PoolTimeout cuando el pool está agotado"""
+        from database import ConnectionPool, PoolTimeout
+        pool = ConnectionPool(db_connection, size=1, timeout=0.01)
+        db = pool.acquire()
+        with pytest.raises(PoolTimeout):
+            pool.acquire()
+        assert pool.stats()['waits'] == 1
+        db.close()
+        pool.close()
+
+    def test_app_context_shares_connection(self, app, db_connection):
+        """Test que dentro de un contexto de Flask se usa una única conexión"""
+        from database import get_pool
+        in_use = get_pool().stats()['in_use']
+        with app.app_context():
+            db = get_db()
+            db.close()
+            assert get_db() is db
+            assert get_pool().stats()['in_use'] == in_use + 1
+        assert get_pool().stats()['in_use'] == in_use
+
+
+class TestPragmaProfiles:
+    """Tests para los perfiles de PRAGMAs de SQLite"""
+
+    @pytest.fixture(autouse=True)
+    def restore_profile(self):
+        yield
+        import database
+        database.configure('default')
+
+    def test_throughput_profile_applied(self, db_connection):
+        """Test que el perfil throughput se aplica al abrir la conexión"""
+        from database import configure
+        configure('throughput')
+        db = get_db()
+        assert db.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        assert db.execute('PRAGMA synchronous').fetchone()[0] == 1
+        assert db.execute('PRAGMA cache_size').fetchone()[0] == -65536
+        assert db.execute('PRAGMA temp_store').fetchone()[0] == 2
+        assert db.execute('PRAGMA busy_timeout').fetchone()[0] == 5000
+        db.close()
+
+    def test_overrides_and_env(self, db_connection, monkeypatch):
+        """Test prioridad perfil < variables de entorno < overrides"""
+        from database import configure
+        monkeypatch.setenv('DB_BUSY_TIMEOUT', '1234')
+        pragmas = configure('throughput', {'synchronous': 'full'})
+        assert pragmas['busy_timeout'] == 1234
+        assert pragmas['synchronous'] == 'FULL'
+
+    def test_pragmas_env(self, monkeypatch):
+        """Test que DB_PRAGMAS admite varios PRAGMAs y app.config['DB_PRAGMAS'] prevalece"""
+        from database import configure, parse_pragmas
+        monkeypatch.setenv('DB_PRAGMAS', 'synchronous=FULL, cache_size=-2000')
+        pragmas = configure('default')
+        assert pragmas['synchronous'] == 'FULL'
+        assert pragmas['cache_size'] == -2000
+        assert configure('default', 'synchronous=off')['synchronous'] == 'OFF'
+        with pytest.raises(ValueError):
+            parse_pragmas('synchronous')
+
+    def test_lazy_configuration_keeps_pools(self, tmp_path, monkeypatch):
+        """Test que la primera conexión resuelve los PRAGMAs sin cerrar el pool que la abre"""
+        import database
+        from database import get_pool
+        path = str(tmp_path / 'lazy.db')
+        pool = get_pool(path)
+        monkeypatch.setattr(database, '_pragmas', None)
+        conn = pool.acquire()
+        assert conn.execute('PRAGMA busy_timeout').fetchone()[0] == 5000
+        conn.close()
+        assert get_pool(path) is pool
+        assert pool.stats()['opened'] == 1 and pool.stats()['idle'] == 1
+        database.close_pool(path)
+
+    def test_invalid_profile_and_values(self):
+        """Test que perfiles o valores inválidos lanzan ValueError"""
+        from database import configure
+        with pytest.raises(ValueError):
+            configure('turbo')
+        with pytest.raises(ValueError):
+            configure('default', {'synchronous': 'SOMETIMES'})
+        with pytest.raises(ValueError):
+            configure('default', {'page_size': 4096})
+
+
+class TestSchemaVersion:
+    """Tests para la inicialización perezosa del esquema"""
+
+    def test_user_version_set(self, db_connection):
+        """Test que init_db guarda la versión del esquema"""
+        import database
+        db = database.get_db()
+        assert db.execute('PRAGMA user_version').fetchone()[0] == database.SCHEMA_VERSION
+        db.close()
+
+    def test_init_db_runs_once_per_database(self, db_connection):
+        """Test que init_db no vuelve a migrar si ya se comprobó"""
+        import database
+        with patch.object(database, 'migrate') as create:
+            database.init_db()
+            assert not create.called
+            # Otro proceso: el memo se pierde pero user_version evita migrar
+            database._initialized.discard(db_connection)
+            database.init_db()
+            assert not create.called
+            database.init_db(force=True)
+            assert create.called
+
+    def test_upgrades_legacy_database(self, tmp_path):
+        """Test que una base anterior a las migraciones se pone al día"""
+        import database
+        path = str(tmp_path / 'legacy.db')
+        conn = sqlite3.connect(path)
+        conn.executescript('''
+            CREATE TABLE tasks (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT NOT NULL,
+                description TEXT, category TEXT, priority INTEGER, due_date TEXT,
+                status TEXT DEFAULT 'pending', created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+            CREATE TABLE attachments (id INTEGER PRIMARY KEY AUTOINCREMENT, task_id INTEGER NOT NULL,
+                filename TEXT NOT NULL, file_path TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+            INSERT INTO tasks (title, description) VALUES ('Antigua', 'sin migrar');
+            INSERT INTO attachments (task_id, filename, file_path) VALUES (1, 'a.html', 'a.html');
+        ''')
+        conn.close()
+        original = database.DATABASE
+        database.DATABASE = path
+        try:
+            database.init_db()
+            assert database.schema_version() == database.SCHEMA_VERSION
+            db = database.get_pool().acquire()
+            columns = {row[1] for row in db.execute('PRAGMA table_info(attachments)')}
+            assert {'content_hash', 'size', 'content_type'} <= columns
+            assert db.execute("SELECT rowid FROM tasks_fts WHERE tasks_fts MATCH 'migrar'").fetchone()
+            assert db.execute("SELECT count FROM task_stats WHERE dimension = 'total'").fetchone()[0] == 1
+            assert db.execute('SELECT recurrence FROM tasks').fetchone()[0] is None
+            assert db.execute('SELECT content_type FROM attachments').fetchone()[0] == 'application/octet-stream'
+            db.close()
+        finally:
+            database.close_pool(path)
+            database.DATABASE = original
+
+
+class TestTaskStatsTable:
+    """Tests para task_stats y sus triggers"""
+
+    def test_triggers_follow_every_write(self, db_connection, create_sample_tasks):
+        """Test que altas, cambios, lotes y bajas mantienen los contadores exactos"""
+        from database import check_stats
+        from models import Task
+        Task.patch(create_sample_tasks[0], {'status': 'completed', 'priority': 2})
+        Task.update(create_sample_tasks[1], 'Task 2', '', 'home', 4, '2026-01-01', 'in_progress')
+        Task.apply_batch([
+            (0, 'create', None, ('Batch', '', 'work', 1, '2025-01-01')),
+            (1, 'delete', create_sample_tasks[2], None),
+        ])
+        Task.delete(create_sample_tasks[0])
+        assert check_stats() == []
+
+    def test_empty_rows_removed(self, db_connection):
+        """Test que los contadores que llegan a 0 desaparecen"""
+        from models import Task
+        task_id = Task.create('Once', '', 'work', 3, '2025-01-01')
+        Task.delete(task_id)
+        db = get_db()
+        assert db.execute('SELECT COUNT(*) FROM task_stats').fetchone()[0] == 0
+        db.close()
+
+    def test_check_and_repair(self, db_connection, create_sample_tasks):
+        """Test que check_stats detecta diferencias y repair las corrige"""
+        from database import check_stats
+        db = get_db()
+        db.execute("UPDATE task_stats SET count = 99 WHERE dimension = 'status'")
+        db.execute("DELETE FROM task_stats WHERE dimension = 'total'")
+        db.commit()
+        db.close()
+
+        differences = check_stats()
+        assert ('status', 'pending', 99, 3) in differences
+        assert ('total', '', 0, 3) in differences
+        assert check_stats(repair=True) == differences
+        assert check_stats() == []
+
@@ -0,0 +1,126 @@
+"""
+Tests unitarios para el broker de eventos y GET /api/tasks/stream
+"""
+import json
+import tempfile
+import time
+
+import pytest
+
+from events import EventBroker, Subscription, TooManySubscribers, broker
+from models import Task
+
+
+class TestSubscription:
+    """Tests para la cola acotada de cada cliente"""
+
+    def test_coalesces_by_task(self):
+        """Test que varias escrituras sobre una tarea dan un solo cambio"""
+        subscription = Subscription(10)
+        subscription.push(1, [('created', 7)])
+        subscription.push(2, [('updated', 7)])
+        subscription.push(3, [('updated', 8)])
+        subscription.push(4, [('updated', 8)])
+        message = subscription.get(0)
+        assert message['version'] == 4
+        assert message['changes'] == [{'op': 'created', 'id': 7}, {'op': 'updated', 'id': 8}]
+        assert subscription.get(0) is None
+
+    def test_dropped_when_full(self):
+        """Test que un cliente que no consume se descarta sin bloquear"""
+        subscription = Subscription(2)
+        assert subscription.push(1, [('created', 1), ('created', 2)])
+        assert not subscription.push(2, [('created', 3)])
+        assert subscription.dropped
+        assert subscription.get(0) is None
+
+
+class TestEventBroker:
+    """Tests para el reparto entre suscriptores"""
+
+    def test_fan_out_and_drop_slow_consumer(self):
+        """Test que todos reciben y el lento se elimina del broker"""
+        local = EventBroker(queue_size=1)
+        fast, slow = local.subscribe(), local.subscribe()
+        local.publish(1, [('created', 1)])
+        assert fast.get(0)['changes'] == [{'op': 'created', 'id': 1}]
+        local.publish(2, [('created', 2)])
+        assert slow.dropped
+        assert local.stats()['subscribers'] == 1
+        assert local.stats()['dropped'] == 1
+
+    def test_max_subscribers(self):
+        """Test que se limita el número de clientes"""
+        local = EventBroker(max_subscribers=1)
+        local.subscribe()
+        with pytest.raises(TooManySubscribers):
+            local.subscribe()
+
+    def test_ipc_between_workers(self):
+        """Test que los cambios llegan a los clientes de otro proceso"""
+        directory = tempfile.mkdtemp()
+        first, second = EventBroker(), EventBroker()
+        first.start_ipc(directory)
+        second.start_ipc(directory)
+        try:
+            subscription = second.subscribe()
+            first.publish(5, [('deleted', 3)])
+            message = subscription.get(2)
+            assert message == {'version': 5, 'changes': [{'op': 'deleted', 'id': 3}]}
+        finally:
+            first.stop_ipc()
+            second.stop_ipc()
+
+
+class TestTaskEvents:
+    """Tests para los eventos publicados por Task"""
+
+    def test_writes_publish_events(self, db_connection):
+        """Test que create/update/delete y los lotes publican cambios"""
+        subscription = broker.subscribe()
+        try:
+            task_id = Task.create('Pushed', '', '', 3, '')
+            Task.update(task_id, 'Pushed', '', '', 4, '', 'pending')
+            other = Task.apply_batch([(0, 'create', None, ('Batch', '', '', 3, ''))])[0]['id']
+            Task.delete(task_id)
+            Task.delete(9999)
+            message = subscription.get(0)
+            assert message['version'] == Task.get_version() - 1
+            assert message['changes'] == [
+                {'op': 'deleted', 'id': task_id}, {'op': 'created', 'id': other}
+            ]
+        finally:
+            broker.unsubscribe(subscription)
+
+
+class TestStreamRoute:
+    """Tests para GET /api/tasks/stream"""
+
+    def test_stream_pushes_changes(self, app, client, db_connection):
+        """Test que el stream envía un evento changes tras una escritura"""
+        app.config.update({'EVENTS_COALESCE': 0, 'EVENTS_HEARTBEAT': 0.01})
+        try:
+            response = client.get('/api/tasks/stream', buffered=False)
+            assert response.mimetype == 'text/event-stream'
+            chunks = iter(response.response)
+            assert next(chunks).startswith(b'retry:')
+            task_id = Task.create('Live', '', '', 3, '')
+            chunk = next(chunks).decode()
+            assert 'event: changes' in chunk
+            data = json.loads(chunk.split('data: ', 1)[1])
+            assert data['changes'] == [{'op': 'created', 'id': task_id}]
+            assert next(chunks) == b': keepalive\n\n'
+            response.close()
+            assert broker.stats()['subscribers'] == 0
+        finally:
+            app.config.pop('EVENTS_COALESCE')
+            app.config.pop('EVENTS_HEARTBEAT')
+
+    def test_reconnect_with_stale_last_event_id(self, app, client, db_connection):
+        """Test que al reconectar con un id antiguo se avisa de inmediato"""
+        Task.create('Missed', '', '', 3, '')
+        response = client.get('/api/tasks/stream', buffered=False, headers={'Last-Event-ID': '0'})
+        chunks = iter(response.response)
+        next(chunks)
+        assert f'id: {Task.get_version()}' in next(chunks).decode()
+        response.close()
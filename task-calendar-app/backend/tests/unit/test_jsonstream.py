@@ -0,0 +1,57 @@
+"""
+Tests unitarios para el lector incremental de arrays JSON
+"""
+import io
+import json
+import pytest
+from jsonstream import iter_json_array, iter_json_array_chunks, iter_ndjson_chunks, JSONStreamError
+
+
+class TestIterJsonArray:
+    """Tests para iter_json_array"""
+
+    @pytest.mark.parametrize('chunk_size', [1, 3, 16, 65536])
+    def test_items_across_chunk_boundaries(self, chunk_size):
+        """Test que los elementos se reconstruyen aunque crucen bloques"""
+        data = [{'title': f'Tarea ñ {i}', 'priority': i} for i in range(50)] + [12345, 'x']
+        raw = json.dumps(data).encode('utf-8')
+
+        assert list(iter_json_array(io.BytesIO(raw), chunk_size)) == data
+
+    def test_empty_array(self):
+        """Test array vacío con espacios"""
+        assert list(iter_json_array(io.BytesIO(b'  [ ]  '), 2)) == []
+
+    def test_is_lazy(self):
+        """Test que los elementos se entregan antes de leer todo el cuerpo"""
+        stream = io.BytesIO(b'[{"a": 1}, {"a": 2}' + b' ' * 1000 + b']')
+        items = iter_json_array(stream, 16)
+        assert next(items) == {'a': 1}
+        assert stream.tell() < 100
+
+    @pytest.mark.parametrize('body', [b'', b'{}', b'[1,', b'[1 2]', b'[1] x', b'[{]'])
+    def test_invalid_json(self, body):
+        """Test que el JSON inválido lanza JSONStreamError"""
+        with pytest.raises(JSONStreamError):
+            list(iter_json_array(io.BytesIO(body), 2))
+
+
+class TestStreamingEncoders:
+    """Tests para los serializadores en streaming"""
+
+    def test_json_array_chunks(self):
+        """Test que los fragmentos forman un array JSON válido"""
+        batches = [[{'id': 1}, {'id': 2}], [], [{'id': 3}]]
+        chunks = list(iter_json_array_chunks(iter(batches)))
+
+        assert chunks[0] == '['
+        assert json.loads(''.join(chunks)) == [{'id': 1}, {'id': 2}, {'id': 3}]
+
+    def test_json_array_chunks_empty(self):
+        """Test array vacío"""
+        assert ''.join(iter_json_array_chunks(iter([]))) == '[]'
+
+    def test_ndjson_chunks(self):
+        """Test una línea por elemento"""
+        text = ''.join(iter_ndjson_chunks(iter([[{'id': 1}], [{'id': 2}, {'id': 3}]])))
+        assert [json.loads(line) for line in text.splitlines()] == [{'id': 1}, {'id': 2}, {'id': 3}]
@@ -0,0 +1,123 @@
+"""
+Tests unitarios para el módulo de métricas
+"""
+import gc
+import threading
+
+import pytest
+
+import metrics
+from metrics import Gauge, Histogram
+
+
+class TestHistogram:
+    """Tests para los histogramas por hilo"""
+
+    def test_observe_and_render(self):
+        """Test que los buckets se exportan acumulados"""
+        histogram = Histogram('latency_seconds', 'Latencia', ('endpoint',), buckets=(0.1, 1.0))
+        histogram.observe(('a',), 0.05)
+        histogram.observe(('a',), 0.1)
+        histogram.observe(('a',), 3)
+        lines = histogram.render()
+        assert '# TYPE latency_seconds histogram' in lines
+        assert 'latency_seconds_bucket{endpoint="a",le="0.1"} 2' in lines
+        assert 'latency_seconds_bucket{endpoint="a",le="1.0"} 2' in lines
+        assert 'latency_seconds_bucket{endpoint="a",le="+Inf"} 3' in lines
+        assert 'latency_seconds_count{endpoint="a"} 3' in lines
+
+    def test_merges_threads(self):
+        """Test que se suman los fragmentos de todos los hilos"""
+        histogram = Histogram('work_seconds', 'Trabajo', ('kind',), buckets=(1.0,))
+
+        def worker():
+            for _ in range(100):
+                histogram.observe(('x',), 0.5)
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        series = histogram.totals()[('x',)]
+        assert series[0] == 400
+        assert series[-1] == pytest.approx(200.0)
+
+    def test_escapes_labels(self):
+        """Test que se escapan comillas en los valores de las etiquetas"""
+        histogram = Histogram('h', 'H', ('endpoint',), buckets=(1.0,))
+        histogram.observe(('a"b',), 0.5)
+        assert 'h_count{endpoint="a\\"b"} 1' in histogram.render()
+
+
+class TestGauge:
+    """Tests para los gauges por hilo"""
+
+    def test_inc_dec_across_threads(self):
+        """Test que el valor es la suma de todos los hilos"""
+        gauge = Gauge('in_flight', 'En curso')
+        gauge.inc()
+        thread = threading.Thread(target=lambda: gauge.inc(amount=2))
+        thread.start()
+        thread.join()
+        gauge.dec()
+        assert gauge.value() == 2
+        assert 'in_flight 2' in gauge.render()
+
+
+class TestShortLivedThreads:
+    """Tests para los fragmentos de hilos que terminan (un hilo por petición)"""
+
+    def test_shards_stay_bounded(self):
+        """Test que los fragmentos de los hilos terminados se suman y se liberan"""
+        histogram = Histogram('req_seconds', 'Petición', ('endpoint',), buckets=(1.0,))
+        gauge = Gauge('active', 'Activos')
+
+        for _ in range(200):
+            thread = threading.Thread(target=lambda: (histogram.observe(('a',), 0.5), gauge.inc()))
+            thread.start()
+            thread.join()
+            del thread
+        gc.collect()
+
+        assert len(histogram._shards) <= 1
+        assert len(gauge._shards) <= 1
+        assert histogram.totals()[('a',)][0] == 200
+        assert histogram.totals()[('a',)][-1] == pytest.approx(100.0)
+        assert gauge.value() == 200
+        histogram.clear()
+        assert histogram.totals() == {}
+
+
+class TestMetricsEndpoint:
+    """Tests para la instrumentación y GET /api/metrics"""
+
+    def test_records_requests(self, client):
+        """Test que se registran latencia, tiempo en BD y tamaño por endpoint"""
+        client.get('/api/tasks')
+        response = client.get('/api/metrics')
+        assert response.status_code == 200
+        assert response.content_type == metrics.CONTENT_TYPE
+        body = response.data.decode()
+        labels = 'endpoint="tasks.get_tasks",method="GET",status="200"'
+        assert f'http_request_duration_seconds_count{{{labels}}}' in body
+        assert f'http_request_db_seconds_count{{{labels}}}' in body
+        assert f'http_response_size_bytes_count{{{labels}}}' in body
+
+    def test_db_time_recorded(self, client):
+        """Test que las peticiones que consultan la BD acumulan tiempo de SQLite"""
+        client.get('/api/tasks')
+        key = ('tasks.get_tasks', 'GET', '200')
+        assert metrics.REQUEST_DB_TIME.totals()[key][-1] > 0
+
+    def test_in_flight_returns_to_zero(self, client):
+        """Test que las peticiones terminadas no quedan en curso"""
+        client.get('/api/tasks')
+        client.get('/api/tasks/999999')
+        assert metrics.IN_FLIGHT.value() == 0
+
+    def test_unmatched_routes_share_series(self, client):
+        """Test que las URL sin ruta se agrupan en una sola serie"""
+        response = client.delete('/api/does-not-exist')
+        key = ('unmatched', 'DELETE', str(response.status_code))
+        assert key in metrics.REQUEST_DURATION.totals()
@@ -0,0 +1,116 @@
+"""
+Tests unitarios para el módulo de migraciones
+"""
+import sqlite3
+
+import pytest
+
+from migrations import (
+    Migration, Step, Sql, AddColumn, CreateIndex, Backfill, MigrationError,
+    current_version, migrate, pending,
+)
+
+
+@pytest.fixture
+def db():
+    """Conexión en memoria con una tabla de ejemplo"""
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)')
+    conn.executemany('INSERT INTO items (name) VALUES (?)', [(f'item {i}',) for i in range(25)])
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+class TestMigrate:
+    """Tests para el runner de migraciones"""
+
+    def test_applies_pending_and_sets_version(self, db):
+        """Test que se aplican las migraciones y se guarda user_version"""
+        migrations = [
+            Migration(1, 'one', [AddColumn('items', 'size', 'INTEGER')]),
+            Migration(2, 'two', [CreateIndex('idx_items_size', 'items', 'size')]),
+        ]
+        results = migrate(db, migrations)
+        assert current_version(db) == 2
+        assert [r.description for r in results] == ['add column items.size', 'create index idx_items_size']
+        assert all(r.seconds >= 0 for r in results)
+        assert pending(db, migrations) == []
+
+    def test_target_and_report(self, db):
+        """Test que se respeta la versión de destino y se informa cada paso"""
+        migrations = [
+            Migration(1, 'one', [Sql('CREATE TABLE a (x)')]),
+            Migration(2, 'two', [Sql('CREATE TABLE b (x)')]),
+        ]
+        reported = []
+        migrate(db, migrations, target=1, report=reported.append)
+        assert current_version(db) == 1
+        assert len(reported) == 1
+        migrate(db, migrations)
+        assert current_version(db) == 2
+
+    def test_steps_are_idempotent(self, db):
+        """Test que repetir una migración a medias no falla"""
+        db.execute('ALTER TABLE items ADD COLUMN size INTEGER')
+        migrations = [Migration(1, 'one', [
+            AddColumn('items', 'size', 'INTEGER'),
+            CreateIndex('idx_items_size', 'items', 'size'),
+        ])]
+        migrate(db, migrations)
+        db.execute('PRAGMA user_version = 0')
+        migrate(db, migrations)
+        assert current_version(db) == 1
+
+    def test_failure_keeps_version(self, db):
+        """Test que un paso fallido no actualiza user_version"""
+        migrations = [
+            Migration(1, 'one', [Sql('CREATE TABLE a (x)')]),
+            Migration(2, 'two', [Sql('CREATE TABLE items (x)')]),
+        ]
+        with pytest.raises(MigrationError):
+            migrate(db, migrations)
+        assert current_version(db) == 1
+
+    def test_step_requires_run(self):
+        """Test que un paso sin run() no se puede instanciar"""
+        class Incomplete(Step):
+            description = 'incomplete'
+
+        with pytest.raises(TypeError):
+            Incomplete()
+
+    def test_versions_must_be_consecutive(self, db):
+        """Test que se rechazan versiones desordenadas"""
+        with pytest.raises(MigrationError):
+            migrate(db, [Migration(2, 'two', [])])
+
+
+class TestBackfill:
+    """Tests para el relleno por lotes"""
+
+    def test_backfill_in_chunks(self, db):
+        """Test que se rellenan todas las filas con un commit por lote"""
+        db.execute('ALTER TABLE items ADD COLUMN size INTEGER')
+        commits = []
+        db.set_trace_callback(lambda stmt: stmt == 'COMMIT' and commits.append(stmt))
+        rows = Backfill('items', 'size', 'length(name)', chunk_size=10).run(db)
+        db.set_trace_callback(None)
+        assert rows == 25
+        assert len(commits) == 3
+        assert db.execute('SELECT COUNT(*) FROM items WHERE size IS NULL').fetchone()[0] == 0
+
+    def test_backfill_resumes(self, db):
+        """Test que un backfill interrumpido solo toca las filas pendientes"""
+        db.execute('ALTER TABLE items ADD COLUMN size INTEGER')
+        db.execute('UPDATE items SET size = 0 WHERE id <= 20')
+        db.commit()
+        rows = Backfill('items', 'size', 'length(name)', chunk_size=10).run(db)
+        assert rows == 5
+        assert db.execute('SELECT COUNT(*) FROM items WHERE size = 0').fetchone()[0] == 20
+
+    def test_backfill_empty_table(self, db):
+        """Test que un backfill sobre una tabla vacía no hace nada"""
+        db.execute('DELETE FROM items')
+        db.execute('ALTER TABLE items ADD COLUMN size INTEGER')
+        assert Backfill('items', 'size', '1').run(db) == 0
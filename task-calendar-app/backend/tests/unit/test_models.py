@@ -4,6 +4,7 @@ Tests unitarios para los modelos
 import pytest
 from datetime import datetime
 from models import Task
+from database import get_db
 
 
 class TestTaskModel:
@@ -152,3 +153,584 @@ class TestTaskModel:
             # Las tareas de prueba se crean en orden, así que las últimas
             # creadas deberían aparecer primero
             pass  # El orden depende de la implementación exacta
+
+
+class TestTaskPagination:
+    """Tests para la paginación por cursor de Task"""
+
+    def test_get_page_walks_all_tasks(self, db_connection):
+        """Test que recorrer las páginas devuelve todas las tareas sin repetir"""
+        created = [Task.create(f'Task {i}', '', '', 3, '') for i in range(7)]
+
+        seen = []
+        cursor = None
+        while True:
+            page, cursor = Task.get_page(3, cursor)
+            assert len(page) <= 3
+            seen.extend(task['id'] for task in page)
+            if cursor is None:
+                break
+
+        assert seen == sorted(created, reverse=True)
+
+    def test_get_page_last_page_has_no_cursor(self, db_connection, create_sample_tasks):
+        """Test que la última página no devuelve next_cursor"""
+        page, cursor = Task.get_page(10)
+        assert len(page) == 3
+        assert cursor is None
+
+    def test_get_page_invalid_cursor(self, db_connection):
+        """Test que un cursor corrupto lanza InvalidCursor"""
+        from models import InvalidCursor
+        with pytest.raises(InvalidCursor):
+            Task.get_page(10, 'not-a-cursor')
+
+    @pytest.mark.parametrize('sort', ['priority', '-priority', 'due_date', '-due_date'])
+    def test_get_page_walks_across_nulls(self, db_connection, sort):
+        """Test que los cursores con la clave de orden a NULL se aceptan y no saltan filas"""
+        values = [None, 2, None, 1, None, 2, None]
+        created = [Task.create(f'Task {i}', '', '', value, None if value is None else f'2025-01-0{value}')
+                   for i, value in enumerate(values)]
+        expected = [task['id'] for task in Task.get_all(sort=sort)]
+
+        seen = []
+        cursor = None
+        while True:
+            page, cursor = Task.get_page(2, cursor, sort=sort)
+            seen.extend(task['id'] for task in page)
+            if cursor is None:
+                break
+
+        assert seen == expected
+        assert sorted(seen) == sorted(created)
+
+    @pytest.mark.parametrize('sort, index', [
+        ('-created_at', 'idx_tasks_created_at_id (created_at<?)'),
+        ('due_date', 'idx_tasks_due_date (due_date>?)'),
+        ('-due_date', 'idx_tasks_due_date (due_date<?)'),
+    ])
+    def test_cursor_query_uses_index(self, db_connection, sort, index):
+        """Test que la consulta de una página posterior busca en el índice en lugar de recorrerlo"""
+        from database import get_db
+        from models import _keyset_rows, resolve_sort
+        column, direction = resolve_sort(sort)
+        db = get_db()
+        statements = []
+        db.set_trace_callback(statements.append)
+        try:
+            _keyset_rows(db, None, [], [], column, direction, ('2025-01-01', 10), 21)
+        finally:
+            db.set_trace_callback(None)
+        plan = [row[3] for row in db.execute(f'EXPLAIN QUERY PLAN {statements[0]}')]
+        db.close()
+        assert plan == [f'SEARCH tasks USING INDEX {index}']
+
+    def test_cursor_roundtrip(self):
+        """Test que el cursor codifica y decodifica (created_at, id)"""
+        from models import encode_cursor, decode_cursor
+        cursor = encode_cursor('2025-01-01 10:00:00', 42)
+        assert decode_cursor(cursor) == ('2025-01-01 10:00:00', 42)
+
+    def test_get_page_uses_index(self, db_connection):
+        """Test que la consulta por cursor usa el índice (created_at, id)"""
+        from database import get_db
+        db = get_db()
+        plan = db.execute(
+            'EXPLAIN QUERY PLAN SELECT * FROM tasks WHERE (created_at, id) < (?, ?) '
+            'ORDER BY created_at DESC, id DESC LIMIT 10',
+            ('2025-01-01', 1)
+        ).fetchall()
+        db.close()
+        detail = ' '.join(row[3] for row in plan)
+        assert 'idx_tasks_created_at_id' in detail
+        assert 'TEMP B-TREE' not in detail
+
+
+class TestTaskFiltering:
+    """Tests para filtros y ordenación en Task.get_all / get_page"""
+
+    def test_filter_by_category(self, db_connection, create_sample_tasks):
+        """Test filtro por categoría"""
+        tasks = Task.get_all({'category': 'work'})
+        assert [t['title'] for t in tasks] == ['Task 1']
+
+    def test_filter_by_status_list(self, db_connection, create_sample_tasks):
+        """Test filtro por varios estados separados por comas"""
+        Task.update(create_sample_tasks[0], 'Task 1', '', 'work', 1, '2025-12-15', 'completed')
+        assert len(Task.get_all({'status': 'completed'})) == 1
+        assert len(Task.get_all({'status': 'pending,completed'})) == 3
+
+    def test_filter_by_priority_range(self, db_connection, create_sample_tasks):
+        """Test filtro por rango de prioridad"""
+        tasks = Task.get_all({'priority_min': '2', 'priority_max': '4'})
+        assert [t['title'] for t in tasks] == ['Task 2']
+
+    def test_filter_by_due_range_excludes_undated(self, db_connection, create_sample_tasks):
+        """Test rango de fechas que excluye tareas sin fecha"""
+        Task.create('Undated', '', '', 3, '')
+        tasks = Task.get_all({'due_to': '2025-12-15'}, 'due_date')
+        assert [t['title'] for t in tasks] == ['Task 3', 'Task 1']
+
+    def test_sort_by_priority(self, db_connection, create_sample_tasks):
+        """Test ordenación por prioridad descendente"""
+        tasks = Task.get_all(sort='-priority')
+        assert [t['priority'] for t in tasks] == [5, 3, 1]
+
+    def test_invalid_sort_and_filter(self, db_connection):
+        """Test que sort o filtros inválidos lanzan InvalidFilter"""
+        from models import InvalidFilter
+        with pytest.raises(InvalidFilter):
+            Task.get_all(sort='drop table')
+        with pytest.raises(InvalidFilter):
+            Task.get_all({'priority_min': 'high'})
+
+    def test_get_page_with_sort_and_filter(self, db_connection):
+        """Test paginación por cursor combinada con filtros y ordenación"""
+        for i in range(5):
+            Task.create(f'Task {i}', '', 'work', 3, f'2025-01-0{i + 1}')
+        Task.create('Other', '', 'home', 3, '2025-01-01')
+
+        seen = []
+        cursor = None
+        while True:
+            page, cursor = Task.get_page(2, cursor, {'category': 'work'}, 'due_date')
+            seen.extend(t['due_date'] for t in page)
+            if cursor is None:
+                break
+        assert seen == [f'2025-01-0{i + 1}' for i in range(5)]
+
+
+class TestTaskBatch:
+    """Tests para Task.apply_batch"""
+
+    def test_batch_create_returns_ids(self, db_connection):
+        """Test que las altas en lote devuelven ids consecutivos y válidos"""
+        operations = [
+            (i, 'create', None, (f'Task {i}', '', 'bulk', 3, '')) for i in range(5)
+        ]
+        results = Task.apply_batch(operations, chunk_size=2)
+
+        assert [r['status'] for r in results] == [201] * 5
+        for i, result in enumerate(results):
+            assert Task.get_by_id(result['id'])['title'] == f'Task {i}'
+
+    def test_batch_mixed_operations(self, db_connection, create_sample_tasks):
+        """Test altas, modificaciones y bajas mezcladas en orden"""
+        first, second, _ = create_sample_tasks
+        operations = [
+            (0, 'update', first, ('Renamed', '', 'work', 2, '', 'completed')),
+            (1, 'delete', second, None),
+            (2, 'delete', 9999, None),
+            (3, 'create', None, ('New', '', '', 3, '')),
+        ]
+        results = Task.apply_batch(operations)
+
+        assert [r['status'] for r in results] == [200, 200, 404, 201]
+        assert Task.get_by_id(first)['status'] == 'completed'
+        assert Task.get_by_id(second) is None
+        assert len(Task.get_all()) == 3
+
+    def test_batch_is_atomic(self, db_connection):
+        """Test que un error de base de datos deshace todo el lote"""
+        import sqlite3
+        operations = [
+            (0, 'create', None, ('Ok', '', '', 3, '')),
+            (1, 'create', None, ('Bad priority', '', '', 9, '')),
+        ]
+        with pytest.raises(sqlite3.IntegrityError):
+            Task.apply_batch(operations)
+        assert Task.get_all() == []
+
+
+class TestTaskDataVersion:
+    """Tests para la versión global de datos"""
+
+    def test_version_bumped_on_writes(self, db_connection):
+        """Test que cada escritura incrementa la versión"""
+        start = Task.get_version()
+        task_id = Task.create('Versioned', '', '', 3, '')
+        assert Task.get_version() == start + 1
+        Task.update(task_id, 'Versioned', '', '', 4, '', 'pending')
+        assert Task.get_version() == start + 2
+        Task.delete(task_id)
+        assert Task.get_version() == start + 3
+
+    def test_version_bumped_once_per_batch(self, db_connection):
+        """Test que un lote incrementa la versión una sola vez"""
+        start = Task.get_version()
+        Task.apply_batch([(i, 'create', None, (f'T{i}', '', '', 3, '')) for i in range(3)])
+        assert Task.get_version() == start + 1
+
+    def test_reads_do_not_bump_version(self, db_connection, create_sample_tasks):
+        """Test que las lecturas no cambian la versión"""
+        start = Task.get_version()
+        Task.get_all()
+        Task.get_by_id(create_sample_tasks[0])
+        assert Task.get_version() == start
+
+
+class TestTaskSearch:
+    """Tests para la búsqueda de texto completo"""
+
+    @pytest.fixture
+    def search_tasks(self, db_connection):
+        return {
+            'meeting': Task.create('Reunión de equipo', 'Preparar agenda del sprint', 'work', 3, ''),
+            'dentist': Task.create('Dentista', 'Llamar para pedir cita antes de la reunión', 'home', 2, ''),
+            'groceries': Task.create('Compras', 'Leche, pan y huevos', 'home', 1, ''),
+        }
+
+    def test_search_ranks_title_matches_first(self, search_tasks):
+        """Test que las coincidencias en el título pesan más"""
+        results = Task.search('reunion')
+        assert [r['id'] for r in results] == [search_tasks['meeting'], search_tasks['dentist']]
+        assert '<mark>Reunión</mark>' in results[0]['title_highlight']
+        assert '<mark>reunión</mark>' in results[1]['snippet']
+
+    def test_search_highlight_escapes_html(self, db_connection):
+        """Test que el resaltado es HTML seguro: solo <mark> sin escapar"""
+        Task.create('<img src=x onerror=alert(1)> reunión', 'a & b <script>reunión</script>', '', 3, '')
+        result = Task.search('reunion')[0]
+        assert result['title_highlight'] == '&lt;img src=x onerror=alert(1)&gt; <mark>reunión</mark>'
+        assert '<script>' not in result['snippet']
+        assert '&lt;script&gt;<mark>reunión</mark>&lt;/script&gt;' in result['snippet']
+        assert 'a &amp; b' in result['snippet']
+        # Los campos originales no se tocan
+        assert result['title'].startswith('<img')
+
+    def test_search_prefix(self, search_tasks):
+        """Test búsqueda por prefijo"""
+        results = Task.search('comp')
+        assert [r['id'] for r in results] == [search_tasks['groceries']]
+
+    def test_search_follows_updates_and_deletes(self, search_tasks):
+        """Test que los triggers mantienen el índice sincronizado"""
+        Task.update(search_tasks['groceries'], 'Supermercado', 'Fruta', 'home', 1, '', 'pending')
+        assert Task.search('compras') == []
+        assert len(Task.search('supermercado')) == 1
+
+        Task.delete(search_tasks['meeting'])
+        assert [r['id'] for r in Task.search('reunion')] == [search_tasks['dentist']]
+
+    def test_search_ignores_fts_syntax(self, search_tasks):
+        """Test que los operadores FTS5 del usuario no rompen la consulta"""
+        assert len(Task.search('"pan* (')) == 1
+
+    def test_search_empty_query(self, db_connection):
+        """Test que una consulta vacía lanza InvalidFilter"""
+        from models import InvalidFilter
+        with pytest.raises(InvalidFilter):
+            Task.search('  ')
+
+    def test_rebuild_index(self, search_tasks):
+        """Test que rebuild_search_index reindexa el contenido de tasks"""
+        from database import get_db, rebuild_search_index
+        db = get_db()
+        db.execute("INSERT INTO tasks_fts (tasks_fts) VALUES ('delete-all')")
+        db.commit()
+        db.close()
+        assert Task.search('dentista') == []
+
+        rebuild_search_index()
+        assert len(Task.search('dentista')) == 1
+
+
+class TestTaskStreaming:
+    """Tests para Task.iter_all"""
+
+    def test_iter_all_yields_batches(self, db_connection):
+        """Test que iter_all devuelve las tareas en lotes de batch_size"""
+        for i in range(5):
+            Task.create(f'Task {i}', '', 'work', 3, '')
+
+        batches = list(Task.iter_all({'category': 'work'}, 'title', batch_size=2))
+        assert [len(batch) for batch in batches] == [2, 2, 1]
+        assert [t['title'] for batch in batches for t in batch] == [f'Task {i}' for i in range(5)]
+
+    def test_iter_all_releases_connection(self, db_connection, create_sample_tasks):
+        """Test que la conexión vuelve al pool entre lotes y al abandonar la iteración"""
+        from database import get_pool
+        in_use = get_pool().stats()['in_use']
+
+        batches = Task.iter_all(batch_size=1)
+        next(batches)
+        assert get_pool().stats()['in_use'] == in_use
+        batches.close()
+        assert get_pool().stats()['in_use'] == in_use
+
+    def test_iter_all_does_not_block_writers(self, db_connection, create_sample_tasks):
+        """Test que se puede escribir mientras un cliente lento está a mitad de la descarga"""
+        batches = Task.iter_all(sort='created_at', batch_size=1)
+        first = next(batches)
+        Task.delete(first[0]['id'])
+        Task.create('Nueva', '', 'work', 1, '')
+        rest = [task['title'] for batch in batches for task in batch]
+        assert rest == ['Task 2', 'Task 3', 'Nueva']
+
+    @pytest.mark.parametrize('sort', ['due_date', '-due_date', 'priority'])
+    def test_iter_all_pages_across_nulls(self, db_connection, sort):
+        """Test que los lotes no pierden ni repiten tareas con la clave de orden a NULL"""
+        for i in range(1, 8):
+            Task.create(f'Task {i}', '', 'work', 1, f'2030-01-0{i}' if i % 2 else None)
+        batches = list(Task.iter_all(sort=sort, batch_size=2, fields=('title',)))
+        titles = [task['title'] for batch in batches for task in batch]
+        assert sorted(titles) == sorted(f'Task {i}' for i in range(1, 8))
+        assert all(set(task) == {'title'} for batch in batches for task in batch)
+
+    def test_iter_all_validates_eagerly(self, db_connection):
+        """Test que un sort inválido falla al llamar, no al iterar"""
+        from models import InvalidFilter
+        with pytest.raises(InvalidFilter):
+            Task.iter_all(sort='nope')
+
+
+class TestTaskChanges:
+    """Tests para Task.get_changes y las lápidas"""
+
+    def test_initial_sync_returns_all(self, db_connection, create_sample_tasks):
+        """Test que since=0 devuelve todas las tareas y la versión actual"""
+        changes = Task.get_changes(0)
+        assert changes['version'] == Task.get_version()
+        assert sorted(t['id'] for t in changes['tasks']) == sorted(create_sample_tasks)
+        assert changes['deleted'] == []
+
+    def test_only_changes_after_version(self, db_connection, create_sample_tasks):
+        """Test que solo se devuelven las filas modificadas y las borradas"""
+        first, second, _ = create_sample_tasks
+        since = Task.get_version()
+        Task.update(first, 'Changed', '', 'work', 1, '', 'pending')
+        Task.delete(second)
+        new_id = Task.create('New', '', '', 3, '')
+
+        changes = Task.get_changes(since)
+        assert [t['id'] for t in changes['tasks']] == [first, new_id]
+        assert changes['deleted'] == [second]
+        assert changes['version'] == since + 3
+        assert Task.get_changes(changes['version'])['tasks'] == []
+
+    def test_batch_changes_tracked(self, db_connection, create_sample_tasks):
+        """Test que las operaciones en lote también dejan versión y lápidas"""
+        first, second, _ = create_sample_tasks
+        since = Task.get_version()
+        Task.apply_batch([
+            (0, 'update', first, ('Renamed', '', 'work', 2, '', 'completed')),
+            (1, 'delete', second, None),
+        ])
+        changes = Task.get_changes(since)
+        assert [t['id'] for t in changes['tasks']] == [first]
+        assert changes['deleted'] == [second]
+
+    def test_deleting_missing_task_leaves_no_tombstone(self, db_connection):
+        """Test que borrar una tarea inexistente no crea lápida"""
+        since = Task.get_version()
+        Task.delete(9999)
+        assert Task.get_changes(since)['deleted'] == []
+
+    def test_expired_versions(self, db_connection, create_sample_tasks):
+        """Test que las versiones podadas o futuras se rechazan"""
+        from models import ChangesExpired
+        since = Task.get_version()
+        Task.delete(create_sample_tasks[0])
+        Task.delete(create_sample_tasks[1])
+        assert Task.prune_tombstones(max_age_days=-1) == 2
+
+        with pytest.raises(ChangesExpired):
+            Task.get_changes(since)
+        with pytest.raises(ChangesExpired):
+            Task.get_changes(Task.get_version() + 1)
+        assert Task.get_changes(Task.get_version())['deleted'] == []
+        assert len(Task.get_changes(0)['tasks']) == 1
+
+
+class TestTaskPatch:
+    """Tests para Task.patch"""
+
+    def test_patch_only_given_fields(self, db_connection, sample_task_data):
+        """Test que solo cambian las columnas enviadas"""
+        task_id = Task.create(**{k: v for k, v in sample_task_data.items() if k != 'status'})
+        Task.update(task_id, 'Test Task', 'This is a test task', 'work', 5, '2025-12-31', 'in_progress')
+
+        assert Task.patch(task_id, {'due_date': '2026-01-15'})
+        task = Task.get_by_id(task_id)
+        assert task['due_date'] == '2026-01-15'
+        assert task['priority'] == 5
+        assert task['status'] == 'in_progress'
+
+    def test_patch_missing_task(self, db_connection):
+        """Test que parchear una tarea inexistente devuelve False"""
+        assert Task.patch(9999, {'status': 'completed'}) is False
+
+    def test_patch_rejects_unknown_fields(self, db_connection, create_sample_tasks):
+        """Test que no se pueden modificar columnas fuera de PATCH_FIELDS"""
+        with pytest.raises(ValueError):
+            Task.patch(create_sample_tasks[0], {'id': 1})
+
+    def test_patch_statement_reused(self, db_connection, create_sample_tasks):
+        """Test que el mismo conjunto de campos genera el mismo texto SQL"""
+        from models import _patch_sql
+        Task.patch(create_sample_tasks[0], {'status': 'completed', 'priority': 1})
+        Task.patch(create_sample_tasks[1], {'priority': 2, 'status': 'pending'})
+        assert _patch_sql(('priority', 'status')) is _patch_sql(('priority', 'status'))
+        assert 'title' not in _patch_sql(('priority', 'status'))
+
+    def test_patch_tracked_in_changes(self, db_connection, create_sample_tasks):
+        """Test que PATCH deja la tarea en GET /api/tasks/changes"""
+        since = Task.get_version()
+        Task.patch(create_sample_tasks[2], {'title': 'Patched'})
+        assert [t['title'] for t in Task.get_changes(since)['tasks']] == ['Patched']
+
+
+class TestTaskProjection:
+    """Tests para ?fields= y el formato columnar"""
+
+    def test_get_all_with_fields(self, db_connection, create_sample_tasks):
+        """Test que solo se devuelven las columnas pedidas"""
+        tasks = Task.get_all(sort='priority', fields=('id', 'title', 'priority'))
+        assert [set(t) for t in tasks] == [{'id', 'title', 'priority'}] * 3
+        assert [t['priority'] for t in tasks] == [1, 3, 5]
+
+    def test_parse_fields(self):
+        """Test que se validan los campos y se quitan duplicados"""
+        from models import parse_fields, InvalidFilter
+        assert parse_fields(None) is None
+        assert parse_fields('title, id,title') == ('title', 'id')
+        for value in ('', 'title,password', 'id;DROP TABLE tasks'):
+            with pytest.raises(InvalidFilter):
+                parse_fields(value)
+
+    def test_get_columns(self, db_connection, create_sample_tasks):
+        """Test que el formato columnar coincide con get_all"""
+        fields = ('id', 'title', 'status')
+        result = Task.get_columns({'category': 'work'}, 'priority', fields)
+        assert result['columns'] == list(fields)
+        expected = Task.get_all({'category': 'work'}, 'priority', fields)
+        assert [dict(zip(result['columns'], row)) for row in result['rows']] == expected
+
+        everything = Task.get_columns()
+        assert everything['columns'][0] == 'id' and 'description' in everything['columns']
+        assert len(everything['rows']) == 3
+
+    def test_get_page_projection_keeps_cursor(self, db_connection, create_sample_tasks):
+        """Test que el cursor funciona aunque no se pidan la clave de orden ni el id"""
+        tasks, cursor = Task.get_page(2, sort='priority', fields=('title',))
+        assert tasks == [{'title': 'Task 1'}, {'title': 'Task 2'}]
+        page, cursor = Task.get_page(2, cursor, sort='priority', fields=('title',), columnar=True)
+        assert page == {'columns': ['title'], 'rows': [('Task 3',)]}
+        assert cursor is None
+
+
+class TestTaskStats:
+    """Tests para Task.get_stats"""
+
+    def test_counts(self, db_connection, create_sample_tasks):
+        """Test de los recuentos por estado, categoría y prioridad"""
+        Task.patch(create_sample_tasks[0], {'status': 'completed'})
+        stats = Task.get_stats()
+        assert stats['total'] == 3
+        assert stats['by_status'] == {'pending': 2, 'completed': 1}
+        assert sum(stats['by_category'].values()) == 3
+        assert stats['by_priority'] == {'1': 1, '3': 1, '5': 1}
+        assert stats['version'] == Task.get_version()
+
+    def test_overdue_and_due_today(self, db_connection):
+        """Test que las vencidas y las de hoy excluyen completadas y tareas sin fecha"""
+        from datetime import date
+        Task.create('Old', '', '', 3, '2025-01-01')
+        Task.create('Done', '', '', 3, '2025-01-02')
+        Task.create('Today', '', '', 3, '2025-02-01')
+        Task.create('Today with time', '', '', 3, '2025-02-01T18:00')
+        Task.create('Later', '', '', 3, '2025-03-01')
+        Task.create('Undated', '', '', 3, '')
+        done = Task.get_all({'status': 'pending'}, 'title')[0]['id']
+        Task.patch(done, {'status': 'completed'})
+
+        stats = Task.get_stats(date(2025, 2, 1))
+        assert (stats['overdue'], stats['due_today'], stats['today']) == (1, 2, '2025-02-01')
+        assert Task.get_stats(date(2025, 3, 2))['overdue'] == 4
+
+
+class TestTaskRecurrence:
+    """Tests para las tareas recurrentes"""
+
+    @pytest.fixture
+    def weekly(self, db_connection):
+        """Serie semanal los lunes desde el 6 de enero de 2025 y una tarea normal"""
+        Task.create('Normal', '', 'work', 2, '2025-01-08')
+        return Task.create('Weekly', '', 'work', 3, '2025-01-06T09:00', 'FREQ=WEEKLY;BYDAY=MO')
+
+    def test_stored_once(self, weekly):
+        """Test que la serie es una sola fila y sin ventana se devuelve tal cual"""
+        tasks = Task.get_all(sort='title')
+        assert [t['title'] for t in tasks] == ['Normal', 'Weekly']
+        assert tasks[1]['recurrence'] == 'FREQ=WEEKLY;BYDAY=MO'
+
+    def test_window_expands_occurrences(self, weekly):
+        """Test que con due_from y due_to se devuelven las ocurrencias de la ventana"""
+        tasks = Task.get_all({'due_from': '2025-01-07', 'due_to': '2025-01-21'}, 'due_date')
+        assert [(t['title'], t['due_date']) for t in tasks] == [
+            ('Normal', '2025-01-08'),
+            ('Weekly', '2025-01-13T09:00'),
+            ('Weekly', '2025-01-20T09:00'),
+        ]
+        assert tasks[1]['occurrence_date'] == '2025-01-13' and tasks[1]['id'] == weekly
+
+    def test_overrides_are_sparse(self, weekly):
+        """Test que completar, mover o cancelar una ocurrencia no afecta al resto"""
+        from datetime import date
+        assert Task.set_occurrence(weekly, date(2025, 1, 13), {'status': 'completed'})
+        assert Task.set_occurrence(weekly, date(2025, 1, 20), {'cancelled': 1})
+        assert Task.set_occurrence(weekly, date(2025, 2, 3), {'due_date': '2025-01-29', 'title': 'Moved'})
+        tasks = Task.get_all({'due_from': '2025-01-13', 'due_to': '2025-01-31'}, 'due_date')
+        assert [(t['title'], t['due_date'], t['status']) for t in tasks] == [
+            ('Weekly', '2025-01-13T09:00', 'completed'),
+            ('Weekly', '2025-01-27T09:00', 'pending'),
+            ('Moved', '2025-01-29', 'pending'),
+        ]
+        pending = Task.get_all({'due_from': '2025-01-13', 'due_to': '2025-01-31', 'status': 'pending'}, 'due_date')
+        assert [t['due_date'] for t in pending] == ['2025-01-27T09:00', '2025-01-29']
+
+        db = get_db()
+        assert db.execute('SELECT COUNT(*) FROM task_occurrences').fetchone()[0] == 3
+        db.close()
+
+    def test_clear_occurrence(self, weekly):
+        """Test que deshacer una ocurrencia la devuelve a la serie"""
+        from datetime import date
+        Task.set_occurrence(weekly, date(2025, 1, 13), {'title': 'Changed'})
+        assert Task.clear_occurrence(weekly, date(2025, 1, 13))
+        assert not Task.clear_occurrence(weekly, date(2025, 1, 13))
+        occurrences = Task.get_occurrences(weekly, date(2025, 1, 13), date(2025, 1, 13))
+        assert [t['title'] for t in occurrences] == ['Weekly']
+
+    def test_set_occurrence_validation(self, weekly):
+        """Test que solo se cambian fechas que son ocurrencias de una serie"""
+        from datetime import date
+        from models import InvalidFilter
+        with pytest.raises(InvalidFilter):
+            Task.set_occurrence(weekly, date(2025, 1, 14), {'status': 'completed'})
+        normal = Task.get_all(sort='title')[0]['id']
+        with pytest.raises(InvalidFilter):
+            Task.set_occurrence(normal, date(2025, 1, 8), {'status': 'completed'})
+        assert not Task.set_occurrence(9999, date(2025, 1, 13), {'status': 'completed'})
+
+    def test_projection_and_delete(self, weekly):
+        """Test de ?fields= con ocurrencias y que borrar la serie borra sus cambios"""
+        from datetime import date
+        # Como en las tareas normales, due_to=2025-01-13 deja fuera 2025-01-13T09:00
+        assert Task.get_all({'due_from': '2025-01-13', 'due_to': '2025-01-13'}, 'due_date') == []
+        tasks = Task.get_all({'due_from': '2025-01-13', 'due_to': '2025-01-14'}, 'due_date', ('title',))
+        assert tasks == [{'title': 'Weekly', 'occurrence_date': '2025-01-13'}]
+        Task.set_occurrence(weekly, date(2025, 1, 13), {'status': 'completed'})
+        Task.delete(weekly)
+        db = get_db()
+        assert db.execute('SELECT COUNT(*) FROM task_occurrences').fetchone()[0] == 0
+        db.close()
+
+    def test_series_not_overdue(self, weekly):
+        """Test que una serie no cuenta como vencida por su fecha inicial"""
+        from datetime import date
+        from database import check_stats
+        assert Task.get_stats(date(2025, 6, 1))['overdue'] == 1
+        Task.patch(weekly, {'recurrence': None})
+        assert Task.get_stats(date(2025, 6, 1))['overdue'] == 2
+        assert check_stats() == []
@@ -0,0 +1,84 @@
+"""
+Tests unitarios para las reglas de recurrencia
+"""
+import itertools
+import pytest
+from datetime import date
+from recurrence import parse_rule, format_rule, iter_occurrences, is_occurrence, InvalidRecurrence
+
+
+class TestParseRule:
+    """Tests para parse_rule y format_rule"""
+
+    def test_round_trip(self):
+        """Test que la regla se normaliza a un texto canónico"""
+        rule = parse_rule('freq=weekly;byday=th,mo,th;interval=2;until=2026-12-31')
+        assert format_rule(rule) == 'FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,TH;UNTIL=20261231'
+        assert parse_rule(format_rule(rule)) == rule
+
+    @pytest.mark.parametrize('text', [
+        '', 'FREQ=YEARLY', 'INTERVAL=2', 'FREQ=DAILY;INTERVAL=0', 'FREQ=DAILY;BYDAY=MO',
+        'FREQ=WEEKLY;BYDAY=XX', 'FREQ=DAILY;UNTIL=mañana', 'FREQ=DAILY;COUNT=3;UNTIL=20260101',
+        'FREQ=DAILY;BYHOUR=9', 'FREQ=DAILY;FREQ=WEEKLY',
+    ])
+    def test_invalid(self, text):
+        """Test que se rechazan reglas inválidas o no soportadas"""
+        with pytest.raises(InvalidRecurrence):
+            parse_rule(text)
+
+
+class TestIterOccurrences:
+    """Tests para la expansión de ocurrencias"""
+
+    def test_weekly_by_day(self):
+        """Test de una serie semanal cada dos semanas en varios días"""
+        rule = parse_rule('FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,TH')
+        days = list(itertools.islice(iter_occurrences(rule, date(2025, 1, 1)), 4))
+        assert days == [date(2025, 1, 2), date(2025, 1, 13), date(2025, 1, 16), date(2025, 1, 27)]
+
+    def test_monthly_skips_short_months(self):
+        """Test que el día 31 solo aparece en los meses que lo tienen"""
+        rule = parse_rule('FREQ=MONTHLY;COUNT=3')
+        assert list(iter_occurrences(rule, date(2025, 1, 31))) == \
+            [date(2025, 1, 31), date(2025, 3, 31), date(2025, 5, 31)]
+
+    def test_until_and_count(self):
+        """Test que UNTIL y COUNT terminan la serie"""
+        daily = parse_rule('FREQ=DAILY;INTERVAL=3;UNTIL=20250110')
+        assert list(iter_occurrences(daily, date(2025, 1, 1))) == \
+            [date(2025, 1, 1), date(2025, 1, 4), date(2025, 1, 7), date(2025, 1, 10)]
+        counted = parse_rule('FREQ=WEEKLY;COUNT=5')
+        window = list(iter_occurrences(counted, date(2025, 1, 1), date(2025, 1, 20), date(2026, 1, 1)))
+        assert window == [date(2025, 1, 22), date(2025, 1, 29)]
+
+    @pytest.mark.parametrize('text, start', [
+        ('FREQ=DAILY;INTERVAL=5000', date(2020, 1, 1)),
+        ('FREQ=WEEKLY;INTERVAL=400;BYDAY=MO,SU', date(2020, 1, 1)),
+        ('FREQ=MONTHLY;INTERVAL=1000', date(2020, 1, 31)),
+    ])
+    def test_series_ends_at_date_max(self, text, start):
+        """Test que un periodo más allá de date.max termina la serie en lugar de desbordar"""
+        rule = parse_rule(text)
+        days = list(iter_occurrences(rule, start, start, date.max))
+        assert days and days[0] >= start
+        assert days == sorted(days)
+        assert list(itertools.islice(iter_occurrences(rule, start), 10000)) == days
+
+    def test_window_far_in_the_future(self, monkeypatch):
+        """Test que una ventana lejana no recorre la serie desde el principio"""
+        import recurrence
+        periods = []
+        original = recurrence._period_dates
+        monkeypatch.setattr(recurrence, '_period_dates', lambda *args: periods.append(args) or original(*args))
+
+        rule = parse_rule('FREQ=DAILY')
+        days = list(iter_occurrences(rule, date(2000, 1, 1), date(2100, 1, 1), date(2100, 1, 3)))
+        assert days == [date(2100, 1, 1), date(2100, 1, 2), date(2100, 1, 3)]
+        assert len(periods) == 3
+
+    def test_is_occurrence(self):
+        """Test que is_occurrence comprueba una fecha concreta"""
+        rule = parse_rule('FREQ=WEEKLY;BYDAY=MO')
+        assert is_occurrence(rule, date(2025, 1, 6), date(2025, 3, 3))
+        assert not is_occurrence(rule, date(2025, 1, 6), date(2025, 3, 4))
+        assert not is_occurrence(rule, date(2025, 1, 6), date(2024, 12, 30))
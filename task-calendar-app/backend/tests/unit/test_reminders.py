@@ -0,0 +1,358 @@
+"""
+Tests unitarios para el planificador de recordatorios
+"""
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import pytest
+from flask import Flask
+
+import reminders
+from events import EventBroker, Subscription, broker
+from models import Task
+from reminders import (
+    BroadcastSink, MemorySink, ReminderScheduler, WebhookSink, build_sinks, due_datetime,
+)
+
+
+class FakeClock:
+    def __init__(self, now):
+        self.now = now.timestamp()
+
+    def __call__(self):
+        return self.now
+
+    def advance_to(self, moment):
+        self.now = moment.timestamp()
+
+
+@pytest.fixture
+def clock():
+    return FakeClock(datetime(2030, 1, 1, 8, 0))
+
+
+@pytest.fixture
+def sink():
+    return MemorySink()
+
+
+@pytest.fixture
+def scheduler(db_connection, clock, sink):
+    return ReminderScheduler([sink], lead=0, grace=300, day_time='09:00', clock=clock)
+
+
+def _create(title, due_date, recurrence=None):
+    return Task.create(title, '', 'work', 1, due_date, recurrence)
+
+
+class TestDueDatetime:
+    """Tests para el momento de vencimiento de un due_date"""
+
+    def test_date_only_uses_day_time(self):
+        """Test que una fecha sin hora avisa a la hora configurada"""
+        assert due_datetime('2030-01-01', '09:30') == datetime(2030, 1, 1, 9, 30)
+
+    def test_datetime(self):
+        """Test que una fecha con hora se respeta"""
+        assert due_datetime('2030-01-01T14:15') == datetime(2030, 1, 1, 14, 15)
+
+    def test_invalid(self):
+        """Test que sin fecha o con una fecha no válida no hay recordatorio"""
+        assert due_datetime(None) is None
+        assert due_datetime('mañana') is None
+
+
+class TestReminderScheduler:
+    """Tests para la carga, los cambios incrementales y el disparo"""
+
+    def test_load_and_fire_in_order(self, scheduler, clock, sink):
+        """Test que se cargan los vencimientos futuros y se disparan en orden"""
+        later = _create('Later', '2030-01-01T12:00')
+        first = _create('First', '2030-01-01')
+        _create('Past', '2029-12-31')
+        done = _create('Done', '2030-01-01T10:00')
+        Task.update(done, 'Done', '', 'work', 1, '2030-01-01T10:00', 'completed')
+
+        assert scheduler.load() == 2
+        assert scheduler.run_pending() == 0
+        assert scheduler.next_fire_at() == datetime(2030, 1, 1, 9, 0).timestamp()
+
+        clock.advance_to(datetime(2030, 1, 1, 13, 0))
+        assert scheduler.run_pending() == 2
+        assert [reminder['id'] for reminder in sink.reminders] == [first, later]
+        assert sink.reminders[0]['fire_at'] == '2030-01-01T09:00:00'
+        assert scheduler.next_fire_at() is None
+
+    def test_lead(self, scheduler, clock, sink):
+        """Test que REMINDER_LEAD adelanta el aviso"""
+        scheduler.lead = 3600
+        _create('Meeting', '2030-01-01T10:00')
+        scheduler.load()
+        clock.advance_to(datetime(2030, 1, 1, 9, 0))
+        assert scheduler.run_pending() == 1
+
+    def test_incremental_changes(self, scheduler, clock, sink):
+        """Test que alta, cambio de fecha, completado y baja actualizan el heap"""
+        scheduler.load()
+        moved = _create('Moved', '2030-01-01T10:00')
+        completed = _create('Completed', '2030-01-01T10:00')
+        deleted = _create('Deleted', '2030-01-01T10:00')
+        scheduler.refresh([moved, completed, deleted])
+        assert scheduler.stats()['scheduled'] == 3
+
+        Task.update(moved, 'Moved', '', 'work', 1, '2030-01-02T10:00', 'pending')
+        Task.update(completed, 'Completed', '', 'work', 1, '2030-01-01T10:00', 'completed')
+        Task.delete(deleted)
+        scheduler.refresh([moved, completed, deleted])
+        assert scheduler.stats()['scheduled'] == 1
+
+        clock.advance_to(datetime(2030, 1, 1, 23, 0))
+        assert scheduler.run_pending() == 0
+        clock.advance_to(datetime(2030, 1, 2, 10, 0))
+        assert scheduler.run_pending() == 1
+        assert sink.reminders[0]['id'] == moved
+
+    def test_edit_after_firing_does_not_repeat(self, scheduler, clock, sink):
+        """Test que editar una tarea ya avisada no repite el recordatorio"""
+        task_id = _create('Call', '2030-01-01T09:00')
+        scheduler.load()
+        clock.advance_to(datetime(2030, 1, 1, 9, 1))
+        assert scheduler.run_pending() == 1
+        Task.update(task_id, 'Call back', '', 'work', 1, '2030-01-01T09:00', 'pending')
+        scheduler.refresh([task_id])
+        assert scheduler.run_pending() == 0
+        # Con otra fecha sí vuelve a avisar
+        Task.update(task_id, 'Call back', '', 'work', 1, '2030-01-01T11:00', 'pending')
+        scheduler.refresh([task_id])
+        clock.advance_to(datetime(2030, 1, 1, 11, 0))
+        assert scheduler.run_pending() == 1
+
+    def test_stale_entries_are_compacted(self, scheduler):
+        """Test que las entradas sustituidas no hacen crecer el heap sin límite"""
+        task_id = _create('Busy', '2030-01-01T10:00')
+        scheduler.load()
+        for _ in range(200):
+            scheduler.refresh([task_id])
+        stats = scheduler.stats()
+        assert stats['scheduled'] == 1
+        assert stats['heap'] <= 2 * stats['scheduled'] + 64
+
+    def test_recurring_series_keeps_next_occurrence(self, scheduler, clock, sink):
+        """Test que de una serie solo se programa la próxima ocurrencia y se encadena al dispararse"""
+        series = _create('Standup', '2029-12-30T09:30', 'FREQ=DAILY')
+        scheduler.load()
+        assert scheduler.stats()['scheduled'] == 1
+
+        clock.advance_to(datetime(2030, 1, 1, 9, 30))
+        assert scheduler.run_pending() == 1
+        clock.advance_to(datetime(2030, 1, 2, 9, 30))
+        assert scheduler.run_pending() == 1
+        assert [reminder['occurrence_date'] for reminder in sink.reminders] == ['2030-01-01', '2030-01-02']
+        assert all(reminder['id'] == series for reminder in sink.reminders)
+
+    def test_cancelled_occurrence_is_skipped(self, scheduler, clock, sink):
+        """Test que una ocurrencia cancelada no avisa"""
+        from datetime import date
+        series = _create('Gym', '2030-01-01T18:00', 'FREQ=DAILY')
+        Task.set_occurrence(series, date(2030, 1, 1), {'cancelled': 1})
+        scheduler.load()
+        assert scheduler.next_fire_at() == datetime(2030, 1, 2, 18, 0).timestamp()
+
+    def test_failing_sink_does_not_stop_others(self, scheduler, clock, sink):
+        """Test que un destino que falla no impide avisar por los demás"""
+        def broken(reminder):
+            raise OSError('down')
+
+        scheduler.sinks.insert(0, broken)
+        _create('Task', '2030-01-01T09:00')
+        scheduler.load()
+        clock.advance_to(datetime(2030, 1, 1, 9, 0))
+        assert scheduler.run_pending() == 1
+        assert len(sink.reminders) == 1
+        assert scheduler.stats()['failures'] == 1
+
+    def test_notify_ignores_reminders(self, scheduler):
+        """Test que el listener solo anota tareas cambiadas, no sus propios avisos"""
+        scheduler.notify(1, [('updated', 3), ('reminder', 4)])
+        assert scheduler._changed == {3}
+
+
+class TestSchedulerThread:
+    """Tests para el hilo y la suscripción al broker"""
+
+    def test_writes_reach_the_thread(self, db_connection, sink):
+        """Test que una tarea creada tras arrancar se avisa sin recargar"""
+        scheduler = ReminderScheduler([sink], grace=300)
+        scheduler.start()
+        try:
+            _create('Now', datetime.fromtimestamp(time.time() + 0.3).isoformat(timespec='seconds'))
+            deadline = time.time() + 5
+            while not sink.reminders and time.time() < deadline:
+                time.sleep(0.05)
+        finally:
+            scheduler.stop()
+        assert len(sink.reminders) == 1
+        assert not scheduler.stats()['running']
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.02)
+    return condition()
+
+
+class TestSchedulerRecovery:
+    """Tests para los errores de la base de datos en el hilo y la base de datos de la aplicación"""
+
+    def test_load_is_retried(self, db_connection, sink, monkeypatch):
+        """Test que un fallo en la carga inicial se reintenta en lugar de matar el hilo"""
+        scheduler = ReminderScheduler([sink], retry=0.01)
+        load = scheduler.load
+        calls = []
+
+        def flaky_load():
+            calls.append(1)
+            if len(calls) == 1:
+                raise sqlite3.OperationalError('database is locked')
+            return load()
+
+        monkeypatch.setattr(scheduler, 'load', flaky_load)
+        scheduler.start()
+        try:
+            assert _wait_for(lambda: scheduler.stats()['loaded'])
+        finally:
+            scheduler.stop()
+        assert len(calls) == 2
+        assert scheduler.stats()['errors'] == 1
+
+    def test_changes_survive_failed_refresh(self, db_connection, sink, monkeypatch):
+        """Test que las tareas de un refresh fallido se vuelven a leer en el siguiente intento"""
+        scheduler = ReminderScheduler([sink], retry=0.01)
+        refresh = scheduler.refresh
+        refreshed = []
+
+        def flaky_refresh(task_ids, db=None):
+            task_ids = list(task_ids)
+            if task_ids and not refreshed:
+                refreshed.append(None)
+                raise sqlite3.OperationalError('database is locked')
+            refreshed.extend(task_ids)
+            return refresh(task_ids, db)
+
+        monkeypatch.setattr(scheduler, 'refresh', flaky_refresh)
+        scheduler.start()
+        try:
+            assert _wait_for(lambda: scheduler.stats()['loaded'])
+            task_id = _create('Later', '2099-01-01T09:00')
+            assert _wait_for(lambda: scheduler.stats()['scheduled'] == 1)
+        finally:
+            scheduler.stop()
+        assert task_id in refreshed
+        assert scheduler.stats()['errors'] == 1
+
+    def test_reads_the_app_database(self, tmp_path, sink):
+        """Test que el hilo usa app.config['DATABASE'] de la aplicación con la que arranca"""
+        import app as app_module
+        import database
+        path = str(tmp_path / 'reminders.db')
+        other = app_module.create_app({'TESTING': True, 'DATABASE': path})
+        with other.app_context():
+            database.init_db()
+            _create('Elsewhere', '2099-01-01T09:00')
+        scheduler = ReminderScheduler([sink])
+        scheduler.start(other)
+        try:
+            assert _wait_for(lambda: scheduler.stats()['loaded'])
+            assert scheduler.stats()['scheduled'] == 1
+        finally:
+            scheduler.stop()
+            database.close_pool(path)
+
+    @pytest.mark.parametrize('run_main, started', [(None, False), ('true', True)])
+    def test_reloader_parent_does_not_start(self, monkeypatch, run_main, started):
+        """Test que en modo debug solo arranca el proceso hijo del reloader"""
+        local = ReminderScheduler()
+        monkeypatch.setattr(reminders, 'scheduler', local)
+        monkeypatch.setattr(local, 'start', lambda app=None: setattr(local, 'app', app))
+        if run_main is None:
+            monkeypatch.delenv('WERKZEUG_RUN_MAIN', raising=False)
+        else:
+            monkeypatch.setenv('WERKZEUG_RUN_MAIN', run_main)
+        flask_app = Flask(__name__)
+        flask_app.config.update(DEBUG=True, REMINDERS=True)
+        reminders.init_app(flask_app)
+        assert (local.app is flask_app) is started
+
+
+class TestSinks:
+    """Tests para los destinos de los recordatorios"""
+
+    def test_build_sinks(self):
+        """Test que se construyen los destinos de REMINDER_SINKS"""
+        sinks = build_sinks('log, sse,webhook', 'http://localhost:9/hook')
+        assert [type(sink).__name__ for sink in sinks] == ['LogSink', 'BroadcastSink', 'WebhookSink']
+        with pytest.raises(ValueError):
+            build_sinks('webhook', '')
+        with pytest.raises(ValueError):
+            build_sinks('email')
+
+    def test_broadcast_sink(self):
+        """Test que el recordatorio llega a los clientes SSE y no se pierde por un cambio posterior"""
+        subscription = broker.subscribe()
+        try:
+            BroadcastSink()({'id': 5})
+            broker.publish(9, [('updated', 5)])
+            message = subscription.get(0)
+        finally:
+            broker.unsubscribe(subscription)
+        assert message == {'version': 9, 'changes': [{'op': 'reminder', 'id': 5}]}
+
+    def test_webhook_sink_posts_json(self):
+        """Test que el webhook recibe el recordatorio en JSON"""
+        from http.server import BaseHTTPRequestHandler, HTTPServer
+        received = []
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                received.append(json.loads(self.rfile.read(int(self.headers['Content-Length']))))
+                self.send_response(204)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        server = HTTPServer(('127.0.0.1', 0), Handler)
+        thread = threading.Thread(target=server.handle_request)
+        thread.start()
+        try:
+            WebhookSink(f'http://127.0.0.1:{server.server_port}/')({'id': 1, 'title': 'T'})
+        finally:
+            thread.join(5)
+            server.server_close()
+        assert received == [{'id': 1, 'title': 'T'}]
+
+
+class TestBrokerListeners:
+    """Tests para los listeners del EventBroker"""
+
+    def test_listener_receives_publications(self):
+        """Test que un listener recibe cada publicación hasta que se quita"""
+        local = EventBroker()
+        calls = []
+        listener = lambda version, changes: calls.append((version, changes))
+        local.add_listener(listener)
+        local.publish(1, [('created', 1)])
+        local.remove_listener(listener)
+        local.publish(2, [('created', 2)])
+        assert calls == [(1, [('created', 1)])]
+
+    def test_reminder_is_sticky(self):
+        """Test que un cambio posterior no sustituye un recordatorio pendiente"""
+        subscription = Subscription(10)
+        subscription.push(0, [('reminder', 1)])
+        subscription.push(3, [('deleted', 1)])
+        assert subscription.get(0)['changes'] == [{'op': 'reminder', 'id': 1}]
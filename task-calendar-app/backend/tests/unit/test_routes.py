@@ -3,6 +3,7 @@ Tests unitarios para las rutas de la API
 """
 import pytest
 import json
+from datetime import date
 from models import Task
 
 
@@ -192,3 +193,556 @@ class TestTaskRoutes:
         assert response.status_code == 200
         data = json.loads(response.data)
         assert data['status'] == 'ok'
+
+
+class TestTaskPaginationRoutes:
+    """Tests para GET /api/tasks con limit/after"""
+
+    def test_paginated_response_format(self, client, db_connection, create_sample_tasks):
+        """Test que con limit se devuelve tasks y next_cursor"""
+        response = client.get('/api/tasks?limit=2')
+
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert len(data['tasks']) == 2
+        assert data['next_cursor'] is not None
+
+        response = client.get(f"/api/tasks?limit=2&after={data['next_cursor']}")
+        data = json.loads(response.data)
+        assert len(data['tasks']) == 1
+        assert data['next_cursor'] is None
+
+    def test_paginated_invalid_cursor(self, client, db_connection):
+        """Test que un cursor inválido devuelve 400"""
+        response = client.get('/api/tasks?after=@@@')
+
+        assert response.status_code == 400
+        assert 'error' in json.loads(response.data)
+
+    def test_paginated_invalid_limit(self, client, db_connection):
+        """Test que un limit no positivo o no entero devuelve 400"""
+        response = client.get('/api/tasks?limit=0')
+        assert response.status_code == 400
+        assert client.get('/api/tasks?limit=abc').status_code == 400
+        assert client.get('/api/tasks?limit=2.5').status_code == 400
+
+
+class TestTaskFilterRoutes:
+    """Tests para los filtros de GET /api/tasks"""
+
+    def test_filter_query_params(self, client, db_connection, create_sample_tasks):
+        """Test filtros por query string"""
+        response = client.get('/api/tasks?priority_min=3&sort=priority')
+
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert [t['priority'] for t in data] == [3, 5]
+
+    def test_filter_with_pagination(self, client, db_connection, create_sample_tasks):
+        """Test filtros combinados con limit"""
+        response = client.get('/api/tasks?category=personal&limit=10')
+
+        data = json.loads(response.data)
+        assert [t['title'] for t in data['tasks']] == ['Task 2']
+        assert data['next_cursor'] is None
+
+    def test_invalid_sort(self, client, db_connection):
+        """Test que un sort desconocido devuelve 400"""
+        response = client.get('/api/tasks?sort=unknown')
+        assert response.status_code == 400
+
+
+class TestBatchRoutes:
+    """Tests para POST /api/tasks/batch"""
+
+    def test_batch_success(self, client, db_connection, create_sample_tasks):
+        """Test lote con altas, modificaciones y bajas"""
+        operations = [
+            {'op': 'create', 'data': {'title': 'Bulk 1'}},
+            {'op': 'create', 'data': {'title': 'Bulk 2', 'priority': 5}},
+            {'op': 'update', 'id': create_sample_tasks[0], 'data': {'title': 'Changed', 'status': 'completed'}},
+            {'op': 'delete', 'id': create_sample_tasks[1]},
+        ]
+        response = client.post(
+            '/api/tasks/batch',
+            data=json.dumps(operations),
+            content_type='application/json'
+        )
+
+        assert response.status_code == 200
+        results = json.loads(response.data)['results']
+        assert [r['status'] for r in results] == [201, 201, 200, 200]
+        assert Task.get_by_id(results[1]['id'])['priority'] == 5
+        assert Task.get_by_id(create_sample_tasks[0])['title'] == 'Changed'
+
+    def test_batch_field_types_checked_per_item(self, client, db_connection, create_sample_tasks):
+        """Test que un campo no escalar rechaza solo su operación y no todo el lote"""
+        operations = [
+            {'op': 'create', 'data': {'title': 'Valid'}},
+            {'op': 'create', 'data': {'title': 'b', 'due_date': {}}},
+            {'op': 'create', 'data': {'title': 'c', 'description': ['x']}},
+            {'op': 'update', 'id': create_sample_tasks[0], 'data': {'title': 'd', 'status': 1}},
+            {'op': 'create', 'data': {'title': 'e', 'category': 5}},
+            {'op': 'create', 'data': {'title': ['f']}},
+            {'op': 'create', 'data': {'title': 'g', 'priority': True}},
+        ]
+        response = client.post('/api/tasks/batch', data=json.dumps(operations), content_type='application/json')
+        assert response.status_code == 200
+        results = json.loads(response.data)['results']
+        assert [r['status'] for r in results] == [201, 400, 400, 400, 400, 400, 400]
+        assert [r.get('error') for r in results[1:5]] == [
+            'Invalid due_date', 'Invalid description', 'Invalid status', 'Invalid category'
+        ]
+
+    def test_batch_update_keeps_series_due_date(self, client, db_connection):
+        """Test que el lote, como PUT, no deja una serie sin due_date"""
+        series = Task.create('Semanal', '', '', 3, '2026-01-05', 'FREQ=WEEKLY')
+        plain = Task.create('Normal', '', '', 3, '2026-01-05')
+        operations = [
+            {'op': 'update', 'id': series, 'data': {'title': 'r'}},
+            {'op': 'update', 'id': plain, 'data': {'title': 'p'}},
+            {'op': 'update', 'id': series, 'data': {'title': 's', 'due_date': '2026-02-02'}},
+        ]
+        response = client.post('/api/tasks/batch', data=json.dumps(operations), content_type='application/json')
+        results = json.loads(response.data)['results']
+        assert [r['status'] for r in results] == [400, 200, 200]
+        assert results[0]['error'] == 'Recurring tasks need a due_date'
+        assert Task.get_by_id(series)['due_date'] == '2026-02-02'
+        assert Task.get_by_id(plain)['title'] == 'p'
+
+    def test_batch_invalid_items_reported(self, client, db_connection):
+        """Test que los elementos inválidos se informan sin frenar el resto"""
+        operations = [
+            {'op': 'create', 'data': {'title': 'Valid'}},
+            {'op': 'create', 'data': {}},
+            {'op': 'explode'},
+            {'op': 'create', 'data': {'title': 'P9', 'priority': 9}},
+        ]
+        response = client.post(
+            '/api/tasks/batch',
+            data=json.dumps(operations),
+            content_type='application/json'
+        )
+
+        results = json.loads(response.data)['results']
+        assert [r['status'] for r in results] == [201, 400, 400, 400]
+        assert len(Task.get_all()) == 1
+
+    def test_batch_too_large(self, client, app, db_connection):
+        """Test que se rechazan lotes por encima de BATCH_MAX_SIZE"""
+        app.config['BATCH_MAX_SIZE'] = 2
+        try:
+            response = client.post(
+                '/api/tasks/batch',
+                data=json.dumps([{'op': 'delete', 'id': i} for i in range(3)]),
+                content_type='application/json'
+            )
+        finally:
+            app.config.pop('BATCH_MAX_SIZE')
+        assert response.status_code == 413
+
+    def test_batch_malformed_body(self, client, db_connection):
+        """Test cuerpo que no es un array JSON"""
+        response = client.post('/api/tasks/batch', data='{"op": "create"}', content_type='application/json')
+        assert response.status_code == 400
+
+
+class TestConditionalGet:
+    """Tests para ETag / If-None-Match en GET /api/tasks"""
+
+    def test_collection_etag_and_304(self, client, db_connection, create_sample_tasks):
+        """Test que repetir la petición con If-None-Match devuelve 304 sin consultar filas"""
+        from unittest.mock import patch
+        response = client.get('/api/tasks')
+        etag = response.headers['ETag']
+        assert etag
+        assert response.headers['Cache-Control'] == 'no-cache'
+
+        with patch('routes.tasks.Task.get_all') as mock_get_all:
+            response = client.get('/api/tasks', headers={'If-None-Match': etag})
+            assert response.status_code == 304
+            assert response.data == b''
+            mock_get_all.assert_not_called()
+
+    def test_collection_etag_changes_after_write(self, client, db_connection, create_sample_tasks):
+        """Test que una escritura invalida el ETag"""
+        etag = client.get('/api/tasks').headers['ETag']
+        Task.create('New', '', '', 3, '')
+
+        response = client.get('/api/tasks', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+        assert len(json.loads(response.data)) == 4
+
+    def test_collection_etag_depends_on_query(self, client, db_connection, create_sample_tasks):
+        """Test que filtros distintos producen ETags distintos"""
+        all_etag = client.get('/api/tasks').headers['ETag']
+        filtered = client.get('/api/tasks?category=work', headers={'If-None-Match': all_etag})
+        assert filtered.status_code == 200
+        assert filtered.headers['ETag'] != all_etag
+
+    def test_item_etag_and_304(self, client, db_connection, create_sample_tasks):
+        """Test ETag en GET /api/tasks/<id>"""
+        task_id = create_sample_tasks[0]
+        etag = client.get(f'/api/tasks/{task_id}').headers['ETag']
+
+        response = client.get(f'/api/tasks/{task_id}', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+
+        Task.update(task_id, 'Changed', '', 'work', 1, '', 'pending')
+        response = client.get(f'/api/tasks/{task_id}', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert json.loads(response.data)['title'] == 'Changed'
+
+
+class TestCalendarRoutes:
+    """Tests para GET /api/calendar"""
+
+    @pytest.fixture
+    def calendar_tasks(self, db_connection):
+        for title, due in [
+            ('Lunes', '2025-12-01'), ('Lunes bis', '2025-12-01'), ('Miércoles', '2025-12-03'),
+            ('Lunes siguiente', '2025-12-08'), ('Enero', '2026-01-02'), ('Sin fecha', ''),
+        ]:
+            Task.create(title, '', 'work', 3, due)
+
+    def test_day_buckets(self, client, calendar_tasks):
+        """Test agrupación por día excluyendo tareas sin fecha"""
+        response = client.get('/api/calendar?from=2025-12-01&to=2025-12-31')
+
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert data['total'] == 4
+        assert [(b['key'], b['count']) for b in data['buckets']] == [
+            ('2025-12-01', 2), ('2025-12-03', 1), ('2025-12-08', 1)
+        ]
+        assert data['buckets'][0]['tasks'][0]['title'] == 'Lunes'
+
+    def test_week_and_month_buckets(self, client, calendar_tasks):
+        """Test agrupación por semana (lunes) y por mes"""
+        weeks = json.loads(client.get('/api/calendar?from=2025-12-01&to=2026-01-31&granularity=week').data)
+        assert [(b['key'], b['count']) for b in weeks['buckets']] == [
+            ('2025-12-01', 3), ('2025-12-08', 1), ('2025-12-29', 1)
+        ]
+
+        months = json.loads(client.get('/api/calendar?from=2025-12-01&to=2026-01-31&granularity=month').data)
+        assert [(b['key'], b['count']) for b in months['buckets']] == [('2025-12', 4), ('2026-01', 1)]
+
+    def test_calendar_validation(self, client, db_connection):
+        """Test parámetros inválidos"""
+        assert client.get('/api/calendar?to=2025-12-31').status_code == 400
+        assert client.get('/api/calendar?from=2025-12-31&to=2025-12-01').status_code == 400
+        assert client.get('/api/calendar?from=2025-12-01&to=2025-12-31&granularity=year').status_code == 400
+
+    def test_calendar_etag(self, client, calendar_tasks):
+        """Test que el calendario admite peticiones condicionales"""
+        url = '/api/calendar?from=2025-12-01&to=2025-12-31'
+        etag = client.get(url).headers['ETag']
+        assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+
+
+class TestSearchRoutes:
+    """Tests para GET /api/tasks/search"""
+
+    def test_search_endpoint(self, client, db_connection, create_sample_tasks):
+        """Test búsqueda con resultados y resaltado"""
+        response = client.get('/api/tasks/search?q=second')
+
+        assert response.status_code == 200
+        results = json.loads(response.data)
+        assert [r['title'] for r in results] == ['Task 2']
+        assert '<mark>' in results[0]['snippet']
+
+    def test_search_errors(self, client, db_connection, monkeypatch):
+        """Test que 501 es solo para la falta de FTS5 y el resto de errores no se ocultan"""
+        import sqlite3
+        import database
+        monkeypatch.setitem(database._search_support, db_connection, False)
+        assert client.get('/api/tasks/search?q=x').status_code == 501
+        monkeypatch.setitem(database._search_support, db_connection, True)
+
+        def locked(*args, **kwargs):
+            raise sqlite3.OperationalError('database is locked')
+
+        monkeypatch.setattr(Task, 'search', locked)
+        with pytest.raises(sqlite3.OperationalError):
+            client.get('/api/tasks/search?q=x')
+
+    def test_search_missing_query(self, client, db_connection):
+        """Test búsqueda sin q"""
+        assert client.get('/api/tasks/search').status_code == 400
+
+    def test_rebuild_search_command(self, runner, db_connection, create_sample_tasks):
+        """Test del comando flask rebuild-search"""
+        result = runner.invoke(args=['rebuild-search'])
+        assert result.exit_code == 0
+        assert len(Task.search('task')) == 3
+
+
+class TestStreamingRoutes:
+    """Tests para los listados en streaming"""
+
+    def test_stream_json_array(self, client, db_connection, create_sample_tasks):
+        """Test ?stream=1 devuelve el mismo array que la respuesta normal"""
+        streamed = client.get('/api/tasks?stream=1')
+        regular = client.get('/api/tasks')
+
+        assert streamed.status_code == 200
+        assert streamed.is_streamed
+        assert json.loads(streamed.data) == json.loads(regular.data)
+
+    def test_stream_ndjson(self, client, db_connection, create_sample_tasks):
+        """Test Accept: application/x-ndjson devuelve una tarea por línea"""
+        response = client.get('/api/tasks?sort=title', headers={'Accept': 'application/x-ndjson'})
+
+        assert response.mimetype == 'application/x-ndjson'
+        lines = response.data.decode('utf-8').splitlines()
+        assert [json.loads(line)['title'] for line in lines] == ['Task 1', 'Task 2', 'Task 3']
+
+    def test_stream_invalid_sort(self, client, db_connection):
+        """Test que los errores de validación llegan antes de empezar el stream"""
+        assert client.get('/api/tasks?stream=1&sort=bad').status_code == 400
+
+
+class TestChangesRoutes:
+    """Tests para GET /api/tasks/changes"""
+
+    def test_delta_sync(self, client, db_connection, create_sample_tasks):
+        """Test que un cliente al día solo descarga lo que ha cambiado"""
+        version = json.loads(client.get('/api/tasks/changes?since=0').data)['version']
+        Task.update(create_sample_tasks[0], 'Changed', '', 'work', 1, '', 'pending')
+        Task.delete(create_sample_tasks[1])
+
+        response = client.get(f'/api/tasks/changes?since={version}')
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert [t['title'] for t in data['tasks']] == ['Changed']
+        assert data['deleted'] == [create_sample_tasks[1]]
+        assert data['version'] == version + 2
+
+    def test_invalid_since(self, client, db_connection):
+        """Test que since es obligatorio y no negativo"""
+        assert client.get('/api/tasks/changes').status_code == 400
+        assert client.get('/api/tasks/changes?since=abc').status_code == 400
+        assert client.get('/api/tasks/changes?since=-1').status_code == 400
+
+    def test_expired_since(self, client, db_connection):
+        """Test que una versión futura devuelve 410 para forzar la recarga"""
+        response = client.get(f'/api/tasks/changes?since={Task.get_version() + 10}')
+        assert response.status_code == 410
+        assert json.loads(response.data)['version'] == Task.get_version()
+
+
+class TestPatchRoutes:
+    """Tests para PATCH /api/tasks/<id>"""
+
+    def test_patch_due_date(self, client, db_connection, create_sample_tasks):
+        """Test que mover una tarea solo cambia due_date"""
+        task_id = create_sample_tasks[0]
+        before = Task.get_by_id(task_id)
+        response = client.patch(f'/api/tasks/{task_id}', json={'due_date': '2026-02-01'})
+        assert response.status_code == 200
+        after = Task.get_by_id(task_id)
+        assert after['due_date'] == '2026-02-01'
+        assert {k: after[k] for k in ('title', 'priority', 'status')} == \
+            {k: before[k] for k in ('title', 'priority', 'status')}
+
+    def test_patch_validation(self, client, db_connection, create_sample_tasks):
+        """Test que se rechazan cuerpos vacíos, campos desconocidos y valores inválidos"""
+        url = f'/api/tasks/{create_sample_tasks[0]}'
+        assert client.patch(url, json={}).status_code == 400
+        assert client.patch(url, json={'id': 5}).status_code == 400
+        assert client.patch(url, json={'title': ''}).status_code == 400
+        assert client.patch(url, json={'priority': 9}).status_code == 400
+        assert client.patch(url, data='nope', content_type='application/json').status_code == 400
+
+    def test_patch_not_found(self, client, db_connection):
+        """Test que parchear una tarea inexistente devuelve 404"""
+        assert client.patch('/api/tasks/9999', json={'status': 'completed'}).status_code == 404
+
+
+class TestProjectionRoutes:
+    """Tests para GET /api/tasks con ?fields= y ?format=columnar"""
+
+    def test_fields(self, client, db_connection, create_sample_tasks):
+        """Test que ?fields= reduce cada tarea a las columnas pedidas"""
+        data = json.loads(client.get('/api/tasks?fields=id,title&sort=title').data)
+        assert data == [{'id': create_sample_tasks[i], 'title': f'Task {i + 1}'} for i in range(3)]
+
+    def test_columnar(self, client, db_connection, create_sample_tasks):
+        """Test que format=columnar devuelve columns y rows"""
+        data = json.loads(client.get('/api/tasks?format=columnar&fields=title,priority&sort=priority').data)
+        assert data == {'columns': ['title', 'priority'],
+                        'rows': [['Task 1', 1], ['Task 2', 3], ['Task 3', 5]]}
+
+    def test_columnar_paginated(self, client, db_connection, create_sample_tasks):
+        """Test que format=columnar admite paginación"""
+        data = json.loads(client.get('/api/tasks?format=columnar&fields=title&sort=title&limit=2').data)
+        assert data['rows'] == [['Task 1'], ['Task 2']]
+        data = json.loads(client.get(
+            f"/api/tasks?format=columnar&fields=title&sort=title&limit=2&after={data['next_cursor']}").data)
+        assert data == {'columns': ['title'], 'rows': [['Task 3']], 'next_cursor': None}
+
+    def test_invalid_fields_and_format(self, client, db_connection):
+        """Test que campos o formatos desconocidos devuelven 400"""
+        assert client.get('/api/tasks?fields=secret').status_code == 400
+        assert client.get('/api/tasks?fields=').status_code == 400
+        assert client.get('/api/tasks?format=xml').status_code == 400
+
+    def test_fields_in_etag(self, client, db_connection, create_sample_tasks):
+        """Test que el ETag distingue proyecciones distintas"""
+        first = client.get('/api/tasks?fields=id').headers['ETag']
+        second = client.get('/api/tasks?fields=title').headers['ETag']
+        assert first != second
+
+
+class TestStatsRoutes:
+    """Tests para GET /api/stats"""
+
+    def test_get_stats(self, client, db_connection, create_sample_tasks):
+        """Test que se devuelven los contadores"""
+        response = client.get('/api/stats?today=2025-12-16')
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert data['total'] == 3
+        assert data['overdue'] == 2
+        assert data['by_status'] == {'pending': 3}
+
+    def test_etag_changes_with_day(self, client, db_connection, create_sample_tasks):
+        """Test que el ETag depende de los datos y de la fecha"""
+        etag = client.get('/api/stats?today=2025-12-16').headers['ETag']
+        assert client.get('/api/stats?today=2025-12-16', headers={'If-None-Match': etag}).status_code == 304
+        assert client.get('/api/stats?today=2025-12-17', headers={'If-None-Match': etag}).status_code == 200
+        Task.create('New', '', '', 3, '')
+        assert client.get('/api/stats?today=2025-12-16', headers={'If-None-Match': etag}).status_code == 200
+
+    def test_invalid_today(self, client, db_connection):
+        """Test que una fecha inválida devuelve 400"""
+        assert client.get('/api/stats?today=ayer').status_code == 400
+
+    def test_check_stats_command(self, runner, db_connection, create_sample_tasks):
+        """Test del comando flask check-stats"""
+        from database import get_db
+        assert runner.invoke(args=['check-stats']).exit_code == 0
+        db = get_db()
+        db.execute("UPDATE task_stats SET count = 7 WHERE dimension = 'total'")
+        db.commit()
+        db.close()
+        assert runner.invoke(args=['check-stats']).exit_code == 1
+        result = runner.invoke(args=['check-stats', '--repair'])
+        assert result.exit_code == 0 and 'reconstruidas' in result.output
+        assert runner.invoke(args=['check-stats']).exit_code == 0
+
+
+class TestRecurrenceRoutes:
+    """Tests para las tareas recurrentes en la API"""
+
+    @pytest.fixture
+    def series(self, client, db_connection):
+        response = client.post('/api/tasks', json={
+            'title': 'Standup', 'due_date': '2025-01-06', 'recurrence': 'freq=weekly;byday=mo,we'
+        })
+        assert response.status_code == 201
+        return json.loads(response.data)['id']
+
+    def test_create_normalizes_rule(self, client, series):
+        """Test que la regla se guarda normalizada"""
+        assert json.loads(client.get(f'/api/tasks/{series}').data)['recurrence'] == 'FREQ=WEEKLY;BYDAY=MO,WE'
+
+    def test_invalid_rules(self, client, db_connection):
+        """Test que una regla inválida o sin due_date devuelve 400"""
+        assert client.post('/api/tasks', json={
+            'title': 'X', 'due_date': '2025-01-06', 'recurrence': 'FREQ=HOURLY'}).status_code == 400
+        assert client.post('/api/tasks', json={'title': 'X', 'recurrence': 'FREQ=DAILY'}).status_code == 400
+
+    def test_patch_and_put_need_due_date_for_series(self, client, series, db_connection):
+        """Test que PATCH y PUT no dejan una serie sin due_date"""
+        undated = Task.create('Undated', '', '', 3, '')
+        assert client.patch(f'/api/tasks/{undated}', json={'recurrence': 'FREQ=DAILY'}).status_code == 400
+        assert Task.get_by_id(undated)['recurrence'] is None
+        assert client.patch(f'/api/tasks/{series}', json={'due_date': ''}).status_code == 400
+        assert client.put(f'/api/tasks/{series}', json={'title': 'Standup', 'due_date': ''}).status_code == 400
+        assert Task.get_by_id(series)['due_date'] == '2025-01-06'
+        # Quitar la regla y la fecha a la vez sí es válido
+        assert client.patch(f'/api/tasks/{series}', json={'recurrence': None, 'due_date': ''}).status_code == 200
+        assert client.patch('/api/tasks/9999', json={'due_date': ''}).status_code == 404
+
+    def test_put_keeps_rule_unless_given(self, client, series):
+        """Test que PUT sin recurrence conserva la serie y con null la quita"""
+        body = {'title': 'Standup', 'due_date': '2025-01-06'}
+        client.put(f'/api/tasks/{series}', json=body)
+        assert Task.get_by_id(series)['recurrence'] == 'FREQ=WEEKLY;BYDAY=MO,WE'
+        client.patch(f'/api/tasks/{series}', json={'recurrence': 'FREQ=DAILY;COUNT=2'})
+        assert Task.get_by_id(series)['recurrence'] == 'FREQ=DAILY;COUNT=2'
+        client.put(f'/api/tasks/{series}', json=dict(body, recurrence=None))
+        assert Task.get_by_id(series)['recurrence'] is None
+
+    def test_calendar_expands_occurrences(self, client, series):
+        """Test que el calendario muestra cada ocurrencia en su día"""
+        data = json.loads(client.get('/api/calendar?from=2025-01-06&to=2025-01-12&granularity=day').data)
+        assert [bucket['key'] for bucket in data['buckets']] == ['2025-01-06', '2025-01-08']
+
+    def test_occurrence_override_flow(self, client, series):
+        """Test de completar, listar y deshacer una ocurrencia"""
+        url = f'/api/tasks/{series}/occurrences'
+        assert client.patch(f'{url}/2025-01-08', json={'status': 'completed'}).status_code == 200
+        data = json.loads(client.get(f'{url}?from=2025-01-06&to=2025-01-13').data)
+        assert [(t['occurrence_date'], t['status']) for t in data] == [
+            ('2025-01-06', 'pending'), ('2025-01-08', 'completed'), ('2025-01-13', 'pending')
+        ]
+        assert client.delete(f'{url}/2025-01-08').status_code == 200
+        assert client.delete(f'{url}/2025-01-08').status_code == 404
+
+    def test_occurrence_validation(self, client, series):
+        """Test de los errores de las rutas de ocurrencias"""
+        url = f'/api/tasks/{series}/occurrences'
+        assert client.patch(f'{url}/2025-01-07', json={'status': 'completed'}).status_code == 400
+        assert client.patch(f'{url}/ayer', json={'status': 'completed'}).status_code == 400
+        assert client.patch(f'{url}/2025-01-08', json={'category': 'x'}).status_code == 400
+        assert client.patch(f'{url}/2025-01-08', json={'priority': 7}).status_code == 400
+        assert client.patch('/api/tasks/9999/occurrences/2025-01-08', json={'status': 'x'}).status_code == 404
+        assert client.get(f'{url}?from=2025-02-01&to=2025-01-01').status_code == 400
+        assert client.get('/api/tasks/9999/occurrences?from=2025-01-01&to=2025-01-02').status_code == 404
+
+    def test_window_formats_agree(self, client, db_connection):
+        """Test que columnar y streaming expanden las series igual que la lista y la paginación da 400"""
+        Task.create('Semanal', '', '', 3, '2026-01-05', 'FREQ=WEEKLY')
+        Task.create('Normal', '', '', 3, '2026-01-10')
+        window = 'due_from=2026-01-01&due_to=2026-01-31&sort=due_date'
+        listed = [(task['title'], task['due_date']) for task in json.loads(client.get(f'/api/tasks?{window}').data)]
+        assert len(listed) == 5
+
+        columnar = json.loads(client.get(f'/api/tasks?{window}&format=columnar&fields=title,due_date').data)
+        assert columnar['columns'] == ['title', 'due_date', 'occurrence_date']
+        assert [tuple(row[:2]) for row in columnar['rows']] == listed
+        assert columnar['rows'][0][2] == '2026-01-05'
+
+        streamed = client.get(f'/api/tasks?{window}&stream=1', headers={'Accept': 'application/x-ndjson'})
+        lines = [json.loads(line) for line in streamed.data.splitlines()]
+        assert [(task['title'], task['due_date']) for task in lines] == listed
+
+        response = client.get(f'/api/tasks?{window}&limit=2')
+        assert response.status_code == 400
+
+    def test_large_interval_reaches_date_max(self, client, db_connection):
+        """Test que una serie con INTERVAL grande y la ventana hasta 9999-12-31 no da 500"""
+        series = Task.create('Rara vez', '', '', 3, '2020-01-01', 'FREQ=DAILY;INTERVAL=5000')
+        response = client.get('/api/tasks?due_from=2020-01-01&due_to=9999-12-31')
+        assert response.status_code == 200
+        # La ventana se acota a date.max - 1 día
+        assert len(json.loads(response.data)) == (date(9999, 12, 30) - date(2020, 1, 1)).days // 5000 + 1
+        response = client.get(f'/api/tasks/{series}/occurrences?from=2020-01-01&to=9999-12-31')
+        assert response.status_code == 200
+        assert client.get('/api/calendar?from=2020-01-01&to=9999-12-31').status_code == 200
+
+    def test_occurrence_window_is_capped(self, client, db_connection):
+        """Test que una ventana con demasiadas ocurrencias devuelve 400 en lugar de generarlas"""
+        daily = Task.create('Daily', '', '', 3, '2026-01-01', 'FREQ=DAILY')
+        response = client.get('/api/tasks?due_from=2026-01-01&due_to=9999-12-31')
+        assert response.status_code == 400
+        assert 'Too many occurrences' in json.loads(response.data)['error']
+        assert client.get(f'/api/tasks/{daily}/occurrences?from=2026-01-01&to=9999-12-31').status_code == 400
+        assert client.get('/api/calendar?from=2026-01-01&to=2300-12-31').status_code == 400
+        # Una ventana razonable sigue expandiéndose
+        response = client.get('/api/tasks?due_from=2026-01-01&due_to=2026-12-31')
+        assert len(json.loads(response.data)) == 365
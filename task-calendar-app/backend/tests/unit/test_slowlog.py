@@ -0,0 +1,125 @@
+"""
+Tests unitarios para el registro de consultas lentas
+"""
+import json
+import logging
+import threading
+import time
+
+import pytest
+
+import slowlog
+from database import get_db
+
+
+@pytest.fixture
+def log_everything():
+    """Umbral a 0 ms para registrar todas las sentencias"""
+    slowlog.configure(0)
+    slowlog.clear()
+    yield
+    slowlog.configure(None)
+    slowlog.clear()
+
+
+def _entries(sql_prefix):
+    return [e for e in slowlog.recent() if e['sql'].startswith(sql_prefix)]
+
+
+class TestSlowQueryLog:
+    """Tests para slowlog y TimedCursor"""
+
+    def test_full_scan_flagged(self, db_connection, log_everything, caplog):
+        """Test que un recorrido completo se registra con su plan"""
+        db = get_db()
+        with caplog.at_level(logging.WARNING, logger='slow_query'):
+            db.execute('SELECT * FROM tasks WHERE description = ? ORDER BY title', ('x',)).fetchall()
+        db.close()
+        entry = _entries('SELECT * FROM tasks WHERE description')[-1]
+        assert entry['full_scan'] is True
+        assert entry['temp_btree'] is True
+        assert 'SCAN tasks' in entry['plan']
+        logged = [json.loads(r.getMessage()) for r in caplog.records if r.name == 'slow_query']
+        assert any(e['sql'] == entry['sql'] for e in logged)
+
+    def test_indexed_lookup_not_flagged(self, db_connection, log_everything):
+        """Test que una búsqueda por clave primaria no se marca como recorrido"""
+        db = get_db()
+        db.execute('SELECT * FROM tasks WHERE id = ?', (1,)).fetchone()
+        db.close()
+        entry = _entries('SELECT * FROM tasks WHERE id')[-1]
+        assert entry['full_scan'] is False
+        assert entry['plan'][0].startswith('SEARCH tasks')
+
+    def test_statement_logged_once(self, db_connection, log_everything):
+        """Test que execute y los fetch de una sentencia dan una sola entrada"""
+        db = get_db()
+        cursor = db.execute('SELECT id FROM tasks ORDER BY id')
+        cursor.fetchmany(10)
+        cursor.fetchall()
+        db.close()
+        assert len(_entries('SELECT id FROM tasks ORDER BY id')) == 1
+
+    def test_below_threshold_not_logged(self, db_connection):
+        """Test que las sentencias rápidas no se registran"""
+        slowlog.configure(60000)
+        slowlog.clear()
+        try:
+            db = get_db()
+            db.execute('SELECT * FROM tasks').fetchall()
+            db.close()
+            assert slowlog.recent() == []
+        finally:
+            slowlog.configure(None)
+
+    def test_request_endpoint_recorded(self, client, log_everything):
+        """Test que la entrada incluye el endpoint de la petición"""
+        client.get('/api/tasks?sort=title')
+        assert any(e['endpoint'] == 'tasks.get_tasks' for e in slowlog.recent())
+
+    def test_no_plan_for_pragmas(self, db_connection):
+        """Test que las sentencias sin plan de consulta no se explican"""
+        db = get_db()
+        assert slowlog.explain(db, 'PRAGMA user_version') is None
+        db.close()
+
+    def test_iteration_is_timed(self, db_connection):
+        """Test que recorrer el cursor con for cuenta para el umbral"""
+        slowlog.configure(20)
+        slowlog.clear()
+        db = get_db()
+        try:
+            db.executemany('INSERT INTO tasks (title) VALUES (?)', [(f'Task {i}',) for i in range(10)])
+            db.commit()
+            db.create_function('slow', 1, lambda value: time.sleep(0.005) or value)
+            rows = [row for row in db.execute('SELECT slow(id) FROM tasks')]
+            assert len(rows) == 10
+            entry = _entries('SELECT slow(id)')[-1]
+            assert entry['duration_ms'] >= 20
+        finally:
+            db.close()
+            slowlog.configure(None)
+            slowlog.clear()
+
+    def test_plan_cache_is_thread_safe(self, db_connection):
+        """Test que varios hilos llenan y vacían la caché de planes sin errores"""
+        errors = []
+
+        def worker(offset):
+            db = get_db()
+            try:
+                for i in range(slowlog.PLAN_CACHE_SIZE):
+                    slowlog.explain(db, f'SELECT id FROM tasks WHERE id = {offset + i}')
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                db.close()
+
+        threads = [threading.Thread(target=worker, args=(n * 1000,)) for n in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert errors == []
+        assert len(slowlog._plans) <= slowlog.PLAN_CACHE_SIZE
+        slowlog.clear()
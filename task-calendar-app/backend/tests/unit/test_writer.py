@@ -0,0 +1,126 @@
+"""
+Tests unitarios para el group commit
+"""
+import sqlite3
+import threading
+
+import pytest
+
+import writer
+from models import Task
+
+
+@pytest.fixture
+def group_commit(db_connection):
+    """Activa el group commit sobre la base de datos de prueba"""
+    writer.configure(enabled=True, max_batch=64, delay_ms=20)
+    yield writer.get_writer()
+    writer.configure(enabled=False)
+
+
+class TestGroupCommit:
+    """Tests para GroupCommitWriter y su uso desde Task"""
+
+    def test_concurrent_writes_share_transactions(self, group_commit):
+        """Test que las escrituras concurrentes se agrupan y todas se confirman"""
+        ids = []
+        lock = threading.Lock()
+
+        def worker(n):
+            task_id = Task.create(f'Task {n}', '', 'group', 3, '')
+            with lock:
+                ids.append(task_id)
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(20)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert len(set(ids)) == 20
+        assert len(Task.get_all({'category': 'group'})) == 20
+        stats = group_commit.stats()
+        assert stats['operations'] == 20
+        assert stats['batches'] < 20
+
+    def test_failed_operation_is_isolated(self, group_commit):
+        """Test que una operación que falla no deshace las demás del grupo"""
+        results = {}
+
+        def create(name, priority):
+            try:
+                results[name] = Task.create(name, '', '', priority, '')
+            except sqlite3.IntegrityError as exc:
+                results[name] = exc
+
+        threads = [
+            threading.Thread(target=create, args=('ok', 3)),
+            threading.Thread(target=create, args=('bad', 9)),
+            threading.Thread(target=create, args=('also ok', 2)),
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert isinstance(results['bad'], sqlite3.IntegrityError)
+        assert Task.get_by_id(results['ok'])['title'] == 'ok'
+        assert Task.get_by_id(results['also ok'])['title'] == 'also ok'
+
+    def test_updates_versions_and_changes(self, group_commit):
+        """Test que update/patch/delete mantienen versión y lápidas"""
+        task_id = Task.create('Grouped', '', '', 3, '')
+        since = Task.get_version()
+        Task.update(task_id, 'Grouped', 'desc', '', 4, '', 'pending')
+        assert Task.patch(task_id, {'status': 'completed'})
+        other = Task.create('Other', '', '', 3, '')
+        Task.delete(other)
+
+        assert Task.get_version() == since + 4
+        changes = Task.get_changes(since)
+        assert [t['status'] for t in changes['tasks']] == ['completed']
+        assert changes['deleted'] == [other]
+
+    def test_disabled_by_default(self, db_connection):
+        """Test que sin configurar no hay hilo escritor"""
+        assert writer.get_writer() is None
+
+    def test_pool_timeout_reaches_callers(self, db_connection):
+        """Test que sin conexiones libres la escritura falla y el escritor sigue vivo"""
+        import database
+        pool = database.get_pool()
+        group = writer.GroupCommitWriter(db_connection, delay_ms=0, timeout=5)
+        original_timeout, pool.timeout = pool.timeout, 0.05
+        held = [pool.acquire() for _ in range(pool.size)]
+        try:
+            with pytest.raises(database.PoolTimeout):
+                group.submit(lambda db: db.execute('SELECT 1').fetchone()[0])
+        finally:
+            for db in held:
+                db.close()
+            pool.timeout = original_timeout
+        # Liberadas las conexiones, el mismo hilo atiende las siguientes escrituras
+        assert group.submit(lambda db: db.execute('SELECT 1').fetchone()[0]) == 1
+        group.stop()
+
+    def test_submit_times_out(self, db_connection):
+        """Test que submit no espera indefinidamente a un grupo que no termina"""
+        started = threading.Event()
+        release = threading.Event()
+        group = writer.GroupCommitWriter(db_connection, delay_ms=0, timeout=0.1)
+
+        def block():
+            with pytest.raises(writer.WriteTimeout):
+                group.submit(lambda db: started.set() or release.wait(5))
+
+        blocker = threading.Thread(target=block)
+        blocker.start()
+        # La escritura bloqueante ya ocupa al hilo escritor antes de enviar la siguiente
+        assert started.wait(5)
+        try:
+            with pytest.raises(writer.WriteTimeout):
+                group.submit(lambda db: 1)
+        finally:
+            release.set()
+            blocker.join()
+            group.stop()
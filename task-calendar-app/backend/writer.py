@@ -0,0 +1,216 @@
+"""
+Group commit: un hilo escritor agrupa las escrituras concurrentes en una sola
+transacción (un único fsync) cada pocos milisegundos o al llegar a N operaciones.
+
+Cada operación corre en su propio SAVEPOINT: si falla, solo se deshace ella y
+su llamador recibe la excepción; el resto del grupo se confirma igualmente.
+"""
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+import database
+
+GROUP_COMMIT = os.environ.get('DB_GROUP_COMMIT', '').lower() in ('1', 'true', 'yes')
+# Operaciones máximas por transacción y espera máxima para completar un grupo
+GROUP_COMMIT_MAX_BATCH = int(os.environ.get('DB_GROUP_COMMIT_MAX_BATCH', 256))
+GROUP_COMMIT_DELAY_MS = float(os.environ.get('DB_GROUP_COMMIT_DELAY_MS', 2))
+# Espera máxima de quien escribe: el escritor puede esperar a su vez una conexión del pool
+GROUP_COMMIT_TIMEOUT = float(os.environ.get('DB_GROUP_COMMIT_TIMEOUT', 2 * database.POOL_TIMEOUT))
+
+_STOP = object()
+
+logger = logging.getLogger(__name__)
+
+
+class WriteTimeout(sqlite3.OperationalError):
+    pass
+
+
+class GroupCommitWriter:
+    """Hilo escritor único para una base de datos"""
+
+    def __init__(self, path, max_batch=GROUP_COMMIT_MAX_BATCH, delay_ms=GROUP_COMMIT_DELAY_MS,
+                 timeout=GROUP_COMMIT_TIMEOUT):
+        self.path = path
+        self.max_batch = max(1, int(max_batch))
+        self.delay = max(0.0, float(delay_ms)) / 1000
+        self.timeout = timeout
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.operations = 0
+        self.failures = 0
+        self._thread = threading.Thread(target=self._run, name=f'group-commit:{path}', daemon=True)
+        self._thread.start()
+
+    def submit(self, operation, after_commit=None):
+        """Encola operation(db) y espera a que se confirme; devuelve su resultado.
+
+        after_commit(resultado) se ejecuta en el hilo escritor, en orden de
+        confirmación, antes de despertar al llamador. Si no se confirma en
+        `timeout` segundos lanza WriteTimeout (la operación puede aplicarse después).
+        """
+        future = Future()
+        self._queue.put((operation, after_commit, future))
+        try:
+            return future.result(self.timeout)
+        except FutureTimeout:
+            raise WriteTimeout('Timed out waiting for the group commit writer')
+
+    def stop(self):
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.delay
+        while len(batch) < self.max_batch:
+            try:
+                if self.delay:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    item = self._queue.get(timeout=remaining)
+                else:
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                # Se procesa el grupo actual y se para después
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch = self._collect(first)
+            try:
+                self._commit(batch)
+            except Exception as exc:
+                # El hilo no puede morir: nadie más resolvería las escrituras pendientes
+                logger.exception('Group commit failed')
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+
+    def _commit(self, batch):
+        db = None
+        outcomes = []
+        try:
+            # Dentro del try: un PoolTimeout también se entrega a cada llamador
+            db = database.get_pool(self.path).acquire()
+            db.execute('BEGIN IMMEDIATE')
+            for operation, _, _ in batch:
+                db.execute('SAVEPOINT group_op')
+                try:
+                    outcomes.append((True, operation(db)))
+                except Exception as exc:
+                    db.execute('ROLLBACK TO group_op')
+                    outcomes.append((False, exc))
+                db.execute('RELEASE group_op')
+            db.commit()
+        except Exception as exc:
+            # Fallo del grupo entero (bloqueo, disco...): todos reciben el error
+            if db is not None and db.in_transaction:
+                db.rollback()
+            for _, _, future in batch:
+                future.set_exception(exc)
+            with self._lock:
+                self.failures += len(batch)
+            return
+        finally:
+            if db is not None:
+                db.close()
+
+        with self._lock:
+            self.batches += 1
+            self.operations += len(batch)
+            self.failures += sum(1 for ok, _ in outcomes if not ok)
+        for (_, after_commit, future), (ok, value) in zip(batch, outcomes):
+            if not ok:
+                future.set_exception(value)
+                continue
+            if after_commit is not None:
+                try:
+                    after_commit(value)
+                except Exception as exc:
+                    future.set_exception(exc)
+                    continue
+            future.set_result(value)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'batches': self.batches,
+                'operations': self.operations,
+                'failures': self.failures,
+                'avg_batch': round(self.operations / self.batches, 2) if self.batches else 0,
+            }
+
+
+_settings = {
+    'enabled': GROUP_COMMIT,
+    'max_batch': GROUP_COMMIT_MAX_BATCH,
+    'delay_ms': GROUP_COMMIT_DELAY_MS,
+}
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def configure(enabled=None, max_batch=None, delay_ms=None):
+    """Cambia la configuración y para los escritores existentes"""
+    for key, value in (('enabled', enabled), ('max_batch', max_batch), ('delay_ms', delay_ms)):
+        if value is not None:
+            _settings[key] = value
+    stop_all()
+
+
+def enabled():
+    return bool(_settings['enabled'])
+
+
+def get_writer(path=None):
+    """Escritor de la base de datos actual, o None si el group commit está desactivado"""
+    if not _settings['enabled']:
+        return None
+    path = path or database.current_path()
+    writer = _writers.get(path)
+    if writer is None:
+        with _writers_lock:
+            writer = _writers.get(path)
+            if writer is None:
+                writer = _writers[path] = GroupCommitWriter(
+                    path, _settings['max_batch'], _settings['delay_ms']
+                )
+    return writer
+
+
+def stop_all():
+    with _writers_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        writer.stop()
+
+
+def stats():
+    return {path: writer.stats() for path, writer in list(_writers.items())}
+
+
+def init_app(app):
+    if any(key in app.config for key in ('DB_GROUP_COMMIT', 'DB_GROUP_COMMIT_MAX_BATCH',
+                                         'DB_GROUP_COMMIT_DELAY_MS')):
+        configure(
+            app.config.get('DB_GROUP_COMMIT'),
+            app.config.get('DB_GROUP_COMMIT_MAX_BATCH'),
+            app.config.get('DB_GROUP_COMMIT_DELAY_MS'),
+        )
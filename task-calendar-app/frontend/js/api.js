@@ -12,6 +12,37 @@ class TaskAPI {
         }
     }
 
+    // Cambios posteriores a `since` (0 = carga completa); {expired: true} si hay que empezar de nuevo
+    static async getChanges(since) {
+        try {
+            const response = await fetch(`${API_URL}/changes?since=${since}`);
+            if (response.status === 410) return { expired: true };
+            if (!response.ok) throw new Error('Error al obtener cambios');
+            return await response.json();
+        } catch (error) {
+            console.error('Error:', error);
+            return null;
+        }
+    }
+
+    // Avisos push de cambios (SSE); onChange recibe la versión de datos anunciada
+    // y onReminder (opcional) el id de cada tarea con recordatorio de vencimiento
+    static subscribe(onChange, onReminder) {
+        if (!window.EventSource) return null;
+        const source = new EventSource(`${API_URL}/stream`);
+        const handler = event => {
+            const message = JSON.parse(event.data);
+            if (onReminder) {
+                (message.changes || []).filter(change => change.op === 'reminder')
+                    .forEach(change => onReminder(change.id));
+            }
+            onChange(message.version);
+        };
+        source.addEventListener('changes', handler);
+        source.addEventListener('reset', handler);
+        return source;
+    }
+
     static async getTask(id) {
         try {
             const response = await fetch(`${API_URL}/${id}`);
@@ -53,6 +84,65 @@ class TaskAPI {
         }
     }
 
+    // Solo los campos cambiados (p. ej. { due_date } al mover una tarea en el calendario)
+    static async patchTask(id, fields) {
+        try {
+            const response = await fetch(`${API_URL}/${id}`, {
+                method: 'PATCH',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify(fields)
+            });
+            if (!response.ok) throw new Error('Error al actualizar tarea');
+            return await response.json();
+        } catch (error) {
+            console.error('Error:', error);
+            return null;
+        }
+    }
+
+    // Ocurrencias de una tarea recurrente entre dos fechas YYYY-MM-DD
+    static async getOccurrences(id, from, to) {
+        try {
+            const params = new URLSearchParams({ from, to });
+            const response = await fetch(`${API_URL}/${id}/occurrences?${params}`);
+            if (!response.ok) throw new Error('Error al obtener ocurrencias');
+            return await response.json();
+        } catch (error) {
+            console.error('Error:', error);
+            return [];
+        }
+    }
+
+    // Cambia solo una ocurrencia (p. ej. { status: 'completed' } o { cancelled: true })
+    static async updateOccurrence(id, occurrenceDate, fields) {
+        try {
+            const response = await fetch(`${API_URL}/${id}/occurrences/${occurrenceDate}`, {
+                method: 'PATCH',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify(fields)
+            });
+            if (!response.ok) throw new Error('Error al actualizar ocurrencia');
+            return await response.json();
+        } catch (error) {
+            console.error('Error:', error);
+            return null;
+        }
+    }
+
+    // Deshace los cambios de una ocurrencia
+    static async resetOccurrence(id, occurrenceDate) {
+        try {
+            const response = await fetch(`${API_URL}/${id}/occurrences/${occurrenceDate}`, {
+                method: 'DELETE'
+            });
+            if (!response.ok) throw new Error('Error al restablecer ocurrencia');
+            return await response.json();
+        } catch (error) {
+            console.error('Error:', error);
+            return null;
+        }
+    }
+
     static async deleteTask(id) {
         try {
             const response = await fetch(`${API_URL}/${id}`, {
@@ -65,4 +155,45 @@ class TaskAPI {
             return null;
         }
     }
-}
\ No newline at end of file
+
+    static async getAttachments(taskId) {
+        try {
+            const response = await fetch(`${API_URL}/${taskId}/attachments`);
+            if (!response.ok) throw new Error('Error al obtener adjuntos');
+            return await response.json();
+        } catch (error) {
+            console.error('Error:', error);
+            return [];
+        }
+    }
+
+    static async uploadAttachments(taskId, files) {
+        // Los ficheros viajan tal cual en multipart; el servidor los guarda por bloques
+        const formData = new FormData();
+        Array.from(files).forEach(file => formData.append('file', file));
+        try {
+            const response = await fetch(`${API_URL}/${taskId}/attachments`, {
+                method: 'POST',
+                body: formData
+            });
+            if (!response.ok) throw new Error('Error al subir adjuntos');
+            return await response.json();
+        } catch (error) {
+            console.error('Error:', error);
+            return null;
+        }
+    }
+
+    static async deleteAttachment(id) {
+        try {
+            const response = await fetch(`/api/attachments/${id}`, {
+                method: 'DELETE'
+            });
+            if (!response.ok) throw new Error('Error al eliminar adjunto');
+            return await response.json();
+        } catch (error) {
+            console.error('Error:', error);
+            return null;
+        }
+    }
+}
@@ -2,6 +2,8 @@ const apiUrl = 'http://localhost:5000/api/tasks';
 
 let currentTaskId = null;
 let tasks = [];
+// Versión de datos de la última sincronización (0 = aún no se ha cargado nada)
+let syncVersion = 0;
 
 // Elementos del DOM
 const taskForm = document.getElementById('taskForm');
@@ -17,8 +19,25 @@ const fileInput = document.getElementById('fileInput');
 document.addEventListener('DOMContentLoaded', async () => {
     await loadTasks();
     setupEventListeners();
+    TaskAPI.subscribe(onRemoteChange);
 });
 
+// Sincronización en curso y última versión anunciada por el servidor
+let syncInFlight = null;
+let announcedVersion = 0;
+
+function onRemoteChange(version) {
+    announcedVersion = Math.max(announcedVersion, version);
+    if (syncInFlight) return;
+    syncInFlight = (async () => {
+        // Repite si llegan avisos mientras se sincroniza
+        do {
+            await loadTasks();
+        } while (announcedVersion > syncVersion && syncVersion > 0);
+        syncInFlight = null;
+    })();
+}
+
 function setupEventListeners() {
     btnNewTask.addEventListener('click', newTask);
     taskForm.addEventListener('submit', saveTask);
@@ -28,10 +47,32 @@ function setupEventListeners() {
 }
 
 async function loadTasks() {
-    tasks = await TaskAPI.getTasks();
+    let changes = await TaskAPI.getChanges(syncVersion);
+    if (changes && changes.expired) {
+        syncVersion = 0;
+        tasks = [];
+        changes = await TaskAPI.getChanges(0);
+    }
+    if (!changes) {
+        tasks = await TaskAPI.getTasks();
+        syncVersion = 0;
+    } else {
+        applyChanges(changes);
+    }
     renderTaskList();
 }
 
+// Aplica un delta de /api/tasks/changes sobre la lista local
+function applyChanges(changes) {
+    const byId = new Map(tasks.map(task => [task.id, task]));
+    changes.tasks.forEach(task => byId.set(task.id, task));
+    changes.deleted.forEach(id => byId.delete(id));
+    // Mismo orden que GET /api/tasks: más recientes primero
+    tasks = [...byId.values()].sort((a, b) =>
+        (b.created_at || '').localeCompare(a.created_at || '') || b.id - a.id);
+    syncVersion = changes.version;
+}
+
 function renderTaskList() {
     tasksList.innerHTML = '';
     tasks.forEach(task => {
@@ -132,22 +173,13 @@ function clearForm() {
     attachmentsList.innerHTML = '';
 }
 
-function loadAttachments(taskId) {
+async function loadAttachments(taskId) {
     attachmentsList.innerHTML = '';
-    
-    // Buscar todos los adjuntos en localStorage
-    for (let i = 0; i < localStorage.length; i++) {
-        const key = localStorage.key(i);
-        if (key.startsWith('attachment_')) {
-            const attachment = LocalStorage.getItem(key);
-            if (attachment && attachment.taskId === taskId) {
-                displayAttachment(attachment, key);
-            }
-        }
-    }
+    const attachments = await TaskAPI.getAttachments(taskId);
+    attachments.forEach(displayAttachment);
 }
 
-function uploadFile() {
+async function uploadFile() {
     if (!currentTaskId) {
         alert('Debes seleccionar una tarea primero');
         return;
@@ -159,28 +191,18 @@ function uploadFile() {
         return;
     }
     
-    // Guardar en localStorage
-    Array.from(files).forEach(file => {
-        const reader = new FileReader();
-        reader.onload = (e) => {
-            const attachment = {
-                name: file.name,
-                size: file.size,
-                type: file.type,
-                taskId: currentTaskId,
-                data: e.target.result
-            };
-            LocalStorage.setItem(`attachment_${Date.now()}`, attachment);
-            displayAttachment(attachment);
-        };
-        reader.readAsDataURL(file);
-    });
-    
+    // Subir los ficheros al servidor sin convertirlos a data URL
+    const result = await TaskAPI.uploadAttachments(currentTaskId, files);
     fileInput.value = '';
-    alert('Archivos cargados exitosamente');
+    if (result) {
+        await loadAttachments(currentTaskId);
+        alert('Archivos cargados exitosamente');
+    } else {
+        alert('Error al cargar los archivos');
+    }
 }
 
-function displayAttachment(attachment, storageKey = null) {
+function displayAttachment(attachment) {
     const attachmentEl = document.createElement('div');
     attachmentEl.className = 'attachment-item';
     
@@ -188,20 +210,20 @@ function displayAttachment(attachment, storageKey = null) {
     
     attachmentEl.innerHTML = `
         <div>
-            <strong>${attachment.name}</strong>
+            <strong>${attachment.filename}</strong>
             <small>(${sizeKB} KB)</small>
             <br>
-            <a href="${attachment.data}" download="${attachment.name}" class="btn-download">Descargar</a>
-            ${storageKey ? `<button class="btn-danger" onclick="deleteAttachment('${storageKey}')" style="padding: 5px 10px; font-size: 12px;">Eliminar</button>` : ''}
+            <a href="${attachment.url}" download="${attachment.filename}" class="btn-download">Descargar</a>
+            <button class="btn-danger" onclick="deleteAttachment(${attachment.id})" style="padding: 5px 10px; font-size: 12px;">Eliminar</button>
         </div>
     `;
     attachmentsList.appendChild(attachmentEl);
 }
 
-function deleteAttachment(storageKey) {
+async function deleteAttachment(attachmentId) {
     if (confirm('¿Deseas eliminar este archivo?')) {
-        LocalStorage.removeItem(storageKey);
-        loadAttachments(currentTaskId);
+        await TaskAPI.deleteAttachment(attachmentId);
+        await loadAttachments(currentTaskId);
     }
 }
 